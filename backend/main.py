@@ -1,9 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import migrations
 import models
-from database import engine
-from routes import emails, inboxes
-models.Base.metadata.create_all(bind=engine)
+import purge
+import rollups
+import search
+from database import SessionLocal, engine
+from routes import emails, events, inboxes, metrics, stats
+from routes import search as search_routes
+with migrations.schema_lock(engine):
+    models.Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    search.ensure_search_schema(engine)
+    purge.ensure_cascades(engine)
+with SessionLocal() as db:
+    rollups.build_if_empty(db)
 
 app = FastAPI(title="IntellInbox API")
 
@@ -12,10 +23,15 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(emails.router)
 app.include_router(inboxes.router)
+app.include_router(stats.router)
+app.include_router(events.router)
+app.include_router(metrics.router)
+app.include_router(search_routes.router)
 
 @app.get("/")
 def root():
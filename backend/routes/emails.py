@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional
 import models, schemas
-from database import get_db
+import events
+import rollups
+from async_database import get_async_db
 from celery import Celery
+from datetime import datetime, timezone
+import base64
+import json
 import os
 
 celery_app = Celery("tasks", broker=os.getenv("REDIS_URL", "redis://redis:6379/0"))
@@ -13,56 +21,125 @@ router = APIRouter(
     tags=["Emails"]
 )
 
-@router.get("/", response_model=List[schemas.EmailRead])
-def read_emails(skip: int = 0, limit: int = 100, active: bool = True, db: Session = Depends(get_db)):
-    query = db.query(models.Email)
+def encode_cursor(email: models.Email) -> str:
+    raw = json.dumps([email.received_at.isoformat(), email.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        received_at, email_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(received_at), int(email_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def get_email(db: AsyncSession, email_id: int) -> Optional[models.Email]:
+    """Loads an email with the relationships EmailRead serializes, including its raw body."""
+    return await db.scalar(
+        select(models.Email)
+        .options(joinedload(models.Email.analysis), joinedload(models.Email.inbox), joinedload(models.Email.stored_body).undefer(models.EmailBody.data))
+        .where(models.Email.id == email_id)
+    )
+
+async def record_stats(db: AsyncSession, email: models.Email, new: Optional[tuple]):
+    """Moves the email's count in inbox_stats to its new state (None once deleted)."""
+    deltas = {}
+    rollups.move(deltas, email.inbox_id, rollups.email_state(email), new)
+    statement = rollups.delta_statement(db, deltas)
+    if statement is not None:
+        await db.execute(statement)
+
+async def dispatch_analysis(email_id: int):
+    await run_in_threadpool(celery_app.send_task, "tasks.analyze_email", args=[email_id])
+
+@router.get("/", response_model=List[schemas.EmailListItem])
+async def read_emails(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    active: bool = True,
+    status: Optional[models.EmailStatus] = None,
+    inbox_id: Optional[int] = None,
+    category: Optional[str] = None,
+    min_priority: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Newest emails first, paginated by an opaque (received_at, id) cursor.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    # Listings serialize the snippet; the content and raw body are not loaded
+    query = select(models.Email).options(selectinload(models.Email.analysis))
     if active:
-        query = query.join(models.MonitoredInbox).filter(models.MonitoredInbox.is_active == True)
-    query = query.order_by(models.Email.received_at.desc())
-    emails = query.offset(skip).limit(limit).all()
+        query = query.join(models.MonitoredInbox).where(models.MonitoredInbox.is_active == True)
+    if status is not None:
+        query = query.where(models.Email.status == status)
+    if inbox_id is not None:
+        query = query.where(models.Email.inbox_id == inbox_id)
+    if category is not None or min_priority is not None:
+        query = query.join(models.Analysis)
+        if category is not None:
+            query = query.where(models.Analysis.category == category)
+        if min_priority is not None:
+            query = query.where(models.Analysis.priority_score >= min_priority)
+    if cursor:
+        query = query.where(
+            tuple_(models.Email.received_at, models.Email.id) < tuple_(*decode_cursor(cursor))
+        )
+
+    query = query.order_by(models.Email.received_at.desc(), models.Email.id.desc())
+    emails = (await db.scalars(query.limit(limit))).all()
+    if len(emails) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(emails[-1])
     return emails
 
 @router.get("/{email_id}", response_model=schemas.EmailRead)
-def read_single_email(email_id: int, db: Session = Depends(get_db)):
-    db_email = db.query(models.Email).filter(models.Email.id == email_id).first()
+async def read_single_email(email_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_email = await get_email(db, email_id)
     if db_email is None:
         raise HTTPException(status_code=404, detail="Email not found")
     return db_email
 
 @router.post("/", response_model=schemas.EmailRead)
-def create_email(email: schemas.EmailCreate, db: Session = Depends(get_db)):
+async def create_email(email: schemas.EmailCreate, db: AsyncSession = Depends(get_async_db)):
+    now = datetime.now(timezone.utc)
+    # queued_at set, so the backfill scheduler never releases it a second time
     db_email = models.Email(
         sender=email.sender,
         subject=email.subject,
-        body=email.body
+        body=email.body,
+        received_at=now,
+        queued_at=now
     )
     db.add(db_email)
-    db.commit()
-    db.refresh(db_email)
-    celery_app.send_task("tasks.analyze_email", args=[db_email.id])
-    return db_email
+    await db.commit()
+    await dispatch_analysis(db_email.id)
+    return await get_email(db, db_email.id)
 
-@router.patch("/{email_id}/analysis", response_model=schemas.AnalysisRead)
-def update_email_analysis(
+@router.patch("/{email_id}/analysis", response_model=Optional[schemas.AnalysisRead])
+async def update_email_analysis(
     email_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_email = db.query(models.Email).filter(models.Email.id == email_id).first()
+    db_email = await get_email(db, email_id)
     if not db_email:
         raise HTTPException(status_code=404, detail="Email not found")
+    await record_stats(db, db_email, rollups.state(models.EmailStatus.PROCESSING))
     db_email.status = models.EmailStatus.PROCESSING
-    db.commit()
-    db.refresh(db_email)
-    db.delete(db_email.analysis)
-    db.commit()
-    celery_app.send_task("tasks.analyze_email", args=[db_email.id])
-    return db_email.analysis
+    db_email.queued_at = datetime.now(timezone.utc)
+    if db_email.analysis:
+        await db.delete(db_email.analysis)
+    await db.commit()
+    await run_in_threadpool(events.publish_status, [email_id], models.EmailStatus.PROCESSING)
+    await dispatch_analysis(db_email.id)
+    # The previous analysis is gone until the worker writes a new one
+    return None
 
 @router.delete("/{email_id}", response_model=schemas.EmailDelete)
-def delete_email(email_id: int, db: Session = Depends(get_db)):
-    db_email = db.query(models.Email).filter(models.Email.id == email_id).first()
+async def delete_email(email_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_email = await get_email(db, email_id)
     if not db_email:
         raise HTTPException(status_code=404, detail="Email not found")
-    db.delete(db_email)
-    db.commit()
-    return db_email
\ No newline at end of file
+    await record_stats(db, db_email, None)
+    await db.delete(db_email)
+    await db.commit()
+    return db_email
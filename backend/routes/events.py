@@ -0,0 +1,44 @@
+import os
+
+import redis.asyncio as aioredis
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from events import EVENTS_CHANNEL
+
+# A comment line is sent this often so proxies don't close an idle stream
+EVENTS_KEEPALIVE_SECONDS = int(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+redis_client = aioredis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Events"]
+)
+
+async def stream(request: Request):
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(EVENTS_CHANNEL)
+    try:
+        # Tells EventSource how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            message = await pubsub.get_message(timeout=EVENTS_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {message['data'].decode()}\n\n"
+    finally:
+        await pubsub.unsubscribe(EVENTS_CHANNEL)
+        await pubsub.reset()
+
+@router.get("/")
+async def stream_events(request: Request):
+    """
+    Server-sent events for email status changes, new analyses and newly
+    ingested emails, relayed from the workers' Redis channel.
+    """
+    return StreamingResponse(
+        stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
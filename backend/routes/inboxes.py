@@ -2,10 +2,13 @@ import os
 
 from celery import Celery
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-import models, schemas
-from database import get_db
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import models, queues, schemas
+from async_database import get_async_db
 from security import encrypt_password
 
 celery_app = Celery("tasks", broker=os.getenv("REDIS_URL", "redis://redis:6379/0"))
@@ -15,15 +18,31 @@ router = APIRouter(
     tags=["Inboxes"]
 )
 
+async def get_inbox(db: AsyncSession, inbox_id: int) -> Optional[models.MonitoredInbox]:
+    return await db.scalar(select(models.MonitoredInbox).where(models.MonitoredInbox.id == inbox_id))
+
+async def send_task(name: str, args: list, queue: Optional[str] = None):
+    await run_in_threadpool(celery_app.send_task, name, args=args, queue=queue)
+
+def purging(inbox: models.MonitoredInbox) -> bool:
+    return inbox.purge_started_at is not None and inbox.purge_finished_at is None
+
+async def start_purge(db: AsyncSession, inbox: models.MonitoredInbox):
+    """Records the size and start of a purge of the inbox's emails; tasks.purge_inbox counts its progress."""
+    inbox.purge_total = await db.scalar(select(func.count(models.Email.id)).where(models.Email.inbox_id == inbox.id))
+    inbox.purge_done = 0
+    inbox.purge_started_at = datetime.now(timezone.utc)
+    inbox.purge_finished_at = None
+
 @router.get("/", response_model=List[schemas.InboxRead])
-def read_inboxes(db: Session = Depends(get_db)):
-    return db.query(models.MonitoredInbox).all()
+async def read_inboxes(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.MonitoredInbox))).all()
 
 @router.post("/", response_model=schemas.InboxRead)
-def create_inbox(inbox: schemas.InboxCreate, db: Session = Depends(get_db), sync_days: int = 30):
-    existing = db.query(models.MonitoredInbox).filter(
+async def create_inbox(inbox: schemas.InboxCreate, db: AsyncSession = Depends(get_async_db), sync_days: int = 30):
+    existing = await db.scalar(select(models.MonitoredInbox).where(
         models.MonitoredInbox.email_address == inbox.email_address
-    ).first()
+    ))
     if existing:
         raise HTTPException(status_code=400, detail="Email already being monitored")
 
@@ -31,61 +50,76 @@ def create_inbox(inbox: schemas.InboxCreate, db: Session = Depends(get_db), sync
         email_address=inbox.email_address,
         imap_server=inbox.imap_server,
         password=encrypt_password(inbox.password),
-        is_active=inbox.is_active
+        is_active=inbox.is_active,
+        sync_days=sync_days
     )
     db.add(db_inbox)
-    db.commit()
-    db.refresh(db_inbox)
-    celery_app.send_task("tasks.setup_inbox", args=[db_inbox.id, sync_days])
+    await db.commit()
+    await db.refresh(db_inbox)
+    await send_task("tasks.setup_inbox", [db_inbox.id, sync_days], queue=queues.BACKFILL_FETCH_QUEUE)
     return db_inbox
 
-@router.post("/{inbox_id}/reset")
-def flush_inbox(inbox_id: int, db: Session = Depends(get_db), sync_days: int = 30):
-    inbox = db.query(models.MonitoredInbox).filter(models.MonitoredInbox.id == inbox_id).first()
+@router.post("/{inbox_id}/reset", status_code=202)
+async def flush_inbox(inbox_id: int, db: AsyncSession = Depends(get_async_db), sync_days: int = 30):
+    """Deletes the inbox's emails in the background, then imports its history again."""
+    inbox = await get_inbox(db, inbox_id)
     if not inbox:
         raise HTTPException(status_code=404, detail="Inbox not found")
-    db.query(models.Analysis).filter(
-        models.Analysis.email_id.in_(
-            db.query(models.Email.id).filter(models.Email.inbox_id == inbox_id)
-        )
-    ).delete(synchronize_session=False)
-    db.query(models.Email).filter(models.Email.inbox_id == inbox_id).delete()
-    db.commit()
-    celery_app.send_task("tasks.setup_inbox", args=[inbox_id, sync_days])
-    return {"message": "Reset task started in background"}
+    if inbox.deleting or purging(inbox):
+        raise HTTPException(status_code=409, detail="Inbox is already being reset or deleted")
+    await start_purge(db, inbox)
+    await db.commit()
+    await send_task("tasks.purge_inbox", [inbox_id, sync_days])
+    return {"message": "Reset task started in background", "emails": inbox.purge_total}
 
 @router.post("/{inbox_id}/sync")
-def trigger_sync(inbox_id: int, db: Session = Depends(get_db)):
-    inbox = db.query(models.MonitoredInbox).filter(models.MonitoredInbox.id == inbox_id).first()
+async def trigger_sync(inbox_id: int, db: AsyncSession = Depends(get_async_db)):
+    inbox = await get_inbox(db, inbox_id)
     if not inbox:
         raise HTTPException(status_code=404, detail="Inbox not found")
-    celery_app.send_task("tasks.sync_inbox", args=[inbox_id])
+    await send_task("tasks.sync_inbox", [inbox_id])
     return {"message": "Sync task started in background"}
 
 @router.post("/syncall")
-def sync_all_inboxes(db: Session = Depends(get_db)):
-    active_inboxes = db.query(models.MonitoredInbox).filter(models.MonitoredInbox.is_active == True).all()
-    
+async def sync_all_inboxes(db: AsyncSession = Depends(get_async_db)):
+    active_inboxes = (await db.scalars(
+        select(models.MonitoredInbox).where(models.MonitoredInbox.is_active == True)
+    )).all()
+
     for inbox in active_inboxes:
-        celery_app.send_task("tasks.sync_inbox", args=[inbox.id])
-        
+        await send_task("tasks.sync_inbox", [inbox.id])
+
     return {"message": f"Sync tasks dispatched for {len(active_inboxes)} inboxes"}
 
 @router.patch("/{inbox_id}/status", response_model=schemas.InboxRead)
-def update_inbox_status(inbox_id: int, is_active: bool, db: Session = Depends(get_db)):
-    db_inbox = db.query(models.MonitoredInbox).filter(models.MonitoredInbox.id == inbox_id).first()
+async def update_inbox_status(inbox_id: int, is_active: bool, db: AsyncSession = Depends(get_async_db)):
+    db_inbox = await get_inbox(db, inbox_id)
     if not db_inbox:
         raise HTTPException(status_code=404, detail="Inbox not found")
+    if db_inbox.deleting:
+        raise HTTPException(status_code=409, detail="Inbox is being deleted")
     db_inbox.is_active = is_active
-    db.commit()
-    db.refresh(db_inbox)
+    await db.commit()
+    await db.refresh(db_inbox)
+    # An inbox added inactive has had nothing imported yet
+    if is_active and db_inbox.backfill_started_at is None:
+        await send_task("tasks.setup_inbox", [inbox_id, db_inbox.sync_days], queue=queues.BACKFILL_FETCH_QUEUE)
     return db_inbox
 
-@router.delete("/{inbox_id}")
-def delete_inbox(inbox_id: int, db: Session = Depends(get_db)):
-    db_inbox = db.query(models.MonitoredInbox).filter(models.MonitoredInbox.id == inbox_id).first()
+@router.delete("/{inbox_id}", status_code=202)
+async def delete_inbox(inbox_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Deactivates the inbox and deletes it with its emails in the background.
+    Progress shows on the inbox until it is gone. Repeating the call
+    resumes a deletion whose worker died.
+    """
+    db_inbox = await get_inbox(db, inbox_id)
     if not db_inbox:
         raise HTTPException(status_code=404, detail="Inbox not found")
-    db.delete(db_inbox)
-    db.commit()
-    return {"detail": "Inbox and associated data deleted"}
\ No newline at end of file
+    db_inbox.is_active = False
+    db_inbox.deleting = True
+    if not purging(db_inbox):
+        await start_purge(db, db_inbox)
+    await db.commit()
+    await send_task("tasks.purge_inbox", [inbox_id])
+    return {"detail": "Inbox deletion started", "emails": db_inbox.purge_total}
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+import counters
+import metrics
+import queues
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"]
+)
+
+def counter_families() -> list:
+    """The existing shared counters (cache, IMAP pool, queues) in Prometheus form."""
+    cache = counters.read("analysis_cache")
+    pool = counters.read("imap_pool")
+    depth, analyzed, wait = [], [], []
+    for queue_class in queues.CLASSES:
+        for queue in queues.analysis_queues(queue_class):
+            labels = metrics.label_text({"queue": queue, "queue_class": queue_class})
+            counts = counters.read(f"queue:{queue}")
+            depth.append(("", labels, queues.queue_depth(counters.redis_client, queue)))
+            analyzed.append(("", labels, counts.get("analyzed", 0)))
+            wait.append(("", labels, round(counts.get("wait_ms", 0) / 1000, 3)))
+
+    return (
+        metrics.family("intellinbox_analysis_cache_lookups_total", "counter", "Analysis cache lookups by result.", [
+            ("", 'result="hit"', cache.get("hits", 0)),
+            ("", 'result="miss"', cache.get("misses", 0)),
+        ])
+        + metrics.family("intellinbox_imap_pool_events_total", "counter", "IMAP session pool events.", [
+            ("", metrics.label_text({"event": event}), value) for event, value in sorted(pool.items())
+        ])
+        + metrics.family("intellinbox_queue_depth", "gauge", "Analysis messages waiting in each queue.", depth)
+        + metrics.family("intellinbox_queue_analyzed_total", "counter", "Emails taken off each analysis queue.", analyzed)
+        + metrics.family("intellinbox_queue_wait_seconds_total", "counter", "Total time emails waited in each analysis queue.", wait)
+    )
+
+@router.get("", response_class=PlainTextResponse)
+def read_metrics():
+    lines = metrics.render() + counter_families()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@router.get("/traces")
+def read_slowest_traces(limit: int = 20):
+    return metrics.slowest_traces(limit)
+
+@router.get("/traces/{trace_id}")
+def read_trace(trace_id: str):
+    spans = metrics.read_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found or expired")
+    return {"trace_id": trace_id, "spans": spans}
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Literal, Optional
+import embeddings
+import models, schemas
+import search
+from async_database import get_async_db
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"]
+)
+
+@router.get("/", response_model=List[schemas.SearchHit])
+async def search_emails(
+    q: str = Query(..., min_length=1, max_length=500),
+    mode: Literal["text", "semantic"] = "text",
+    order: Literal["relevance", "recent"] = "relevance",
+    limit: int = Query(20, ge=1, le=100),
+    active: bool = True,
+    inbox_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Full-text search over subject, sender, body and summary, or, with
+    mode=semantic, nearest emails by embedding similarity.
+    """
+    conditions = []
+    if active:
+        conditions.append(models.MonitoredInbox.is_active == True)
+    if inbox_id is not None:
+        conditions.append(models.Email.inbox_id == inbox_id)
+
+    if mode == "semantic":
+        if not search.SEMANTIC_SEARCH:
+            raise HTTPException(status_code=400, detail="Semantic search is disabled (SEMANTIC_SEARCH=0)")
+        vector = (await run_in_threadpool(embeddings.embed, [q]))[0]
+        statement = search.semantic_search(vector, conditions, limit)
+    else:
+        statement = search.text_search(q, conditions, order, limit)
+
+    for setting in search.settings(mode):
+        await db.execute(setting)
+    hits = (await db.execute(statement)).all()
+    if not hits:
+        return []
+    emails = {email.id: email for email in (await db.scalars(
+        select(models.Email)
+        .options(selectinload(models.Email.analysis))
+        .where(models.Email.id.in_([hit.email_id for hit in hits]))
+    )).all()}
+    return [
+        schemas.SearchHit(
+            **schemas.EmailListItem.model_validate(emails[hit.email_id]).model_dump(),
+            score=round(hit.score, 4),
+            headline=hit.headline
+        )
+        for hit in hits if hit.email_id in emails
+    ]
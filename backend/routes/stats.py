@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import counters
+import models
+import queues
+import rollups
+from async_database import get_async_db
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"]
+)
+
+@router.get("/cache")
+async def read_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    counts = await run_in_threadpool(counters.read, "analysis_cache")
+    hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "entries": await db.scalar(select(func.count(models.AnalysisCache.key)))
+    }
+
+@router.get("/imap-pool")
+def read_imap_pool_stats():
+    counts = counters.read("imap_pool")
+    hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "handshakes": counts.get("handshakes", 0),
+        "relogins": counts.get("relogins", 0),
+        "evictions": counts.get("evictions", 0)
+    }
+
+def read_queue_counters() -> dict:
+    """Depth, throughput and mean wait of every analysis queue, by class."""
+    report = {}
+    for queue_class in queues.CLASSES:
+        report[queue_class] = {}
+        for queue in queues.analysis_queues(queue_class):
+            counts = counters.read(f"queue:{queue}")
+            analyzed = counts.get("analyzed", 0)
+            report[queue_class][queue] = {
+                "depth": queues.queue_depth(counters.redis_client, queue),
+                "analyzed": analyzed,
+                "mean_wait_ms": round(counts.get("wait_ms", 0) / analyzed) if analyzed else None
+            }
+    return report
+
+@router.get("/queues")
+async def read_queue_stats(db: AsyncSession = Depends(get_async_db)):
+    report = await run_in_threadpool(read_queue_counters)
+    # Historical emails not yet released by the backfill scheduler
+    unreleased = (await db.execute(
+        select(models.Email.inbox_id, func.count(models.Email.id))
+        .where(models.Email.status == models.EmailStatus.PENDING, models.Email.queued_at.is_(None))
+        .group_by(models.Email.inbox_id)
+    )).all()
+    return {
+        "queues": report,
+        "backfill_unreleased": {inbox_id: count for inbox_id, count in unreleased}
+    }
+
+@router.get("/emails")
+async def read_email_stats(
+    inbox_id: Optional[int] = None,
+    active: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Email counts by status and category, and the urgent count, across
+    inboxes or for one. Read from the inbox_stats rollup, not the emails.
+    """
+    query = (
+        select(models.InboxStats.status, models.InboxStats.category, models.InboxStats.emails, models.InboxStats.urgent)
+        .join(models.MonitoredInbox, models.MonitoredInbox.id == models.InboxStats.inbox_id)
+    )
+    if inbox_id is not None:
+        if not await db.get(models.MonitoredInbox, inbox_id):
+            raise HTTPException(status_code=404, detail="Inbox not found")
+        query = query.where(models.InboxStats.inbox_id == inbox_id)
+    elif active:
+        query = query.where(models.MonitoredInbox.is_active == True)
+    return {
+        **rollups.summarize((await db.execute(query)).all()),
+        "urgent_priority": rollups.URGENT_PRIORITY
+    }
+
+@router.get("/inboxes")
+async def read_inbox_stats(active: bool = True, db: AsyncSession = Depends(get_async_db)):
+    """The same counts per inbox, e.g. for an overview of every mailbox."""
+    query = (
+        select(
+            models.MonitoredInbox.id, models.MonitoredInbox.email_address,
+            models.InboxStats.status, models.InboxStats.category, models.InboxStats.emails, models.InboxStats.urgent
+        )
+        .outerjoin(models.InboxStats, models.InboxStats.inbox_id == models.MonitoredInbox.id)
+        .order_by(models.MonitoredInbox.id)
+    )
+    if active:
+        query = query.where(models.MonitoredInbox.is_active == True)
+    inboxes = {}
+    for inbox_id, email_address, *counts in (await db.execute(query)).all():
+        rows = inboxes.setdefault((inbox_id, email_address), [])
+        if counts[0] is not None:
+            rows.append(counts)
+    return [
+        {"inbox_id": inbox_id, "email_address": email_address, **rollups.summarize(rows)}
+        for (inbox_id, email_address), rows in inboxes.items()
+    ]
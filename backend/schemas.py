@@ -26,6 +26,17 @@ class InboxCreate(InboxBase):
 class InboxRead(InboxBase):
     id: int
     last_synced: datetime
+    # Historical import progress in UIDs; finished_at stays unset while chunks remain
+    backfill_total: int = 0
+    backfill_done: int = 0
+    backfill_started_at: Optional[datetime] = None
+    backfill_finished_at: Optional[datetime] = None
+    # Reset or deletion progress in emails; a deleting inbox disappears when it finishes
+    purge_total: int = 0
+    purge_done: int = 0
+    purge_started_at: Optional[datetime] = None
+    purge_finished_at: Optional[datetime] = None
+    deleting: bool = False
     model_config = ConfigDict(from_attributes=True)
 
 class EmailBase(BaseModel):
@@ -42,10 +53,31 @@ class EmailDelete(EmailBase):
 
 class EmailRead(EmailBase):
     id: int
-    inbox_id: int
+    # Unset for emails created through POST /emails/
+    inbox_id: Optional[int] = None
     status: EmailStatus
     received_at: datetime
+    trace_id: Optional[str] = None
     analysis: Optional[AnalysisRead] = None
     inbox: Optional[InboxRead] = None
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class EmailListItem(BaseModel):
+    """Listing row: a snippet instead of the body and no nested inbox."""
+    id: int
+    # Unset for emails created through POST /emails/
+    inbox_id: Optional[int] = None
+    sender: str
+    subject: str
+    snippet: str
+    status: EmailStatus
+    received_at: datetime
+    analysis: Optional[AnalysisRead] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SearchHit(EmailListItem):
+    """A listing row with its search score and, for text search, a highlighted body excerpt."""
+    score: float
+    headline: Optional[str] = None
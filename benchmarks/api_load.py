@@ -0,0 +1,72 @@
+"""
+Closed-loop HTTP load test for the API. Each of --concurrency clients keeps
+one keep-alive connection and sends requests back to back for --seconds,
+then p50/p99 latency and throughput are reported per concurrency level.
+Run it against a sync and an async build of the API to compare them.
+
+    python benchmarks/api_load.py --url http://localhost:8000/emails/?limit=50 --concurrency 1 10 50 200
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+async def request(reader, writer, host: str, path: str) -> int:
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode())
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def client(host: str, port: int, path: str, deadline: float, latencies: list, errors: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await request(reader, writer, host, path)
+            if status >= 400:
+                errors.append(status)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def run(url: str, concurrency: int, seconds: float):
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        client(parts.hostname, parts.port or 80, path, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    if not latencies:
+        print(f"{concurrency:>11} {'no responses':>10}")
+        return
+    print(
+        f"{concurrency:>11} {len(latencies):>10} {len(latencies) / seconds:>10.1f} "
+        f"{percentile(latencies, 0.5) * 1000:>9.1f} {percentile(latencies, 0.99) * 1000:>9.1f} {len(errors):>7}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/emails/?limit=50")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'concurrency':>11} {'requests':>10} {'req/sec':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in args.concurrency:
+        asyncio.run(run(args.url, concurrency, args.seconds))
+
+if __name__ == "__main__":
+    main()
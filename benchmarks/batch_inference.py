@@ -0,0 +1,35 @@
+"""
+Measures analysis throughput (emails/sec) of run_models against batch size
+using the real CPU models.
+
+    python benchmarks/batch_inference.py --emails 64 --sizes 1 4 8 16 32
+"""
+import argparse
+import time
+
+from common import load_example_bodies
+
+import tasks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=64)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    bodies = load_example_bodies()
+    contents = [tasks.truncate_thread(tasks.get_clean_text(bodies[i % len(bodies)]))[:1024] for i in range(args.emails)]
+
+    tasks.init_worker()
+    tasks.run_models(contents[:1])  # warm-up
+
+    print(f"{'batch size':>10} {'seconds':>10} {'emails/sec':>12}")
+    for size in args.sizes:
+        start = time.perf_counter()
+        for i in range(0, len(contents), size):
+            tasks.run_models(contents[i:i + size])
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {elapsed:>10.2f} {len(contents) / elapsed:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+What keeping raw bodies out of the emails rows buys, on DATABASE_URL
+(Postgres). Stores --rows emails with HTML bodies of about --body-kb KB
+through ingest_emails, and the same emails in the former layout (the
+raw body and its search vector on the row, the snippet cut from the
+body in SQL) in a scratch bench_emails_wide table. Use a database of its own, since the sizes
+cover whole tables. It then compares:
+- table sizes (heap, and TOAST with indexes)
+- a full scan of the rows, as vacuum or an unindexed filter does
+- listing pages at increasing depths
+- preparing the model input for a re-analysis: the stored content
+  against cleaning the raw body again
+
+    DATABASE_URL=postgresql://... python benchmarks/bodies.py --rows 100000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import time
+
+import common
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session, selectinload
+
+import search
+import tasks
+from models import Base, Email, MonitoredInbox
+
+WIDE = "bench_emails_wide"
+INBOX = "bodies-bench@example.com"
+
+def make_body(rng: random.Random, words: list, size: int) -> str:
+    """An HTML newsletter-like body: styled paragraphs of varied text plus a quoted reply."""
+    parts = ["<html><head><style>p { margin: 0 0 12px; font-family: Arial; }</style></head><body>"]
+    while sum(map(len, parts)) < size:
+        parts.append(f'<p style="color:#333">{" ".join(rng.choices(words, k=40))}</p>')
+        if rng.random() < 0.2:
+            parts.append(f'<a href="https://example.com/track?id={rng.getrandbits(64):x}">Read more</a>')
+    parts.append("<p>On Mon, someone wrote:</p><blockquote>" + " ".join(rng.choices(words, k=60)) + "</blockquote></body></html>")
+    return "".join(parts)
+
+def seed(engine, rows: int, body_kb: int):
+    with Session(engine) as db:
+        if db.scalar(select(MonitoredInbox.id).where(MonitoredInbox.email_address == INBOX)):
+            if db.execute(text(f"SELECT to_regclass('{WIDE}')")).scalar() and \
+                    db.execute(text(f"SELECT count(*) FROM {WIDE}")).scalar() >= rows:
+                return
+            db.execute(text("DELETE FROM monitored_inboxes WHERE email_address = :address"), {"address": INBOX})
+            db.commit()
+        print(f"Seeding {rows} emails...")
+        db.execute(text(f"DROP TABLE IF EXISTS {WIDE}"))
+        db.execute(text(f"""
+            CREATE TABLE {WIDE} (
+                id integer PRIMARY KEY, inbox_id integer, sender varchar(255), subject varchar(255),
+                received_at timestamptz, body text, message_id varchar(255), status emailstatus, created_at timestamptz,
+                search_vector tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{search.TEXT_CONFIG}', coalesce(subject, '')), 'A') ||
+                    setweight(to_tsvector('{search.TEXT_CONFIG}', translate(coalesce(sender, ''), '@.<>', '    ')), 'B') ||
+                    setweight(to_tsvector('{search.TEXT_CONFIG}', coalesce(body, '')), 'D')
+                ) STORED
+            )
+        """))
+        db.execute(text(f"CREATE INDEX ON {WIDE} (received_at, id)"))
+        inbox = MonitoredInbox(email_address=INBOX, imap_server="bench", password="bench")
+        db.add(inbox)
+        db.commit()
+
+        rng = random.Random(24)
+        words = " ".join(common.load_example_bodies()).split()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for offset in range(0, rows, tasks.INGEST_CHUNK_SIZE):
+            items = [
+                {
+                    "sender": f"sender{i % 500}@example.com",
+                    "received_at": now - datetime.timedelta(seconds=30 * i),
+                    "subject": f"Bodies benchmark {i}",
+                    "body": make_body(rng, words, body_kb * 1024),
+                    "message_id": f"<bodies-bench-{i}@example.com>"
+                }
+                for i in range(offset, min(offset + tasks.INGEST_CHUNK_SIZE, rows))
+            ]
+            ids = tasks.ingest_emails(db, inbox, items)
+            db.execute(text(f"""
+                INSERT INTO {WIDE} (id, inbox_id, sender, subject, received_at, body, message_id, status, created_at)
+                VALUES (:id, :inbox_id, :sender, :subject, :received_at, :body, :message_id, 'PENDING', now())
+            """), [{"id": email_id, "inbox_id": inbox.id, **item} for email_id, item in zip(ids, items)])
+            db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+def timed(conn, sql: str, params: dict, repeat: int) -> float:
+    """Median ms over repeat runs, after one warm-up."""
+    conn.execute(text(sql), params).all()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(text(sql), params).all()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--body-kb", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 500])
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    search.ensure_search_schema(engine)
+    seed(engine, args.rows, args.body_kb)
+
+    with engine.connect() as conn:
+        inbox_id = conn.execute(select(MonitoredInbox.id).where(MonitoredInbox.email_address == INBOX)).scalar()
+        print(f"\n{args.rows} emails, ~{args.body_kb} KB bodies")
+        print(f"{'':>30} {'heap MB':>9} {'TOAST+idx MB':>13}")
+        for label, table in (("wide emails", WIDE), ("narrow emails", "emails"), ("email_bodies (zlib)", "email_bodies")):
+            heap, total = conn.execute(
+                text("SELECT pg_relation_size(CAST(:table AS regclass)), pg_total_relation_size(CAST(:table AS regclass))"),
+                {"table": table}
+            ).one()
+            print(f"{label:>30} {heap / 2 ** 20:>9.1f} {(total - heap) / 2 ** 20:>13.1f}")
+
+        scan = "SELECT count(*) FROM {table} WHERE inbox_id = :inbox_id AND subject LIKE '%zzz%'"
+        conn.execute(text("SET enable_indexscan = off"))
+        conn.execute(text("SET enable_bitmapscan = off"))
+        print(f"\n{'full scan ms':>30} wide {timed(conn, scan.format(table=WIDE), {'inbox_id': inbox_id}, args.repeat):.1f}, "
+              f"narrow {timed(conn, scan.format(table='emails'), {'inbox_id': inbox_id}, args.repeat):.1f}")
+        conn.execute(text("RESET enable_indexscan"))
+        conn.execute(text("RESET enable_bitmapscan"))
+
+        listing = (
+            "SELECT id, sender, subject, received_at, status, {snippet} FROM {table} "
+            "WHERE inbox_id = :inbox_id ORDER BY received_at DESC, id DESC LIMIT 100 OFFSET :offset"
+        )
+        for page in args.pages:
+            params = {"inbox_id": inbox_id, "offset": (page - 1) * 100}
+            wide = timed(conn, listing.format(snippet="substr(body, 1, 200)", table=WIDE), params, args.repeat)
+            narrow = timed(conn, listing.format(snippet="snippet", table="emails"), params, args.repeat)
+            print(f"{f'listing page {page} ms':>30} wide {wide:.1f}, narrow {narrow:.1f}")
+
+    with Session(engine) as db:
+        emails = db.scalars(
+            select(Email).options(selectinload(Email.stored_body)).where(Email.inbox_id == inbox_id).order_by(Email.id).limit(1000)
+        ).all()
+        raw = [email.body for email in emails]
+        start = time.perf_counter()
+        stored = [tasks.prepare_content(email) for email in emails]
+        stored_us = (time.perf_counter() - start) / len(emails) * 1e6
+        start = time.perf_counter()
+        cleaned = [tasks.clean_content(body) for body in raw]
+        cleaned_us = (time.perf_counter() - start) / len(emails) * 1e6
+    print(f"{'re-analysis input µs/email':>30} stored {stored_us:.0f}, re-cleaned {cleaned_us:.0f}"
+          f" (same text: {'yes' if stored == cleaned else 'NO'})")
+
+if __name__ == "__main__":
+    main()
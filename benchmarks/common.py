@@ -0,0 +1,34 @@
+"""
+Shared setup for the benchmark scripts. Puts the worker and db modules on
+the path the same way the Docker images flatten them, and fills in the
+environment they expect at import time.
+"""
+import base64
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "worker"), os.path.join(ROOT, "db")]
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ENCRYPTION_KEY", base64.urlsafe_b64encode(b"intellinbox-benchmark-key-000000").decode())
+
+def load_example_emails() -> list:
+    """Returns the email objects (sender, receiver, subject, body) found in example_emails.txt."""
+    with open(os.path.join(ROOT, "example_emails.txt")) as f:
+        text = f.read()
+
+    emails, depth, start = [], 0, None
+    for i, char in enumerate(text):
+        if char == "{":
+            if depth == 0: start = i
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0: emails.append(json.loads(text[start:i + 1]))
+    return emails
+
+def load_example_bodies() -> list:
+    """Returns the email bodies found in example_emails.txt."""
+    return [email["body"] for email in load_example_emails()]
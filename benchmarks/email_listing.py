@@ -0,0 +1,159 @@
+"""
+Query-plan and latency benchmark for GET /emails on a synthetic dataset.
+Seeds DATABASE_URL (Postgres) with --rows emails once, then compares
+OFFSET pagination against keyset pagination at increasing page depths,
+with and without the category/min-priority filters. First it checks,
+through the route itself, that a GET /emails page costs the same number
+of statements whatever its size.
+
+    DATABASE_URL=postgresql://... python benchmarks/email_listing.py --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import common  # noqa: F401
+
+from sqlalchemy import create_engine, text
+
+from models import Base
+
+SEED_INBOXES = 20
+
+SEED = [
+    """
+    INSERT INTO monitored_inboxes (email_address, imap_server, password, is_active, last_synced)
+    SELECT 'bench-' || g || '@example.com', 'imap.example.com', '-', true, now()
+    FROM generate_series(1, :inboxes) g
+    ON CONFLICT (email_address) DO NOTHING
+    """,
+    """
+    INSERT INTO emails (inbox_id, sender, subject, received_at, snippet, message_id, status, created_at)
+    SELECT
+        (SELECT min(id) FROM monitored_inboxes WHERE email_address LIKE 'bench-%') + g % :inboxes,
+        'sender' || g % 500 || '@example.com',
+        'Synthetic subject ' || g,
+        now() - g * interval '30 seconds',
+        left(repeat('Synthetic body text. ', 40), 200),
+        '<bench-' || g || '@example.com>',
+        (ARRAY['PENDING', 'COMPLETED', 'COMPLETED', 'COMPLETED', 'FAILED'])[1 + g % 5]::emailstatus,
+        now()
+    FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO analyses (email_id, priority_score, summary, category, processed_at)
+    SELECT id, round(random()::numeric, 2), 'Synthetic summary.',
+           (ARRAY['positive', 'neutral', 'negative'])[1 + id % 3], now()
+    FROM emails
+    WHERE message_id LIKE '<bench-%' AND status = 'COMPLETED'
+    """,
+    "ANALYZE",
+]
+
+BASE = """
+    SELECT emails.id, emails.received_at FROM emails
+    JOIN monitored_inboxes ON monitored_inboxes.id = emails.inbox_id
+    {join}
+    WHERE monitored_inboxes.is_active {filters}
+"""
+ORDER = " ORDER BY emails.received_at DESC, emails.id DESC LIMIT :limit"
+
+VARIANTS = {
+    "unfiltered": ("", ""),
+    "filtered": (
+        "JOIN analyses ON analyses.email_id = emails.id",
+        "AND analyses.category = 'negative' AND analyses.priority_score >= 0.8",
+    ),
+}
+
+def seed(conn, rows: int):
+    existing = conn.execute(text("SELECT count(*) FROM emails WHERE message_id LIKE '<bench-%'")).scalar()
+    if existing >= rows:
+        return
+    print(f"Seeding {rows} emails...")
+    conn.execute(text("DELETE FROM analyses WHERE email_id IN (SELECT id FROM emails WHERE message_id LIKE '<bench-%')"))
+    conn.execute(text("DELETE FROM emails WHERE message_id LIKE '<bench-%'"))
+    for statement in SEED:
+        conn.execute(text(statement), {"rows": rows, "inboxes": SEED_INBOXES})
+    conn.commit()
+
+def page_statements(limits: list) -> dict:
+    """Statements GET /emails executes for a first page of each size, counted on the API's engine."""
+    sys.path.insert(0, os.path.join(common.ROOT, "backend"))
+    from fastapi import Response
+    from async_database import AsyncSessionLocal, async_engine
+    from database import count_queries
+    from routes.emails import read_emails
+
+    async def count(limit: int) -> int:
+        async with AsyncSessionLocal() as db:
+            with count_queries(async_engine) as counter:
+                emails = await read_emails(
+                    Response(), cursor=None, limit=limit, active=True, status=None,
+                    inbox_id=None, category=None, min_priority=None, db=db
+                )
+        assert len(emails) == limit, f"only {len(emails)} emails for a page of {limit}"
+        return counter.count
+
+    async def count_all() -> dict:
+        try:
+            return {limit: await count(limit) for limit in limits}
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(count_all())
+
+def explain(conn, sql: str, params: dict):
+    """Returns (execution ms from EXPLAIN ANALYZE, top plan line, wall-clock ms)."""
+    plan = [row[0] for row in conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql), params)]
+    execution = next(line for line in plan if line.startswith("Execution Time"))
+    start = time.perf_counter()
+    conn.execute(text(sql), params).all()
+    return execution.split(":")[1].strip(), plan[0].strip()[:80], (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000, 5000])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        seed(conn, args.rows)
+
+    statements = page_statements(args.page_sizes)
+    print("statements per GET /emails page: " + ", ".join(f"{limit} emails: {count}" for limit, count in statements.items()))
+    assert len(set(statements.values())) == 1, "the statements per page grow with the page size"
+
+    with engine.connect() as conn:
+        for name, (join, filters) in VARIANTS.items():
+            base = BASE.format(join=join, filters=filters)
+            print(f"\n== {name} ==")
+            for page in args.pages:
+                offset = (page - 1) * args.limit
+                boundary = conn.execute(
+                    text(base + ORDER + " OFFSET :offset"), {"limit": 1, "offset": max(offset - 1, 0)}
+                ).first()
+                if boundary is None:
+                    break
+
+                offset_sql = base + ORDER + " OFFSET :offset"
+                keyset_sql = base + " AND (emails.received_at, emails.id) < (:received_at, :id)" + ORDER
+                # On page 1 the boundary is the first row itself, so nudge the id to include it
+                keyset_params = {"limit": args.limit, "received_at": boundary.received_at, "id": boundary.id + (page == 1)}
+
+                for label, sql, params in (
+                    ("offset", offset_sql, {"limit": args.limit, "offset": offset}),
+                    ("keyset", keyset_sql, keyset_params),
+                ):
+                    execution, plan, wall = explain(conn, sql, params)
+                    print(f"page {page:>5} {label:>6}: {execution:>12} (wall {wall:7.1f} ms)  {plan}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Minimal in-process IMAP4rev1 server for offline checks and benchmarks.
+Serves a single INBOX over plain TCP (run the worker with IMAP_SSL=0) and
+understands the commands the worker sends: CAPABILITY, LOGIN, SELECT,
+UID SEARCH, UID FETCH, NOOP, IDLE and LOGOUT. Any credentials are accepted.
+"""
+import asyncio
+import datetime
+import re
+import threading
+
+FETCH_PARTIAL = re.compile(r"BODY\.PEEK\[TEXT\]<0\.(\d+)>", re.IGNORECASE)
+
+def parse_uid_set(uid_set: str, max_uid: int) -> set:
+    uids = set()
+    for part in uid_set.split(","):
+        lo, _, hi = part.partition(":")
+        lo = max_uid if lo == "*" else int(lo)
+        hi = lo if not hi else max_uid if hi == "*" else int(hi)
+        uids.update(range(min(lo, hi), max(lo, hi) + 1))
+    return uids
+
+class Mailbox:
+    def __init__(self, uid_validity: int = 1):
+        self.uid_validity = uid_validity
+        self.messages = []  # (uid, raw bytes, internal date)
+        self.next_uid = 1
+        self.listeners = set()
+
+    def append(self, raw: bytes, date: datetime.date = None) -> int:
+        uid = self.next_uid
+        self.next_uid += 1
+        self.messages.append((uid, raw, date or datetime.date.today()))
+        for queue in self.listeners:
+            queue.put_nowait(len(self.messages))
+        return uid
+
+    def search(self, criteria: str) -> list:
+        max_uid = self.messages[-1][0] if self.messages else 0
+        matches = list(self.messages)
+        tokens = re.findall(r'"[^"]*"|\S+', criteria)
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            if key == "UID":
+                wanted = parse_uid_set(tokens[i + 1], max_uid)
+                matches = [m for m in matches if m[0] in wanted]
+                i += 2
+            elif key == "SINCE":
+                since = datetime.datetime.strptime(tokens[i + 1].strip('"'), "%d-%b-%Y").date()
+                matches = [m for m in matches if m[2] >= since]
+                i += 2
+            elif key in ("ALL", "UNSEEN"):
+                i += 1
+            else:
+                raise ValueError(f"Unsupported search key {key}")
+        return [m[0] for m in matches]
+
+class FakeIMAPServer:
+    def __init__(self, mailbox: Mailbox = None, host: str = "127.0.0.1", port: int = 0):
+        self.mailbox = mailbox or Mailbox()
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.threaded = False
+        self.logins = 0
+
+    @property
+    def address(self) -> str:
+        """Value for MonitoredInbox.imap_server."""
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def start_in_thread(self):
+        """Runs the server on its own event loop so blocking clients (imaplib) can use it."""
+        ready = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        self.threaded = True
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait()
+        return self
+
+    def append(self, raw: bytes, date: datetime.date = None):
+        """Delivers a message, waking up any IDLE sessions. Safe to call from any thread."""
+        if self.threaded:
+            self.loop.call_soon_threadsafe(self.mailbox.append, raw, date)
+        else:
+            self.mailbox.append(raw, date)
+
+    async def handle(self, reader, writer):
+        def send(line):
+            writer.write((line.encode() if isinstance(line, str) else line) + b"\r\n")
+
+        send("* OK [CAPABILITY IMAP4rev1 IDLE] Fake IMAP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+                command, _, args = rest.partition(" ")
+                command = command.upper()
+
+                if command == "CAPABILITY":
+                    send("* CAPABILITY IMAP4rev1 IDLE")
+                elif command == "LOGIN":
+                    self.logins += 1
+                elif command in ("SELECT", "EXAMINE"):
+                    send(f"* {len(self.mailbox.messages)} EXISTS")
+                    send("* 0 RECENT")
+                    send(f"* OK [UIDVALIDITY {self.mailbox.uid_validity}] UIDs valid")
+                    send(f"* OK [UIDNEXT {self.mailbox.next_uid}] Predicted next UID")
+                    send("* FLAGS (\\Seen)")
+                elif command == "UID":
+                    subcommand, _, args = args.partition(" ")
+                    if subcommand.upper() == "SEARCH":
+                        send("* SEARCH " + " ".join(str(uid) for uid in self.mailbox.search(args)))
+                    elif subcommand.upper() == "FETCH":
+                        self.fetch(send, args)
+                elif command == "IDLE":
+                    await self.idle(reader, writer)
+                elif command == "LOGOUT":
+                    send("* BYE Fake IMAP closing")
+                    send(f"{tag} OK LOGOUT completed")
+                    await writer.drain()
+                    break
+                elif command != "NOOP":
+                    send(f"{tag} BAD Unsupported command {command}")
+                    continue
+
+                send(f"{tag} OK {command} completed")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def fetch(self, send, args: str):
+        uid_set, _, items = args.partition(" ")
+        partial = FETCH_PARTIAL.search(items)
+        max_uid = self.mailbox.messages[-1][0] if self.mailbox.messages else 0
+        wanted = parse_uid_set(uid_set, max_uid)
+
+        for seq, (uid, raw, _) in enumerate(self.mailbox.messages, start=1):
+            if uid not in wanted:
+                continue
+            split = raw.find(b"\r\n\r\n")
+            header, text = (raw[:split + 4], raw[split + 4:]) if split >= 0 else (raw, b"")
+            if partial:
+                text = text[:int(partial.group(1))]
+
+            response = f"* {seq} FETCH (UID {uid} BODY[HEADER] {{{len(header)}}}\r\n".encode() + header
+            response += f" BODY[TEXT]<0> {{{len(text)}}}\r\n".encode() + text + b")"
+            send(response)
+
+    async def idle(self, reader, writer):
+        writer.write(b"+ idling\r\n")
+        await writer.drain()
+
+        queue = asyncio.Queue()
+        self.mailbox.listeners.add(queue)
+        done = asyncio.ensure_future(reader.readline())
+        try:
+            while True:
+                exists = asyncio.ensure_future(queue.get())
+                finished, _ = await asyncio.wait({done, exists}, return_when=asyncio.FIRST_COMPLETED)
+                if exists in finished:
+                    writer.write(f"* {exists.result()} EXISTS\r\n".encode())
+                    await writer.drain()
+                else:
+                    exists.cancel()
+                if done in finished:
+                    break
+        finally:
+            self.mailbox.listeners.discard(queue)
+
+def make_message(index: int, date: datetime.datetime = None, body: str = None) -> bytes:
+    """Builds a plain-text RFC 822 message with a unique Message-ID."""
+    date = date or datetime.datetime.now(datetime.timezone.utc)
+    body = body or f"Hello,\r\n\r\nThis is synthetic message number {index}. Please review the attached figures before Friday.\r\n"
+    return (
+        f"Message-ID: <synthetic-{index}@fake-imap.local>\r\n"
+        f"From: Sender {index % 17} <sender{index % 17}@example.com>\r\n"
+        f"To: inbox@example.com\r\n"
+        f"Subject: Synthetic message {index}\r\n"
+        f"Date: {date.strftime('%a, %d %b %Y %H:%M:%S +0000')}\r\n"
+        f"Content-Type: text/plain; charset=utf-8\r\n"
+        f"\r\n{body}"
+    ).encode()
@@ -0,0 +1,41 @@
+"""
+Offline check of the IDLE listener against the fake IMAP server: delivers
+a message while the client is idling and verifies that a sync is
+dispatched for the inbox.
+
+    python benchmarks/idle_check.py
+"""
+import asyncio
+import os
+
+os.environ.setdefault("IMAP_SSL", "0")
+os.environ.setdefault("IDLE_HEARTBEAT_SECONDS", "1")
+
+import common  # noqa: F401
+from fake_imap import FakeIMAPServer, make_message
+
+from idle_listener import IdleClient
+
+async def check(timeout: float = 5.0):
+    server = await FakeIMAPServer().start()
+    dispatched = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+
+    def dispatch(inbox_id):
+        loop.call_soon_threadsafe(dispatched.put_nowait, inbox_id)
+
+    client = IdleClient(1, server.address, "user@example.com", "secret", dispatch=dispatch, heartbeat=False)
+    task = asyncio.create_task(client.run())
+    try:
+        # The catch-up sync issued right after connecting
+        assert await asyncio.wait_for(dispatched.get(), timeout) == 1
+        await asyncio.sleep(0.2)
+
+        server.append(make_message(1))
+        assert await asyncio.wait_for(dispatched.get(), timeout) == 1
+        print("OK: new mail announced over IDLE dispatched a sync")
+    finally:
+        task.cancel()
+
+if __name__ == "__main__":
+    asyncio.run(check())
@@ -0,0 +1,110 @@
+"""
+Parity, latency and memory of the worker's inference backends. Every
+(backend, model) pair is loaded in a fresh process, so the reported peak
+RSS belongs to that one model. Outputs are compared with the full-precision
+torch backend on the same emails:
+sentiment labels by agreement, summaries by exact match and token overlap,
+and priority scores with priority.compare_scores.
+
+    python benchmarks/inference_backends.py --backends torch quantized onnx --emails 64
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+MODELS = ["sentiment", "summary", "priority"]
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def load_runner(model: str):
+    """Returns a function mapping a batch of contents to comparable outputs."""
+    import tasks
+    from inference import load_pipeline
+    from priority import load_priority_engine
+
+    if model == "sentiment":
+        pipe = load_pipeline("sentiment-analysis", tasks.SENTIMENT_MODEL)
+        return lambda batch: [r['label'].lower() for r in pipe([c[:512] for c in batch], batch_size=len(batch))]
+    if model == "summary":
+        pipe = load_pipeline("summarization", tasks.SUMMARY_MODEL)
+        return lambda batch: [
+            r['summary_text'].strip()
+            for r in pipe(batch, max_length=90, min_length=30, do_sample=False, batch_size=len(batch))
+        ]
+    return load_priority_engine().score
+
+def profile(backend: str, model: str, emails: int, batch_size: int) -> dict:
+    """Runs in a spawned child: loads one model on one backend and times it."""
+    os.environ["INFERENCE_BACKEND"] = backend
+    import common
+    from fetcher import get_clean_text
+    from tasks import truncate_thread
+
+    bodies = common.load_example_bodies()
+    contents = [truncate_thread(get_clean_text(bodies[i % len(bodies)]))[:1024] for i in range(emails)]
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    run = load_runner(model)
+    load_seconds = time.perf_counter() - start
+    run(contents[:1])  # warm-up
+
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(contents), batch_size):
+        outputs.extend(run(contents[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "load_s": round(load_seconds, 2),
+        "ms_per_email": round(elapsed / len(contents) * 1000, 1),
+        "rss_mb": round(peak_rss_mb() - baseline),
+        "outputs": outputs,
+    }
+
+def parity(model: str, reference: list, candidate: list) -> str:
+    if model == "sentiment":
+        agreement = sum(r == c for r, c in zip(reference, candidate)) / len(reference)
+        return f"label agreement {agreement:.3f}"
+    if model == "summary":
+        exact = sum(r == c for r, c in zip(reference, candidate)) / len(reference)
+        overlap = sum(
+            len(set(r.split()) & set(c.split())) / max(len(set(r.split()) | set(c.split())), 1)
+            for r, c in zip(reference, candidate)
+        ) / len(reference)
+        return f"exact {exact:.3f}, token overlap {overlap:.3f}"
+
+    import common  # noqa: F401
+    from priority import compare_scores
+    report = compare_scores(reference, candidate)
+    return f"MAE {report['mean_abs_error']}, pearson {report['pearson']}, buckets {report['bucket_agreement']}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "quantized", "onnx"])
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--emails", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    spawn = multiprocessing.get_context("spawn")
+
+    print(f"{'model':>10} {'backend':>10} {'load s':>8} {'ms/email':>9} {'RSS MB':>8}  parity vs torch")
+    for model in args.models:
+        reference = None
+        for backend in backends:
+            with spawn.Pool(1) as pool:
+                result = pool.apply(profile, (backend, model, args.emails, args.batch_size))
+            if reference is None:
+                reference = result["outputs"]
+            print(
+                f"{model:>10} {backend:>10} {result['load_s']:>8} {result['ms_per_email']:>9} {result['rss_mb']:>8}  "
+                f"{parity(model, reference, result['outputs'])}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures rows/sec of storing fetched emails, comparing the old per-message
+path (SELECT, INSERT, COMMIT, REFRESH per email) with ingest_emails.
+Runs against DATABASE_URL, or a temporary SQLite file by default.
+
+    python benchmarks/ingest.py --emails 5000 --duplicates 0.2
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/ingest.db")
+
+import common  # noqa: F401
+
+from models import Base, Email, EmailStatus, MonitoredInbox
+
+import tasks
+
+def make_items(count: int, offset: int) -> list:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {
+            "sender": f"sender{i % 50}@example.com",
+            "received_at": now - datetime.timedelta(minutes=i),
+            "subject": f"Benchmark message {i}",
+            "body": f"Body of benchmark message {i}. " * 20,
+            "message_id": f"<bench-{i}@example.com>"
+        }
+        for i in range(offset, offset + count)
+    ]
+
+def legacy_ingest(db, inbox, items: list) -> int:
+    added = 0
+    for item in items:
+        exists = db.query(Email).filter(Email.message_id == item['message_id']).first()
+        if not exists:
+            db_email = Email(inbox_id=inbox.id, status=EmailStatus.PENDING, **item)
+            db.add(db_email)
+            db.commit()
+            db.refresh(db_email)
+            added += 1
+    return added
+
+def bulk_ingest(db, inbox, items: list) -> int:
+    added = 0
+    for i in range(0, len(items), tasks.INGEST_CHUNK_SIZE):
+        added += len(tasks.ingest_emails(db, inbox, items[i:i + tasks.INGEST_CHUNK_SIZE]))
+    return added
+
+def run(name, ingest, db, inbox, items, duplicates: float):
+    # Pre-store a share of the batch so the dedup path is exercised too
+    stored = int(len(items) * duplicates)
+    tasks.ingest_emails(db, inbox, items[:stored])
+
+    start = time.perf_counter()
+    added = ingest(db, inbox, items)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {len(items) / elapsed:>10.0f} rows/sec ({added} inserted, {len(items) - added} duplicates, {elapsed:.2f}s)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=tasks.engine)
+    db = tasks.SessionLocal()
+    inbox = MonitoredInbox(email_address=f"bench-{time.time()}@example.com", imap_server="localhost", password="-")
+    db.add(inbox)
+    db.commit()
+
+    run("before", legacy_ingest, db, inbox, make_items(args.emails, 0), args.duplicates)
+    run("after", bulk_ingest, db, inbox, make_items(args.emails, args.emails), args.duplicates)
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+End-to-end throughput of the worker pipeline, offline. A synthetic mailbox
+built from example_emails.txt is served by the fake IMAP server, and the
+Celery tasks run eagerly in this process:
+- imap: tasks.sync_inbox fetches, cleans and stores the new mail, then
+  analyzes it through analyze_emails_batch (or analyze_stage with
+  --pipeline staged), as an incremental sync does.
+- api: emails are stored as POST /emails/ stores them, and each one is
+  analyzed by tasks.analyze_email.
+
+Storage is DATABASE_URL (a temporary SQLite file by default) and metrics
+and events go to a local Redis at REDIS_URL. --models stub swaps the
+models for deterministic stand-ins (--stub-ms simulates their cost per
+email), so the rest of the pipeline can be measured on its own;
+--models real loads the CPU models. Every email gets unique content, so
+the analysis cache never hits.
+
+Reports latency per pipeline stage (the stages the worker records in
+intellinbox_stage_duration_seconds), emails/sec and peak RSS. --output
+writes them as JSON together with the commit and settings, and
+--baseline compares the run with such a file:
+
+    python benchmarks/pipeline.py --emails 2000 --output before.json
+    python benchmarks/pipeline.py --emails 2000 --baseline before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/pipeline.db")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/15")
+os.environ.setdefault("IMAP_SSL", "0")
+
+import common
+
+from sqlalchemy import func, select
+
+from fake_imap import FakeIMAPServer, make_message
+from models import Base, Email, EmailStatus, MonitoredInbox
+
+LABELS = ["negative", "neutral", "positive"]
+# Relative change against the baseline beyond which a metric is flagged
+NOISE = 0.10
+
+class StubSentiment:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def __call__(self, contents, **kwargs):
+        time.sleep(self.delay * len(contents))
+        return [{"label": LABELS[zlib.crc32(content.encode()) % 3]} for content in contents]
+
+class StubSummary:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def __call__(self, contents, **kwargs):
+        time.sleep(self.delay * len(contents))
+        return [{"summary_text": " ".join(content.split()[:20])} for content in contents]
+
+class StubPriority:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def score(self, contents):
+        time.sleep(self.delay * len(contents))
+        return [zlib.crc32(content.encode()) % 1000 / 1000 for content in contents]
+
+def rss_mb() -> float:
+    """Peak RSS of this process so far."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def commit_id() -> str:
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=common.ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=common.ROOT, capture_output=True, text=True).stdout.strip()
+        return head + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class StageRecorder:
+    """Collects the stage timings the worker records, in this process."""
+    def __init__(self, metrics):
+        self.calls = {}
+        self.record_stage = metrics.record_stage
+        metrics.record_stage = self
+
+    def __call__(self, stage: str, seconds: float, items: int = 1, trace_ids=()):
+        self.calls.setdefault(stage, []).append((seconds, items))
+        self.record_stage(stage, seconds, items, trace_ids)
+
+    def report(self) -> dict:
+        stages = {}
+        for stage, calls in self.calls.items():
+            durations = sorted(seconds * 1000 for seconds, _ in calls)
+            items = sum(count for _, count in calls)
+            stages[stage] = {
+                "calls": len(calls),
+                "emails": items,
+                "total_s": round(sum(durations) / 1000, 3),
+                "p50_ms": round(statistics.median(durations), 2),
+                "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+                "max_ms": round(durations[-1], 2),
+                "ms_per_email": round(sum(durations) / max(items, 1), 3),
+            }
+        return stages
+
+def make_bodies(count: int, start: int) -> list:
+    """Example bodies, each led by a reference line so no two emails share content."""
+    examples = common.load_example_bodies()
+    return [f"Reference {start + i}.\n\n{examples[i % len(examples)]}" for i in range(count)]
+
+def deliver(server, count: int, start: int):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for i, body in enumerate(make_bodies(count, start)):
+        server.append(make_message(start + i, now - datetime.timedelta(seconds=count - i), body))
+
+def run_imap(server, inbox_id: int, count: int, start: int) -> list:
+    """Delivers count messages and syncs the inbox; returns the ids stored."""
+    import tasks
+    deliver(server, count, start)
+    with tasks.SessionLocal() as db:
+        since = db.scalar(select(func.max(Email.id)).where(Email.inbox_id == inbox_id)) or 0
+    tasks.sync_inbox_task.delay(inbox_id)
+    with tasks.SessionLocal() as db:
+        return list(db.scalars(select(Email.id).where(Email.inbox_id == inbox_id, Email.id > since)))
+
+def run_api(count: int, start: int) -> list:
+    """Stores count emails one by one as POST /emails/ does, each analyzed on its own."""
+    import tasks
+    ids = []
+    with tasks.SessionLocal() as db:
+        for i, body in enumerate(make_bodies(count, start)):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            email = Email(
+                sender=f"sender{i % 17}@example.com", subject=f"Synthetic message {start + i}", body=body,
+                received_at=now, queued_at=now
+            )
+            db.add(email)
+            db.commit()
+            ids.append(email.id)
+            tasks.analyze_email.delay(email.id)
+    return ids
+
+def outcome(email_ids: list) -> dict:
+    import tasks
+    with tasks.SessionLocal() as db:
+        counts = dict(db.execute(
+            select(Email.status, func.count()).where(Email.id.in_(email_ids)).group_by(Email.status)
+        ).all())
+    return {status.value: counts.get(status, 0) for status in EmailStatus}
+
+def compare(result: dict, baseline: dict):
+    """Prints each metric next to the baseline's, flagging changes beyond NOISE."""
+    if baseline["settings"] != result["settings"]:
+        print("Warning: the baseline was run with different settings")
+        for key in sorted(set(baseline["settings"]) | set(result["settings"])):
+            if baseline["settings"].get(key) != result["settings"].get(key):
+                print(f"  {key}: {baseline['settings'].get(key)} -> {result['settings'].get(key)}")
+
+    rows = [
+        ("emails/sec", baseline.get("emails_per_sec"), result["emails_per_sec"], True),
+        ("peak RSS MB", baseline.get("peak_rss_mb"), result["peak_rss_mb"], False),
+        ("untimed s", baseline.get("untimed_s"), result["untimed_s"], False),
+    ]
+    for stage in sorted(set(baseline["stages"]) | set(result["stages"])):
+        before, after = baseline["stages"].get(stage, {}), result["stages"].get(stage, {})
+        rows.append((f"{stage} ms/email", before.get("ms_per_email"), after.get("ms_per_email"), False))
+
+    print(f"\nagainst {baseline['commit']}")
+    print(f"{'metric':>24} {'baseline':>10} {'now':>10} {'change':>8}")
+    for label, before, after, higher_is_better in rows:
+        if before is None or after is None:
+            print(f"{label:>24} {before if before is not None else '-':>10} {after if after is not None else '-':>10}")
+            continue
+        change = (after - before) / before if before else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        flag = "" if abs(change) <= NOISE else " better" if better else " WORSE"
+        print(f"{label:>24} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=32, help="emails run through first and left out of the results")
+    parser.add_argument("--path", choices=["imap", "api"], default="imap")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub")
+    parser.add_argument("--stub-ms", type=float, default=0.0, help="simulated cost of each stub model per email")
+    parser.add_argument("--pipeline", choices=["combined", "staged"], default=os.getenv("ANALYSIS_PIPELINE", "combined"))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("ANALYSIS_BATCH_SIZE", "16")))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    args = parser.parse_args()
+
+    # Read by tasks at import time
+    os.environ["ANALYSIS_PIPELINE"] = args.pipeline
+    os.environ["ANALYSIS_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["MODEL_PRELOAD"] = "0"
+    import counters
+    import metrics
+    import tasks
+    from security import encrypt_password
+
+    try:
+        counters.redis_client.ping()
+    except counters.redis.RedisError as e:
+        sys.exit(f"Redis is not reachable at {os.environ['REDIS_URL']} ({e}); start one or set REDIS_URL.")
+
+    tasks.celery_app.conf.task_always_eager = True
+    tasks.celery_app.conf.task_eager_propagates = True
+    if args.models == "stub":
+        delay = args.stub_ms / 1000
+        tasks.MODEL_LOADERS.update({
+            "sentiment": lambda: StubSentiment(delay),
+            "summary": lambda: StubSummary(delay),
+            "priority": lambda: StubPriority(delay),
+        })
+    Base.metadata.create_all(bind=tasks.engine)
+    tasks.init_worker()
+    tasks.load_models(list(tasks.STAGES))
+
+    server = FakeIMAPServer().start_in_thread()
+    # Message numbers unique to this run, so a reused database never sees them as duplicates
+    start = time.time_ns() // 1000
+    with tasks.SessionLocal() as db:
+        inbox = MonitoredInbox(
+            email_address=f"pipeline-{start}@example.com", imap_server=server.address,
+            password=encrypt_password("bench"), uid_validity=server.mailbox.uid_validity, last_uid=0,
+            # An inbox whose history is imported, so syncs fetch the new mail
+            backfill_started_at=datetime.datetime.now(datetime.timezone.utc),
+            backfill_finished_at=datetime.datetime.now(datetime.timezone.utc)
+        )
+        db.add(inbox)
+        db.commit()
+        inbox_id = inbox.id
+
+    def run(count: int, first: int) -> list:
+        if args.path == "imap":
+            return run_imap(server, inbox_id, count, first)
+        return run_api(count, first)
+
+    run(args.warmup, start)
+    recorder = StageRecorder(metrics)
+    rss_before = rss_mb()
+    began = time.perf_counter()
+    email_ids = run(args.emails, start + args.warmup)
+    wall = time.perf_counter() - began
+    statuses = outcome(email_ids)
+
+    result = {
+        "commit": commit_id(),
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "settings": {
+            "emails": args.emails,
+            "path": args.path,
+            "models": args.models,
+            "stub_ms": args.stub_ms if args.models == "stub" else None,
+            "inference_backend": tasks.INFERENCE_BACKEND,
+            "pipeline": args.pipeline,
+            "batch_size": args.batch_size,
+            "ingest_chunk_size": tasks.INGEST_CHUNK_SIZE,
+            "database": tasks.engine.dialect.name,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "stored": len(email_ids),
+        "statuses": statuses,
+        "wall_s": round(wall, 3),
+        "emails_per_sec": round(statuses[EmailStatus.COMPLETED.value] / wall, 2),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+        "stages": recorder.report(),
+    }
+    # Work between the recorded stages: task overhead, loading rows, status and stats writes, the analysis cache
+    result["untimed_s"] = round(wall - sum(row["total_s"] for row in result["stages"].values()), 3)
+
+    settings = result["settings"]
+    print(f"\n{args.emails} emails via {args.path}, {args.models} models, {settings['pipeline']} pipeline, "
+          f"batch {settings['batch_size']}, {settings['database']} ({result['commit']})")
+    print(f"{'stage':>12} {'calls':>6} {'emails':>7} {'total s':>8} {'p50 ms':>8} {'p95 ms':>8} {'ms/email':>9}")
+    for stage, row in result["stages"].items():
+        print(f"{stage:>12} {row['calls']:>6} {row['emails']:>7} {row['total_s']:>8.2f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['ms_per_email']:>9.2f}")
+    print(f"\nstored {result['stored']} ({', '.join(f'{count} {status}' for status, count in statuses.items() if count)}) "
+          f"in {result['wall_s']:.1f}s ({result['untimed_s']:.1f}s outside the stages): {result['emails_per_sec']:.1f} emails/sec, peak RSS {result['peak_rss_mb']:.0f} MB "
+          f"({result['rss_before_mb']:.0f} MB before the run)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
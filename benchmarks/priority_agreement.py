@@ -0,0 +1,56 @@
+"""
+Agreement check between a priority engine and the priority_score values
+already stored in the analyses table (produced by the NLI engine).
+
+    DATABASE_URL=postgresql://... python benchmarks/priority_agreement.py --engine embedding --limit 500
+"""
+import argparse
+import os
+import time
+
+import common  # noqa: F401
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Analysis, Email
+from priority import compare_scores, load_priority_engine
+from tasks import prepare_content
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", default="embedding")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    db = sessionmaker(bind=create_engine(os.environ["DATABASE_URL"]))()
+    rows = (
+        db.query(Email, Analysis.priority_score)
+        .join(Analysis, Analysis.email_id == Email.id)
+        .filter(Analysis.priority_score.isnot(None))
+        .order_by(Email.id.desc())
+        .limit(args.limit)
+        .all()
+    )
+    if not rows:
+        raise SystemExit("No analysed emails to compare against.")
+
+    reference = [score for _, score in rows]
+    contents = [prepare_content(email) for email, _ in rows]
+
+    engine = load_priority_engine(args.engine)
+    start = time.perf_counter()
+    candidate = []
+    for i in range(0, len(contents), args.batch_size):
+        candidate.extend(engine.score(contents[i:i + args.batch_size]))
+    elapsed = time.perf_counter() - start
+
+    report = compare_scores(reference, candidate)
+    report["engine"] = engine.name
+    report["emails_per_sec"] = round(len(contents) / elapsed, 2)
+    for key, value in report.items():
+        print(f"{key:>18}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cost of clearing a large inbox on DATABASE_URL (Postgres). Seeds --rows
+emails, each with a body and an analysis, into a throwaway inbox twice.
+The first copy is removed the way DELETE /inboxes/{id} used to, with
+the ORM loading every email and analysis and deleting them row by row.
+The second is removed with purge.delete_batch, as tasks.purge_inbox does.
+For each it reports the total time and the longest transaction, i.e.
+how long the deleted rows stay locked.
+
+    DATABASE_URL=postgresql://... python benchmarks/purge.py --rows 100000
+"""
+import argparse
+import os
+import time
+
+import common  # noqa: F401
+
+from sqlalchemy import create_engine, delete, select, text
+from sqlalchemy.orm import Session
+
+import purge
+from models import Base, Email, MonitoredInbox
+
+SEED = [
+    """
+    INSERT INTO emails (inbox_id, sender, subject, received_at, snippet, message_id, status, created_at)
+    SELECT :inbox_id, 'bench@example.com', 'Purge ' || g, now() - g * interval '1 minute',
+           'Body text of a benchmark email.', '<purge-' || :inbox_id || '-' || g || '>', 'COMPLETED', now()
+    FROM generate_series(1, :rows) AS g
+    """,
+    """
+    INSERT INTO email_bodies (email_id, content, data)
+    SELECT id, repeat('Body text of a benchmark email. ', 20), convert_to(repeat('<p>Body text of a benchmark email.</p>', 100), 'UTF8')
+    FROM emails WHERE inbox_id = :inbox_id
+    """,
+    """
+    INSERT INTO analyses (email_id, priority_score, category, summary)
+    SELECT id, 0.5, 'neutral', 'A short summary.' FROM emails WHERE inbox_id = :inbox_id
+    """,
+]
+
+def seed(engine, rows: int) -> int:
+    with Session(engine) as db:
+        db.execute(delete(MonitoredInbox).where(MonitoredInbox.email_address.like("purge-bench-%")))
+        inbox = MonitoredInbox(email_address=f"purge-bench-{time.time_ns()}", imap_server="bench", password="bench")
+        db.add(inbox)
+        db.commit()
+        for statement in SEED:
+            db.execute(text(statement), {"inbox_id": inbox.id, "rows": rows})
+        db.commit()
+        return inbox.id
+
+def orm_delete(engine, inbox_id: int) -> tuple:
+    """The former cascade: one transaction that loads and deletes every row."""
+    start = time.perf_counter()
+    with Session(engine) as db:
+        inbox = db.get(MonitoredInbox, inbox_id)
+        for email in db.scalars(select(Email).where(Email.inbox_id == inbox_id)):
+            if email.analysis is not None:
+                db.delete(email.analysis)
+            db.delete(email)
+        db.delete(inbox)
+        db.commit()
+    total = (time.perf_counter() - start) * 1000
+    return total, total
+
+def batched_delete(engine, inbox_id: int) -> tuple:
+    start, longest = time.perf_counter(), 0.0
+    with Session(engine) as db:
+        while True:
+            batch_start = time.perf_counter()
+            deleted = purge.delete_batch(db, inbox_id)
+            db.commit()
+            longest = max(longest, (time.perf_counter() - batch_start) * 1000)
+            if deleted < purge.PURGE_BATCH_SIZE:
+                break
+        db.execute(delete(MonitoredInbox).where(MonitoredInbox.id == inbox_id))
+        db.commit()
+    return (time.perf_counter() - start) * 1000, longest
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    purge.ensure_cascades(engine)
+
+    print(f"\n{args.rows} emails with analyses, PURGE_BATCH_SIZE={purge.PURGE_BATCH_SIZE}")
+    print(f"{'method':>24} {'total ms':>10} {'longest tx ms':>14}")
+    for label, run in (("ORM cascade", orm_delete), ("batched purge", batched_delete)):
+        inbox_id = seed(engine, args.rows)
+        total, longest = run(engine, inbox_id)
+        print(f"{label:>24} {total:>10.0f} {longest:>14.0f}")
+
+if __name__ == "__main__":
+    main()
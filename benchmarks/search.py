@@ -0,0 +1,221 @@
+"""
+Latency of GET /search on a synthetic dataset (Postgres). Seeds
+DATABASE_URL once with --rows emails whose subjects, bodies and summaries
+are drawn from a skewed vocabulary, so queries range from very common to
+rare terms. Each query runs through search.text_search, the statement the
+route executes, ordered by relevance and by recency. It is compared with
+the ILIKE scan it replaces.
+
+With --semantic (needs the pgvector extension) --semantic-rows embeddings
+are stored as well, scattered around a few hundred topics as real ones
+cluster. HNSW nearest-neighbour latency and recall@k against an exact
+scan are then reported, for queries near stored emails.
+
+    DATABASE_URL=postgresql://... python benchmarks/search.py --rows 1000000 --semantic
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import common  # noqa: F401
+
+from sqlalchemy import create_engine, text
+
+import search
+from embeddings import SEARCH_EMBEDDING_DIMENSIONS
+from models import Base, MonitoredInbox
+
+SEED_INBOXES = 20
+VOCABULARY = 20000
+TOPICS = 300
+# Spread of an embedding around its topic, and of a query around a stored embedding
+TOPIC_SPREAD = 0.6
+QUERY_SPREAD = 0.3
+
+# 'term0' is in most bodies, 'term19000' in a handful; pow() skews the draw towards low ids
+WORDS = "(SELECT string_agg('term' || floor(pow(random(), 4) * {vocabulary})::int, ' ') FROM generate_series(1, {count}) WHERE g > 0)"
+
+SEED = [
+    """
+    INSERT INTO monitored_inboxes (email_address, imap_server, password, is_active, last_synced)
+    SELECT 'search-bench-' || g || '@example.com', 'imap.example.com', '-', true, now()
+    FROM generate_series(1, :inboxes) g
+    ON CONFLICT (email_address) DO NOTHING
+    """,
+    f"""
+    INSERT INTO emails (inbox_id, sender, subject, received_at, message_id, status, created_at)
+    SELECT
+        (SELECT min(id) FROM monitored_inboxes WHERE email_address LIKE 'search-bench-%') + g % :inboxes,
+        'Sender ' || g % 500 || ' <sender' || g % 500 || '@example' || g % 20 || '.com>',
+        {WORDS.format(vocabulary=VOCABULARY, count=5)},
+        now() - g * interval '30 seconds',
+        '<search-bench-' || g || '@example.com>',
+        'COMPLETED',
+        now()
+    FROM generate_series(1, :rows) g
+    """,
+    # Searched text only; the raw body is never read here, so it is stored uncompressed
+    f"""
+    INSERT INTO email_bodies (email_id, content, full_text, data)
+    SELECT id, body, body, convert_to(body, 'UTF8')
+    FROM (
+        SELECT id, {WORDS.format(vocabulary=VOCABULARY, count=60).replace("g > 0", "id > 0")} AS body
+        FROM emails WHERE message_id LIKE '<search-bench-%'
+    ) bodies
+    """,
+    f"""
+    INSERT INTO analyses (email_id, priority_score, summary, category, processed_at)
+    SELECT id, 0.5, {WORDS.format(vocabulary=VOCABULARY, count=10).replace("g > 0", "id > 0")}, 'neutral', now()
+    FROM emails
+    WHERE message_id LIKE '<search-bench-%' AND id % 5 <> 0
+    """,
+]
+
+QUERIES = {
+    "common term": "term0",
+    "mid term": "term500",
+    "rare term": "term19000",
+    "two terms": "term3 term900",
+    "phrase": '"term1 term2"',
+    "exclusion": "term40 -term0",
+    "sender": "sender42",
+    "no match": "zzzz",
+}
+
+ILIKE = """
+    SELECT emails.id FROM emails
+    JOIN email_bodies ON email_bodies.email_id = emails.id
+    LEFT JOIN analyses ON analyses.email_id = emails.id
+    WHERE emails.subject ILIKE :pattern OR email_bodies.full_text ILIKE :pattern OR analyses.summary ILIKE :pattern
+    ORDER BY emails.received_at DESC LIMIT :limit
+"""
+
+def seed(conn, rows: int):
+    existing = conn.execute(text("SELECT count(*) FROM emails WHERE message_id LIKE '<search-bench-%'")).scalar()
+    if existing >= rows:
+        return
+    print(f"Seeding {rows} emails...")
+    start = time.perf_counter()
+    conn.execute(text("DELETE FROM emails WHERE message_id LIKE '<search-bench-%'"))
+    for statement in SEED:
+        conn.execute(text(statement), {"rows": rows, "inboxes": SEED_INBOXES})
+    conn.commit()
+    print(f"Seeded in {time.perf_counter() - start:.0f}s")
+
+def seed_embeddings(conn, rows: int):
+    existing = conn.execute(text("SELECT count(*) FROM email_embeddings")).scalar()
+    if existing >= rows:
+        return
+    print(f"Seeding {rows} embeddings and building the HNSW index...")
+    start = time.perf_counter()
+    conn.execute(text("DROP INDEX IF EXISTS ix_email_embeddings_hnsw"))
+    conn.execute(text("TRUNCATE email_embeddings"))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE topics AS
+        SELECT t, array_agg(random() - 0.5 ORDER BY d) AS centre
+        FROM generate_series(0, {TOPICS - 1}) t, generate_series(1, {SEARCH_EMBEDDING_DIMENSIONS}) d
+        GROUP BY t
+    """))
+    conn.execute(text(f"""
+        INSERT INTO email_embeddings (email_id, embedding)
+        SELECT e.id, (
+            SELECT array_agg(topics.centre[d] + (random() - 0.5) * {TOPIC_SPREAD} ORDER BY d)
+            FROM generate_series(1, {SEARCH_EMBEDDING_DIMENSIONS}) d WHERE e.id > 0
+        )::vector
+        FROM (SELECT id FROM emails WHERE message_id LIKE '<search-bench-%' ORDER BY id LIMIT :rows) e
+        JOIN topics ON topics.t = e.id % {TOPICS}
+    """), {"rows": rows})
+    conn.commit()
+    # Rebuilds the dropped index, after the rows are in
+    search.ensure_search_schema(conn.engine)
+    print(f"Seeded and indexed in {time.perf_counter() - start:.0f}s")
+
+def timed(conn, statement, params=None, repeat: int = 5) -> tuple:
+    """Returns (median ms, p95 ms, rows) over repeat runs after one warm-up."""
+    rows = conn.execute(statement, params or {}).all()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement, params or {}).all()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))], rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--semantic", action="store_true")
+    parser.add_argument("--semantic-rows", type=int, default=100_000)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        seed(conn, args.rows)
+    # After seeding, so the vector columns and GIN indexes are built in one pass
+    search.ensure_search_schema(engine)
+
+    conditions = [MonitoredInbox.is_active == True]
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+        results = {}
+        for label, q in QUERIES.items():
+            matches = conn.execute(text(
+                "SELECT count(*) FROM email_bodies WHERE search_vector @@ websearch_to_tsquery('english', :q)"
+            ), {"q": q}).scalar()
+            # A single word, as a substring scan would be written
+            pattern = "%" + q.strip('"').split()[0] + "%"
+            ilike = timed(conn, text(ILIKE), {"pattern": pattern, "limit": args.limit}, repeat=1)
+            conn.commit()
+            # Under the settings the route applies to its transaction
+            for setting in search.settings("text"):
+                conn.execute(setting)
+            relevance = timed(conn, search.text_search(q, conditions, "relevance", args.limit), repeat=args.repeat)
+            recent = timed(conn, search.text_search(q, conditions, "recent", args.limit), repeat=args.repeat)
+            conn.commit()
+            results[label] = (matches, relevance, recent, ilike)
+
+        print(f"\n{'query':>12} {'matches':>8} {'relevance ms':>13} {'p95':>7} {'recent ms':>10} {'p95':>7} {'ILIKE ms':>9}")
+        for label, (matches, relevance, recent, ilike) in results.items():
+            print(f"{label:>12} {matches:>8} {relevance[0]:>13.1f} {relevance[1]:>7.1f} {recent[0]:>10.1f} {recent[1]:>7.1f} {ilike[0]:>9.1f}")
+
+        if not args.semantic:
+            return
+        search.SEMANTIC_SEARCH = True
+        search.ensure_search_schema(engine)
+        seed_embeddings(conn, args.semantic_rows)
+        conn.execute(text("ANALYZE email_embeddings"))
+        conn.commit()
+
+        rng = random.Random(0)
+        stored = conn.execute(text("SELECT count(*) FROM email_embeddings")).scalar()
+        latencies, exact_latencies, recalls = [], [], []
+        for _ in range(args.repeat):
+            # Near a stored email, as a query about one of the topics would be
+            near = conn.execute(text("SELECT embedding::text FROM email_embeddings ORDER BY email_id OFFSET :n LIMIT 1"),
+                                {"n": rng.randrange(stored)}).scalar()
+            vector = [float(value) + (rng.random() - 0.5) * QUERY_SPREAD for value in near.strip("[]").split(",")]
+            statement = search.semantic_search(vector, conditions, args.k)
+            for setting in search.settings("semantic"):
+                conn.execute(setting)
+            median, _, rows = timed(conn, statement, repeat=3)
+            latencies.append(median)
+            # Exact neighbours, with the index disabled
+            conn.execute(text("SET LOCAL enable_indexscan = off"))
+            exact_median, _, exact = timed(conn, statement, repeat=1)
+            conn.commit()
+            exact_latencies.append(exact_median)
+            recalls.append(len({row.email_id for row in rows} & {row.email_id for row in exact}) / args.k)
+
+        print(f"\nsemantic ({args.semantic_rows} vectors, k={args.k}): HNSW median {statistics.median(latencies):.1f} ms, "
+              f"max {max(latencies):.1f} ms; exact scan median {statistics.median(exact_latencies):.1f} ms; "
+              f"recall@{args.k} {statistics.mean(recalls):.3f}")
+
+if __name__ == "__main__":
+    main()
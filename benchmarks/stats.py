@@ -0,0 +1,80 @@
+"""
+Cost of the dashboard counts (GET /stats/emails) on a synthetic dataset.
+Seeds DATABASE_URL (Postgres) with the same --rows emails as
+email_listing.py. It then compares the grouped count over emails with
+reading the inbox_stats rollup, and times the rebuild and the per-batch
+delta upsert the worker adds to each analysis commit.
+
+    DATABASE_URL=postgresql://... python benchmarks/stats.py --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import time
+
+import common  # noqa: F401
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import rollups
+from email_listing import seed
+from models import Base, Email, EmailStatus, InboxStats, MonitoredInbox
+
+def timed(run, repeat: int) -> float:
+    """Median ms over repeat runs, after one warm-up."""
+    run()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        seed(conn, args.rows)
+
+    with Session(engine) as db:
+        start = time.perf_counter()
+        rollups.rebuild(db)
+        db.commit()
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        grouped = rollups.counts_query().join(MonitoredInbox, MonitoredInbox.id == Email.inbox_id).where(MonitoredInbox.is_active == True)
+        rollup = (
+            select(InboxStats.status, InboxStats.category, InboxStats.emails, InboxStats.urgent)
+            .join(MonitoredInbox, MonitoredInbox.id == InboxStats.inbox_id)
+            .where(MonitoredInbox.is_active == True)
+        )
+        live = rollups.summarize([row[1:] for row in db.execute(grouped).all()])
+        stored = rollups.summarize(db.execute(rollup).all())
+        grouped_ms = timed(lambda: db.execute(grouped).all(), args.repeat)
+        rollup_ms = timed(lambda: db.execute(rollup).all(), args.repeat)
+
+        # One analysis batch completing in one inbox, as analyze_emails_batch records it
+        inbox_id = db.scalar(select(InboxStats.inbox_id).limit(1))
+        deltas = {}
+        for category in ["positive", "neutral", "negative"] * (args.batch // 3) + ["neutral"] * (args.batch % 3):
+            rollups.move(deltas, inbox_id, rollups.state(EmailStatus.PROCESSING), rollups.state(EmailStatus.COMPLETED, category, 0.5))
+        def delta():
+            rollups.apply(db, deltas)
+            db.rollback()
+        delta_ms = timed(delta, args.repeat)
+
+    print(f"\ninbox_stats counts {stored['total']} emails; matches the grouped count: {'yes' if stored == live else 'NO'}")
+    print(f"{'grouped count over emails':>32} {grouped_ms:>9.1f} ms")
+    print(f"{'read inbox_stats':>32} {rollup_ms:>9.1f} ms")
+    print(f"{'rebuild inbox_stats':>32} {rebuild_ms:>9.1f} ms")
+    print(f"{f'delta for a {args.batch}-email batch':>32} {delta_ms:>9.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Throughput and output parity of fetcher.get_clean_text against the
+BeautifulSoup extractor it replaced (needs `pip install beautifulsoup4`).
+
+The corpus is every .html/.htm/.txt/.eml file under --corpus (e.g. a
+folder of exported newsletters), or, without one, the example emails plus
+generated marketing-style HTML. Parity is checked for the full output
+and for the 1024-character model window when extraction stops early.
+
+    python benchmarks/text_extraction.py --corpus ~/mail-samples --repeat 5
+"""
+import argparse
+import email
+import os
+import random
+import time
+
+from common import load_example_bodies
+
+from bs4 import BeautifulSoup
+
+from fetcher import get_clean_text
+from tasks import MODEL_INPUT_CHARS, truncate_thread
+
+def soup_clean_text(html_body):
+    """The original BeautifulSoup implementation."""
+    if not html_body:
+        return ""
+    soup = BeautifulSoup(html_body, "html.parser")
+
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+
+    return " ".join(soup.get_text(separator=" ").split())
+
+def load_corpus(path: str) -> list:
+    bodies = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            if name.endswith(".eml"):
+                with open(full, "rb") as f:
+                    msg = email.message_from_binary_file(f)
+                for part in msg.walk():
+                    if part.get_content_type() in ("text/html", "text/plain") and part.get_payload(decode=True):
+                        bodies.append(part.get_payload(decode=True).decode(errors="replace"))
+            elif name.endswith((".html", ".htm", ".txt")):
+                with open(full, errors="replace") as f:
+                    bodies.append(f.read())
+    return bodies
+
+def marketing_html(rng: random.Random, rows: int) -> str:
+    """A newsletter-shaped document: head styles, tracking scripts and nested layout tables."""
+    words = "offer exclusive members save today limited shipping free new arrivals &amp; deals &nbsp; your account".split()
+    style = "<style>" + "".join(f".c{i}{{color:#{i:06x};padding:{i % 9}px}}" for i in range(200)) + "</style>"
+    script = "<script>window.dataLayer=[];" + "track('open');" * 50 + "</script>"
+    cells = "".join(
+        f'<tr><td class="c{i}" style="font-family:Arial;width:600px"><table><tr><td>'
+        f'<a href="https://example.com/p/{i}?utm_source=mail&amp;id={i}">{" ".join(rng.choices(words, k=12))}</a>'
+        f'</td></tr></table></td></tr><!-- row {i} -->'
+        for i in range(rows)
+    )
+    return f"<!DOCTYPE html><html><head>{style}{script}</head><body><table>{cells}</table></body></html>"
+
+def timed(function, bodies: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            function(body)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus")
+    parser.add_argument("--synthetic", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        bodies = load_corpus(args.corpus)
+    else:
+        rng = random.Random(0)
+        bodies = load_example_bodies() + [marketing_html(rng, rng.randint(10, 800)) for _ in range(args.synthetic)]
+    megabytes = sum(len(body) for body in bodies) / 1e6
+    print(f"{len(bodies)} bodies, {megabytes:.1f} MB")
+
+    full_match = window_match = 0
+    for body in bodies:
+        expected = soup_clean_text(body)
+        full_match += get_clean_text(body) == expected
+        window = truncate_thread(get_clean_text(body, limit=MODEL_INPUT_CHARS))[:MODEL_INPUT_CHARS]
+        window_match += window == truncate_thread(expected)[:MODEL_INPUT_CHARS]
+    print(f"full output identical: {full_match}/{len(bodies)}, model window identical: {window_match}/{len(bodies)}")
+
+    print(f"{'extractor':>22} {'seconds':>9} {'bodies/sec':>11} {'MB/sec':>8}")
+    for label, function in (
+        ("beautifulsoup", soup_clean_text),
+        ("streaming", get_clean_text),
+        ("streaming, 1024 limit", lambda body: get_clean_text(body, limit=MODEL_INPUT_CHARS)),
+    ):
+        elapsed = timed(function, bodies, args.repeat)
+        print(f"{label:>22} {elapsed:>9.2f} {len(bodies) * args.repeat / elapsed:>11.1f} {megabytes * args.repeat / elapsed:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Golden check and microbenchmark for text_rules. The cases are the emails
+in example_emails.txt, each with reply, signature, newsletter and no-reply
+variants. Each case is run through the rules engine and compared with
+text_rules_golden.json, which was written by the original per-pattern
+implementations kept below. Those implementations are then timed against
+the engine.
+
+    python benchmarks/text_rules_check.py
+    python benchmarks/text_rules_check.py --write-golden   # after an intended rule change
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from email.message import EmailMessage
+
+from common import load_example_emails
+
+from text_rules import TextRules
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_rules_golden.json")
+
+def reference_truncate_thread(text: str) -> str:
+    markers = [
+        r"^From:",
+        r"^--- Original Message ---",
+        r"^________________________________",
+        r"^On\s.*\swrote:",
+        r"^Sent from my "
+    ]
+    clean_lines = []
+    for line in text.splitlines():
+        if any(re.match(marker, line.strip(), re.IGNORECASE) for marker in markers):
+            break
+        clean_lines.append(line)
+    return "\n".join(clean_lines).strip()
+
+def reference_is_promotional(msg, body):
+    sender = msg.get("From", "").lower()
+
+    important_keywords = ["security", "alert", "verification", "invoice", "receipt", "order"]
+    if "noreply" in sender and any(word in body.lower() for word in important_keywords):
+        return False
+
+    if msg.get("List-Unsubscribe"):
+        return True
+
+    promo_keywords = ["view in browser", "special offer", "discount", "opt out"]
+    if any(word in body.lower()[:500] for word in promo_keywords):
+        return True
+
+    return False
+
+VARIANTS = {
+    "plain": lambda e: (e["sender"], {}, e["body"]),
+    "reply": lambda e: (e["sender"], {}, e["body"] + "\n\nOn Mon, Jan 6, 2025 at 9:00 AM Alex <alex@example.com> wrote:\n> Earlier message"),
+    "forward": lambda e: (e["sender"], {}, e["body"] + "\n  --- Original Message ---\nFrom: someone@example.com\nOld text"),
+    "outlook": lambda e: (e["sender"], {}, e["body"] + "\n________________________________\nFrom: Alex\nSent: Monday"),
+    "signature": lambda e: (e["sender"], {}, e["body"] + "\n\nSent from my iPhone"),
+    "quoted-first": lambda e: (e["sender"], {}, "from: Alex\n" + e["body"]),
+    "promo-early": lambda e: (e["sender"], {}, "SPECIAL OFFER inside! " + e["body"]),
+    "promo-late": lambda e: (e["sender"], {}, "x" * 600 + " " + e["body"] + " discount"),
+    "unsubscribe": lambda e: (e["sender"], {"List-Unsubscribe": "<mailto:unsub@example.com>"}, e["body"]),
+    "noreply-invoice": lambda e: ("NoReply <noreply@shop.example>", {"List-Unsubscribe": "<https://shop.example/u>"}, e["body"] + " Your INVOICE is attached."),
+}
+
+def build_cases() -> list:
+    cases = []
+    for index, example in enumerate(load_example_emails()):
+        for variant, build in VARIANTS.items():
+            sender, headers, body = build(example)
+            msg = EmailMessage()
+            msg["From"] = sender
+            for name, value in headers.items():
+                msg[name] = value
+            cases.append((f"{index}:{variant}", msg, body))
+    return cases
+
+def evaluate(cases: list, truncate, is_promotional) -> dict:
+    return {
+        name: {"truncated": truncate(body), "promotional": is_promotional(msg, body)}
+        for name, msg, body in cases
+    }
+
+def timed(function, inputs: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in inputs:
+            function(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--write-golden", action="store_true")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.write_golden:
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump(evaluate(cases, reference_truncate_thread, reference_is_promotional), f, indent=2)
+        print(f"Wrote {len(cases)} golden cases to {GOLDEN_PATH}")
+        return
+
+    rules = TextRules.load()
+    with open(GOLDEN_PATH) as f:
+        golden = json.load(f)
+    actual = evaluate(cases, rules.truncate_thread, rules.is_promotional)
+    failures = [name for name in golden if actual.get(name) != golden[name]]
+    for name in failures:
+        print(f"MISMATCH {name}: expected {golden[name]!r}, got {actual.get(name)!r}")
+    print(f"golden: {len(golden) - len(failures)}/{len(golden)} cases match")
+
+    # Long inputs, where the per-pattern loop and whole-body lowercasing hurt most
+    thread = "\n".join(f"> quoted line {i} of an earlier message" for i in range(300)) + "\nOn Monday Alex wrote:\nold"
+    print(f"{'rule':>18} {'reference us':>13} {'engine us':>10} {'speedup':>8}")
+    for label, reference, engine, inputs in (
+        ("truncate_thread", reference_truncate_thread, rules.truncate_thread, [(body,) for _, _, body in cases]),
+        ("truncate (long)", reference_truncate_thread, rules.truncate_thread, [(thread,)]),
+        ("is_promotional", reference_is_promotional, rules.is_promotional, [(msg, body) for _, msg, body in cases]),
+        ("promo (200 KB)", reference_is_promotional, rules.is_promotional, [(cases[0][1], cases[0][2] * 400)]),
+    ):
+        calls = len(inputs) * args.repeat
+        before = timed(reference, inputs, args.repeat) / calls * 1e6
+        after = timed(engine, inputs, args.repeat) / calls * 1e6
+        print(f"{label:>18} {before:>13.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
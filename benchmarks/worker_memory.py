@@ -0,0 +1,75 @@
+"""
+Startup time and memory of a prefork worker pool with and without model
+preloading. The Celery prefork pool is reproduced with plain fork(): the
+parent runs preload_models (or not), then --concurrency children run
+init_worker and analyze a few example emails. Each child reports its
+ready time, RSS and PSS. The summed PSS is the pool's real footprint.
+
+    python benchmarks/worker_memory.py --concurrency 4
+"""
+import argparse
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+def child(results, emails: int):
+    import common
+    import tasks
+    from inference import process_memory_mb
+
+    start = time.perf_counter()
+    tasks.init_worker()
+    # Loads whatever the parent did not preload
+    tasks.load_models()
+    ready = time.perf_counter() - start
+
+    bodies = common.load_example_bodies()
+    tasks.run_models([tasks.clean_content(bodies[i % len(bodies)]) for i in range(emails)])
+    results.put({"ready_s": round(ready, 1), **process_memory_mb()})
+
+def pool(preload: bool, concurrency: int, emails: int) -> dict:
+    """Runs in a fresh spawned process so the two modes don't share memory."""
+    import common  # noqa: F401
+    import tasks
+    from inference import process_memory_mb
+
+    start = time.perf_counter()
+    if preload:
+        tasks.preload_models(sender=SimpleNamespace(concurrency=concurrency))
+    else:
+        tasks.pool_concurrency = concurrency
+    parent_load = time.perf_counter() - start
+
+    fork = multiprocessing.get_context("fork")
+    results = fork.Queue()
+    children = [fork.Process(target=child, args=(results, emails)) for _ in range(concurrency)]
+    for process in children:
+        process.start()
+    reports = [results.get() for _ in children]
+    for process in children:
+        process.join()
+
+    return {"parent_load_s": round(parent_load, 1), "parent": process_memory_mb(), "children": reports}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--emails", type=int, default=8)
+    args = parser.parse_args()
+
+    spawn = multiprocessing.get_context("spawn")
+    for preload in (False, True):
+        with spawn.Pool(1) as runner:
+            report = runner.apply(pool, (preload, args.concurrency, args.emails))
+
+        print(f"\n== {'preloaded in parent' if preload else 'loaded per child'} (parent load {report['parent_load_s']}s) ==")
+        print(f"{'process':>8} {'ready s':>8} {'RSS MB':>8} {'PSS MB':>8}")
+        parent = report["parent"]
+        print(f"{'parent':>8} {'-':>8} {parent.get('rss_mb', '?'):>8} {parent.get('pss_mb', '?'):>8}")
+        for i, result in enumerate(report["children"]):
+            print(f"{'child ' + str(i):>8} {result['ready_s']:>8} {result.get('rss_mb', '?'):>8} {result.get('pss_mb', '?'):>8}")
+        total = parent.get("pss_mb", 0) + sum(result.get("pss_mb", 0) for result in report["children"])
+        print(f"{'total':>8} {'':>8} {'':>8} {total:>8}")
+
+if __name__ == "__main__":
+    main()
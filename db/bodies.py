@@ -0,0 +1,26 @@
+"""
+Email bodies live in email_bodies, one row per email, so the emails rows
+that listings, scans and vacuum walk hold only short columns. The worker
+cleans each body once, at ingest, into the thread-truncated model input
+(email_bodies.content), the whole text search indexes
+(email_bodies.full_text) and the listing snippet (emails.snippet). The raw
+body is kept zlib-compressed and is only read back for GET /emails/{id}
+and for emails created through the API, which are cleaned on their first
+analysis.
+"""
+import os
+import zlib
+
+# zlib level of the stored bodies; 1 is fastest, 9 smallest
+BODY_COMPRESSION_LEVEL = int(os.getenv("BODY_COMPRESSION_LEVEL", "6"))
+# Characters of the cleaned text kept on emails for listings
+SNIPPET_CHARS = 200
+
+def compress(body: str) -> bytes:
+    return zlib.compress(body.encode("utf-8"), BODY_COMPRESSION_LEVEL)
+
+def decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+def snippet(content: str) -> str:
+    return content[:SNIPPET_CHARS]
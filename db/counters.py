@@ -0,0 +1,29 @@
+import os
+
+import redis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+redis_client = redis.Redis.from_url(REDIS_URL)
+
+def incr(group: str, field: str, amount: int = 1):
+    """Increments a counter shared by every worker and API process."""
+    try:
+        redis_client.hincrby(f"stats:{group}", field, amount)
+    except redis.RedisError as e:
+        print(f"COUNTER ERROR for {group}.{field}: {str(e)}")
+
+def read(group: str) -> dict:
+    return {
+        field.decode(): int(value)
+        for field, value in redis_client.hgetall(f"stats:{group}").items()
+    }
+
+def mark_live(key: str, ttl: int):
+    """Flags something as alive for ttl seconds (e.g. an IDLE connection)."""
+    redis_client.set(f"live:{key}", 1, ex=ttl)
+
+def live(keys: list) -> list:
+    if not keys:
+        return []
+    return [value is not None for value in redis_client.mget([f"live:{key}" for key in keys])]
@@ -0,0 +1,40 @@
+"""
+Sentence embeddings for semantic search. The worker embeds each analyzed
+email and the API embeds the search query, both with the same encoder,
+which is loaded on first use (torch and transformers are only imported then).
+"""
+import os
+import threading
+
+SEARCH_EMBEDDING_MODEL = os.getenv("SEARCH_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Must match the model's output size; it is baked into the email_embeddings column
+SEARCH_EMBEDDING_DIMENSIONS = int(os.getenv("SEARCH_EMBEDDING_DIMENSIONS", "384"))
+# Tokens of each text the encoder reads
+SEARCH_EMBEDDING_MAX_TOKENS = 256
+
+encoder = None
+encoder_lock = threading.Lock()
+
+def get_encoder():
+    """Returns (tokenizer, model), loading them once per process."""
+    global encoder
+    with encoder_lock:
+        if encoder is None:
+            from transformers import AutoModel, AutoTokenizer
+            encoder = (
+                AutoTokenizer.from_pretrained(SEARCH_EMBEDDING_MODEL),
+                AutoModel.from_pretrained(SEARCH_EMBEDDING_MODEL).eval()
+            )
+    return encoder
+
+def embed(texts: list) -> list:
+    """L2-normalised, mean-pooled embeddings, as lists of floats."""
+    import torch
+
+    tokenizer, model = get_encoder()
+    inputs = tokenizer(texts, padding=True, truncation=True, max_length=SEARCH_EMBEDDING_MAX_TOKENS, return_tensors="pt")
+    with torch.no_grad():
+        hidden = model(**inputs).last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+    return torch.nn.functional.normalize(pooled, dim=-1).tolist()
@@ -0,0 +1,40 @@
+import datetime
+import json
+
+import redis
+
+from counters import redis_client
+from models import EmailStatus
+
+# Redis pub/sub channel the API relays to clients as server-sent events
+EVENTS_CHANNEL = "events:emails"
+
+def publish(event: str, **payload):
+    """
+    Announces a change to any listening API process. Delivery is best
+    effort: clients resync from GET /emails whenever their stream reconnects.
+    """
+    try:
+        redis_client.publish(EVENTS_CHANNEL, json.dumps({"event": event, **payload}))
+    except redis.RedisError as e:
+        print(f"EVENT ERROR for {event}: {str(e)}")
+
+def publish_status(email_ids: list, status):
+    if email_ids:
+        publish("status", email_ids=list(email_ids), status=status.value)
+
+def publish_analysis(email_id: int, result: dict, status=None):
+    """
+    Carries Analysis fields as they are written. The staged pipeline sends
+    one partial result per stage, with the email still PROCESSING until the last.
+    """
+    publish(
+        "analysis",
+        email_id=email_id,
+        status=(status or EmailStatus.COMPLETED).value,
+        analysis={**result, "processed_at": datetime.datetime.now(datetime.timezone.utc).isoformat()},
+    )
+
+def publish_created(inbox_id: int, email_ids: list):
+    if email_ids:
+        publish("created", inbox_id=inbox_id, email_ids=list(email_ids))
@@ -0,0 +1,163 @@
+"""
+Pipeline metrics shared by the worker and the API. Worker processes record
+histograms, counters and trace spans in Redis; the API renders them in the
+Prometheus text format at GET /metrics. Everything is keyed in Redis, so
+every prefork child and every container adds to the same series.
+"""
+import json
+import time
+import uuid
+from contextlib import contextmanager
+
+import redis
+
+from counters import redis_client
+
+# Upper bounds of the histogram buckets, in seconds (+Inf is implied)
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, 3600]
+# Spans of a trace are kept this long
+TRACE_TTL_SECONDS = 24 * 3600
+# Traces kept in the slowest-emails ranking
+SLOWEST_TRACES = 100
+
+# name -> (type, help) of every metric the pipeline records
+METRICS = {
+    "intellinbox_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage, per call."),
+    "intellinbox_analysis_lag_seconds": ("histogram", "Time from an email being stored to its analysis completing."),
+    "intellinbox_model_load_seconds": ("histogram", "Time to load a model in a worker process."),
+    "intellinbox_stage_items_total": ("counter", "Emails handled by each pipeline stage."),
+    "intellinbox_emails_fetched_total": ("counter", "Emails fetched from IMAP and stored."),
+    "intellinbox_emails_analyzed_total": ("counter", "Emails whose analysis completed."),
+}
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def label_text(labels: dict) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+def observe(name: str, values: list, **labels):
+    """Adds observations to a histogram with one Redis round trip."""
+    if not values:
+        return
+    labels = label_text(labels)
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            for value in values:
+                bucket = next((str(bound) for bound in BUCKETS if value <= bound), "+Inf")
+                pipe.hincrby(f"metrics:{name}", f"{labels}|{bucket}", 1)
+            pipe.hincrbyfloat(f"metrics:{name}", f"{labels}|sum", sum(values))
+            pipe.hincrby(f"metrics:{name}", f"{labels}|count", len(values))
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"METRICS ERROR for {name}: {str(e)}")
+
+def inc(name: str, amount: int = 1, **labels):
+    if not amount:
+        return
+    try:
+        redis_client.hincrby(f"metrics:{name}", label_text(labels), amount)
+    except redis.RedisError as e:
+        print(f"METRICS ERROR for {name}: {str(e)}")
+
+def span(trace_ids, name: str, seconds: float, **attrs):
+    """Appends a span to each trace, e.g. the batches an email passed through."""
+    trace_ids = {trace_id for trace_id in trace_ids if trace_id}
+    if not trace_ids:
+        return
+    entry = json.dumps({"span": name, "ms": round(seconds * 1000, 1), "at": time.time(), **attrs})
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            for trace_id in trace_ids:
+                pipe.rpush(f"trace:{trace_id}", entry)
+                pipe.expire(f"trace:{trace_id}", TRACE_TTL_SECONDS)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"METRICS ERROR for trace span {name}: {str(e)}")
+
+def record_stage(stage: str, seconds: float, items: int = 1, trace_ids=()):
+    observe("intellinbox_stage_duration_seconds", [seconds], stage=stage)
+    inc("intellinbox_stage_items_total", items, stage=stage)
+    span(trace_ids, stage, seconds, items=items)
+
+@contextmanager
+def timed(stage: str, items: int = 1, trace_ids=()):
+    """Times a pipeline stage into the stage histogram and the given traces."""
+    start = time.perf_counter()
+    yield
+    record_stage(stage, time.perf_counter() - start, items, trace_ids)
+
+def record_completed(emails: dict):
+    """
+    Counts completed analyses and their lag since the email was stored.
+    emails maps email id -> (created_at, trace_id).
+    """
+    now = time.time()
+    lags = {email_id: now - created_at.timestamp() for email_id, (created_at, _) in emails.items() if created_at}
+    observe("intellinbox_analysis_lag_seconds", list(lags.values()))
+    inc("intellinbox_emails_analyzed_total", len(emails))
+    ranked = {
+        f"{trace_id}:{email_id}": lags[email_id]
+        for email_id, (_, trace_id) in emails.items() if trace_id and email_id in lags
+    }
+    if not ranked:
+        return
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd("traces:slowest", ranked)
+            pipe.zremrangebyrank("traces:slowest", 0, -SLOWEST_TRACES - 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"METRICS ERROR for slowest traces: {str(e)}")
+
+def read_trace(trace_id: str) -> list:
+    return [json.loads(entry) for entry in redis_client.lrange(f"trace:{trace_id}", 0, -1)]
+
+def slowest_traces(limit: int = 20) -> list:
+    """The emails with the longest analysis lag, slowest first."""
+    ranked = redis_client.zrevrange("traces:slowest", 0, limit - 1, withscores=True)
+    return [
+        {"trace_id": member.decode().partition(":")[0], "email_id": int(member.decode().partition(":")[2]), "lag_seconds": round(lag, 3)}
+        for member, lag in ranked
+    ]
+
+def family(name: str, kind: str, help_text: str, samples: list) -> list:
+    """Prometheus text lines for one metric; samples are (suffix, labels, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{{{labels}}} {value}" if labels else f"{name}{suffix} {value}")
+    return lines
+
+def histogram_samples(fields: dict) -> list:
+    """Turns the stored per-bucket counts into cumulative Prometheus buckets."""
+    series = {}
+    for field, value in fields.items():
+        labels, _, part = field.rpartition("|")
+        series.setdefault(labels, {})[part] = value
+    samples = []
+    for labels, parts in sorted(series.items()):
+        cumulative = 0
+        for bound in [str(bound) for bound in BUCKETS] + ["+Inf"]:
+            cumulative += int(parts.get(bound, 0))
+            bucket_labels = ",".join(filter(None, [labels, f'le="{bound}"']))
+            samples.append(("_bucket", bucket_labels, cumulative))
+        samples.append(("_sum", labels, round(float(parts.get("sum", 0)), 6)))
+        samples.append(("_count", labels, int(parts.get("count", 0))))
+    return samples
+
+def render() -> list:
+    """Prometheus text lines for every metric in METRICS."""
+    with redis_client.pipeline(transaction=False) as pipe:
+        for name in METRICS:
+            pipe.hgetall(f"metrics:{name}")
+        stored = pipe.execute()
+
+    lines = []
+    for (name, (kind, help_text)), raw in zip(METRICS.items(), stored):
+        fields = {field.decode(): value.decode() for field, value in raw.items()}
+        if kind == "histogram":
+            samples = histogram_samples(fields)
+        else:
+            samples = [("", labels, int(value)) for labels, value in sorted(fields.items())]
+        lines += family(name, kind, help_text, samples)
+    return lines
@@ -0,0 +1,220 @@
+"""
+In-place upgrades of Postgres databases created by an earlier version.
+create_all only creates missing tables, so the columns added to existing
+tables since are applied here at API startup. Each step looks up what
+already exists first and is written to be rerun, and schema_lock makes
+API replicas that start together take turns.
+"""
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+import bodies
+from models import EmailBody
+
+# (table, column) -> statement filling in a just-added column for the rows that predate it
+COLUMN_BACKFILLS = {
+    # Inboxes registered before chunked imports had their history fetched already; incremental
+    # syncs skip an inbox whose import hasn't finished
+    ("monitored_inboxes", "backfill_finished_at"):
+        "UPDATE monitored_inboxes SET backfill_started_at = last_synced, backfill_finished_at = last_synced",
+}
+
+# Emails whose raw body is moved into email_bodies per transaction
+BODY_MOVE_BATCH_SIZE = 1000
+
+# pg_advisory_lock key held while the schema is created or upgraded
+SCHEMA_LOCK_KEY = 7_240_311_052
+# How often a process waiting for the schema lock tries again
+SCHEMA_LOCK_POLL_SECONDS = 1
+
+# (table, column, definition) of every column added to a table after it was first released
+COLUMNS = [
+    # IMAP sync state
+    ("monitored_inboxes", "uid_validity", "BIGINT"),
+    ("monitored_inboxes", "last_uid", "BIGINT"),
+    # Analysis scheduling
+    ("emails", "queued_at", "TIMESTAMP WITH TIME ZONE"),
+    # Backfill progress
+    ("monitored_inboxes", "backfill_total", "INTEGER NOT NULL DEFAULT 0"),
+    ("monitored_inboxes", "backfill_done", "INTEGER NOT NULL DEFAULT 0"),
+    ("monitored_inboxes", "backfill_started_at", "TIMESTAMP WITH TIME ZONE"),
+    ("monitored_inboxes", "backfill_finished_at", "TIMESTAMP WITH TIME ZONE"),
+    ("monitored_inboxes", "sync_days", "INTEGER NOT NULL DEFAULT 30"),
+    # Listing snippet of the cleaned text
+    ("emails", "snippet", f"VARCHAR({bodies.SNIPPET_CHARS}) NOT NULL DEFAULT ''"),
+    # Tracing
+    ("emails", "trace_id", "VARCHAR(32)"),
+    # Purge progress
+    ("monitored_inboxes", "purge_total", "INTEGER NOT NULL DEFAULT 0"),
+    ("monitored_inboxes", "purge_done", "INTEGER NOT NULL DEFAULT 0"),
+    ("monitored_inboxes", "purge_started_at", "TIMESTAMP WITH TIME ZONE"),
+    ("monitored_inboxes", "purge_finished_at", "TIMESTAMP WITH TIME ZONE"),
+    ("monitored_inboxes", "deleting", "BOOLEAN NOT NULL DEFAULT false"),
+]
+
+# Index name -> DDL of every index added to a table after it was first released. Built
+# CONCURRENTLY, so writes go on while a large table is indexed
+INDEXES = {
+    # Upserts of an email's analysis conflict on it
+    "ix_analyses_email_id": "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_analyses_email_id ON analyses (email_id)",
+    # Keyset pagination and filters of GET /emails
+    "ix_emails_received_at_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emails_received_at_id ON emails (received_at, id)",
+    "ix_emails_inbox_received_at_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emails_inbox_received_at_id ON emails (inbox_id, received_at, id)",
+    "ix_emails_status_received_at_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emails_status_received_at_id ON emails (status, received_at, id)",
+    "ix_analyses_category_email_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analyses_category_email_id ON analyses (category, email_id)",
+    "ix_analyses_priority_score_email_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analyses_priority_score_email_id ON analyses (priority_score, email_id)",
+    # Bodies tasks.clean_stored_bodies still has to clean
+    "ix_email_bodies_uncleaned": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_email_bodies_uncleaned ON email_bodies (email_id) WHERE content IS NULL",
+}
+
+@contextmanager
+def schema_lock(engine):
+    """
+    Holds a session-level advisory lock for the block on Postgres, so only
+    one process creates or upgrades the schema at a time. The lock is held
+    on its own autocommit connection, and waiters poll rather than block in
+    pg_advisory_lock: a waiting statement keeps a snapshot open, which the
+    holder's CREATE INDEX CONCURRENTLY would in turn wait for.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY}).scalar():
+            time.sleep(SCHEMA_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+def upgrade(engine):
+    """Applies every pending upgrade step; does nothing outside Postgres."""
+    if engine.dialect.name != "postgresql":
+        return
+    add_columns(engine)
+    move_bodies(engine)
+    valid = index_validity(engine)
+    if not valid.get("ix_analyses_email_id"):
+        dedupe_analyses(engine)
+    create_indexes(engine, INDEXES, valid)
+
+def add_columns(engine):
+    """
+    Adds the COLUMNS that are missing, filling in those with a
+    COLUMN_BACKFILLS entry in the same transaction. Existing columns are
+    looked up first, so a restart takes no locks on the tables. Adding a
+    column with a constant default doesn't rewrite the table.
+    """
+    with engine.begin() as conn:
+        existing = set(conn.execute(text(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+        )).all())
+        for table, column, definition in COLUMNS:
+            if (table, column) not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}"))
+                if (table, column) in COLUMN_BACKFILLS:
+                    conn.execute(text(COLUMN_BACKFILLS[table, column]))
+
+def index_validity(engine) -> dict:
+    """Index name -> whether it is valid, for every index in the schema."""
+    with engine.connect() as conn:
+        return dict(conn.execute(text("""
+            SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relnamespace = CAST(current_schema() AS regnamespace)
+        """)).all())
+
+def create_indexes(engine, indexes: dict, valid: dict):
+    """
+    Builds the indexes that are missing, outside a transaction as CREATE
+    INDEX CONCURRENTLY requires. A build that failed part way leaves an
+    invalid index behind, which is dropped and built again.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, ddl in indexes.items():
+            if valid.get(name) is False:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            if not valid.get(name):
+                conn.execute(text(ddl))
+
+def dedupe_analyses(engine):
+    """
+    Before analyses.email_id was unique, a retried task could store a
+    second analysis for an email. Keeps the newest of each email's analyses.
+    """
+    with engine.begin() as conn:
+        removed = conn.execute(text(
+            "DELETE FROM analyses a USING analyses b WHERE a.email_id = b.email_id AND a.id < b.id"
+        )).rowcount
+    if removed:
+        print(f"--- Removed {removed} duplicate analyses ---")
+
+def move_bodies(engine):
+    """
+    Moves the raw bodies of a database created before email_bodies out of
+    emails.body, compressed, BODY_MOVE_BATCH_SIZE emails per transaction.
+    Their cleaned text and snippet are left unset for the worker's
+    tasks.clean_stored_bodies, which has the text rules. The last pass
+    runs under a table lock together with dropping the column, and copies
+    every email still without a body row, so none stored meanwhile by a
+    worker not yet upgraded is lost. On a large table, running this
+    module beforehand does the bulk of the work ahead of the upgrade.
+    """
+    if not has_legacy_bodies(engine):
+        return
+    moved = copy_bodies(engine)
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE emails IN ACCESS EXCLUSIVE MODE"))
+        after = 0
+        while True:
+            count, after = move_body_batch(conn, after)
+            moved += count
+            if count < BODY_MOVE_BATCH_SIZE:
+                break
+        conn.execute(text("ALTER TABLE emails DROP COLUMN body"))
+    print(f"--- Moved {moved} email bodies to email_bodies ---")
+
+def has_legacy_bodies(engine) -> bool:
+    """Whether emails still has the body column that email_bodies replaced."""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'emails' AND column_name = 'body'
+        """)).first() is not None
+
+def copy_bodies(engine) -> int:
+    """Copies the bodies not moved yet, one transaction per batch, without locking emails; returns how many."""
+    after, moved = 0, 0
+    while True:
+        with engine.begin() as conn:
+            count, after = move_body_batch(conn, after)
+        moved += count
+        if count < BODY_MOVE_BATCH_SIZE:
+            return moved
+
+def move_body_batch(conn, after: int):
+    """
+    Copies the bodies of the next emails by id after `after` that have no
+    email_bodies row yet; returns (count, last id).
+    """
+    rows = conn.execute(text("""
+        SELECT e.id, e.body FROM emails e
+        WHERE e.id > :after AND NOT EXISTS (SELECT 1 FROM email_bodies b WHERE b.email_id = e.id)
+        ORDER BY e.id LIMIT :limit
+    """), {"after": after, "limit": BODY_MOVE_BATCH_SIZE}).all()
+    if rows:
+        conn.execute(
+            postgresql.insert(EmailBody).on_conflict_do_nothing(index_elements=["email_id"]),
+            [{"email_id": email_id, "data": bodies.compress(body or "")} for email_id, body in rows]
+        )
+    return len(rows), rows[-1][0] if rows else after
+
+if __name__ == "__main__":
+    # Moves the bodies of a large database ahead of an upgrade, while the previous version still serves;
+    # the API's startup then only copies those stored since. From the API image: python migrations.py
+    from database import engine
+    if engine.dialect.name == "postgresql" and has_legacy_bodies(engine):
+        EmailBody.__table__.create(engine, checkfirst=True)
+        print(f"--- Moved {copy_bodies(engine)} email bodies to email_bodies ---")
@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
 import enum
 from typing import List, Optional
-from sqlalchemy import Boolean, String, Text, Float, DateTime, ForeignKey, Enum as sqlalchemy_Enum, func
+from sqlalchemy import BigInteger, Boolean, DDL, Date, Integer, LargeBinary, String, Text, Float, DateTime, ForeignKey, Enum as sqlalchemy_Enum, Index, event, false, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+import bodies
 from database import Base
 
 class EmailStatus(str, enum.Enum):
@@ -12,6 +13,12 @@ class EmailStatus(str, enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class BackfillStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class Email(Base):
     __tablename__ = "emails"
 
@@ -23,8 +30,11 @@ class Email(Base):
     sender: Mapped[str] = mapped_column(String(255))
     subject: Mapped[str] = mapped_column(String(255))
     received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
-    body: Mapped[str] = mapped_column(Text)
+    # Start of the cleaned text, for listings; the body itself is in email_bodies (see bodies.py)
+    snippet: Mapped[str] = mapped_column(String(bodies.SNIPPET_CHARS), default="", server_default="")
     message_id: Mapped[Optional[str]] = mapped_column(String(255), unique=True, index=True)
+    # Shared by every email of one fetch, and by the spans of the tasks that analyze them
+    trace_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
 
     status: Mapped[EmailStatus] = mapped_column(
         sqlalchemy_Enum(EmailStatus), 
@@ -35,17 +45,63 @@ class Email(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # When analysis was queued; backfilled emails stay unset until the scheduler releases them
+    queued_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
+    # passive_deletes: the database cascades the delete, so the ORM never loads the analysis just to delete it
     analysis: Mapped["Analysis"] = relationship(
-        back_populates="email", cascade="all, delete-orphan", uselist=False
+        back_populates="email", cascade="all, delete-orphan", uselist=False, passive_deletes=True
     )
+    stored_body: Mapped[Optional["EmailBody"]] = relationship(
+        cascade="all, delete-orphan", uselist=False, passive_deletes=True
+    )
+
+    @property
+    def body(self) -> str:
+        """The raw body; loads it from email_bodies unless it was eager-loaded."""
+        return bodies.decompress(self.stored_body.data) if self.stored_body else ""
+
+    @body.setter
+    def body(self, value: str):
+        self.stored_body = EmailBody(data=bodies.compress(value))
+
+    __table_args__ = (
+        # Keyset pagination of GET /emails, optionally narrowed by inbox or status
+        Index("ix_emails_received_at_id", "received_at", "id"),
+        Index("ix_emails_inbox_received_at_id", "inbox_id", "received_at", "id"),
+        Index("ix_emails_status_received_at_id", "status", "received_at", "id"),
+    )
+
+
+class EmailBody(Base):
+    __tablename__ = "email_bodies"
+
+    email_id: Mapped[int] = mapped_column(ForeignKey("emails.id", ondelete="CASCADE"), primary_key=True)
+    # Cleaned, thread-truncated text the models read. Unset for emails created through the API until their
+    # first analysis, and for bodies moved over by migrations.py until tasks.clean_stored_bodies reaches them
+    content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Cleaned text of the whole body, quoted replies included, that search.py indexes. Set with content
+    full_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # The raw body as fetched, zlib-compressed UTF-8
+    data: Mapped[bytes] = mapped_column(LargeBinary, deferred=True)
+
+    __table_args__ = (
+        # Bodies still to be cleaned, so looking for them doesn't scan the table
+        Index("ix_email_bodies_uncleaned", "email_id", postgresql_where=content.is_(None), sqlite_where=content.is_(None)),
+    )
+
+# Already compressed, so Postgres should store it out of line without trying to compress it again
+event.listen(
+    EmailBody.__table__, "after_create",
+    DDL("ALTER TABLE email_bodies ALTER COLUMN data SET STORAGE EXTERNAL").execute_if(dialect="postgresql")
+)
 
 
 class Analysis(Base):
     __tablename__ = "analyses"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    email_id: Mapped[int] = mapped_column(ForeignKey("emails.id"))
+    email_id: Mapped[int] = mapped_column(ForeignKey("emails.id", ondelete="CASCADE"))
     
     # ML Outputs
     priority_score: Mapped[float] = mapped_column(Float, nullable=True)
@@ -58,6 +114,13 @@ class Analysis(Base):
 
     email: Mapped["Email"] = relationship(back_populates="analysis")
 
+    __table_args__ = (
+        Index("ix_analyses_email_id", "email_id", unique=True),
+        # Category and minimum-priority filters of GET /emails
+        Index("ix_analyses_category_email_id", "category", "email_id"),
+        Index("ix_analyses_priority_score_email_id", "priority_score", "email_id"),
+    )
+
 class MonitoredInbox(Base):
     __tablename__ = "monitored_inboxes"
 
@@ -70,6 +133,94 @@ class MonitoredInbox(Base):
         DateTime(timezone=True), onupdate=func.now(), server_default=func.now()
     )
 
+    # IMAP sync state: mailbox UIDVALIDITY and the highest UID already fetched
+    uid_validity: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    last_uid: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+
+    # Historical backfill progress, in UIDs, summed over the inbox's BackfillChunks
+    backfill_total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    backfill_done: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    backfill_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    backfill_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Days of history the import covers; kept so a sync can plan an import its setup task never did
+    sync_days: Mapped[int] = mapped_column(Integer, default=30, server_default="30")
+
+    # Progress of removing the inbox's emails (reset or delete), in emails; see purge.py
+    purge_total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    purge_done: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    purge_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    purge_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # The inbox row itself goes once its emails are purged
+    deleting: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
+
+    # Deleted in batches by purge.py; passive_deletes keeps the ORM from loading every email on delete
     emails: Mapped[List["Email"]] = relationship(
-        back_populates="inbox", cascade="all, delete-orphan"
+        back_populates="inbox", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+class BackfillChunk(Base):
+    """
+    One UID range of an inbox's historical import. next_uid is the resume
+    checkpoint: every matching UID below it has already been stored.
+    """
+    __tablename__ = "backfill_chunks"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    inbox_id: Mapped[int] = mapped_column(ForeignKey("monitored_inboxes.id", ondelete="CASCADE"), index=True)
+
+    # UIDs are only meaningful under the UIDVALIDITY they were planned with
+    uid_validity: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    uid_start: Mapped[int] = mapped_column(BigInteger)
+    uid_end: Mapped[int] = mapped_column(BigInteger)
+    next_uid: Mapped[int] = mapped_column(BigInteger)
+    uid_count: Mapped[int] = mapped_column(Integer)
+    uid_done: Mapped[int] = mapped_column(Integer, default=0)
+    since: Mapped[date] = mapped_column(Date)
+
+    status: Mapped[BackfillStatus] = mapped_column(
+        sqlalchemy_Enum(BackfillStatus),
+        default=BackfillStatus.PENDING,
+        nullable=False
+    )
+    fetched: Mapped[int] = mapped_column(Integer, default=0)
+    # Tasks that claimed the chunk; after BACKFILL_MAX_ATTEMPTS it is given up as FAILED
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Heartbeat of the task working on the chunk; a stale RUNNING chunk is resumed
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+class InboxStats(Base):
+    """
+    Rollup of an inbox's emails by status and, once completed, category.
+    Kept current by deltas from the writers and rebuilt periodically (see rollups.py).
+    """
+    __tablename__ = "inbox_stats"
+
+    inbox_id: Mapped[int] = mapped_column(ForeignKey("monitored_inboxes.id", ondelete="CASCADE"), primary_key=True)
+    status: Mapped[EmailStatus] = mapped_column(sqlalchemy_Enum(EmailStatus), primary_key=True)
+    # Empty until the email is completed
+    category: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+
+    emails: Mapped[int] = mapped_column(Integer, default=0)
+    # Completed emails scored at or above rollups.URGENT_PRIORITY
+    urgent: Mapped[int] = mapped_column(Integer, default=0)
+
+class AnalysisCache(Base):
+    __tablename__ = "analysis_cache"
+
+    # sha256 of the model version tag and the normalized email content
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model_version: Mapped[str] = mapped_column(String(255), index=True)
+
+    priority_score: Mapped[float] = mapped_column(Float, nullable=True)
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    category: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
     )
\ No newline at end of file
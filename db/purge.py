@@ -0,0 +1,53 @@
+"""
+Set-based removal of an inbox's emails, for POST /inboxes/{id}/reset and
+DELETE /inboxes/{id}. The API only marks the inbox and queues
+tasks.purge_inbox, which deletes the emails by id in batches, each in
+its own short transaction, and counts its progress on the inbox. Analyses
+and embeddings go with their emails, and backfill chunks and stats go
+with the inbox, through ON DELETE CASCADE, so no row is loaded into
+Python.
+"""
+import os
+
+from sqlalchemy import delete, select, text
+
+from models import Email
+
+# Emails deleted per transaction; bounds how long each batch holds its row locks
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+
+# (table, column, referenced table) of every foreign key a purge relies on cascading
+CASCADES = [
+    ("analyses", "email_id", "emails"),
+    ("emails", "inbox_id", "monitored_inboxes"),
+]
+
+def ensure_cascades(engine):
+    """
+    Makes the CASCADES foreign keys ON DELETE CASCADE on Postgres databases
+    created before they were declared so. The constraint is swapped in NOT
+    VALID and validated in a second transaction, so the existing rows are
+    checked without holding the table lock.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    for table, column, referenced in CASCADES:
+        with engine.connect() as conn:
+            names = conn.execute(text("""
+                SELECT conname FROM pg_constraint
+                WHERE contype = 'f' AND confdeltype <> 'c'
+                  AND conrelid = CAST(:table AS regclass) AND confrelid = CAST(:referenced AS regclass)
+            """), {"table": table, "referenced": referenced}).scalars().all()
+        for name in names:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {table} DROP CONSTRAINT {name}, ADD CONSTRAINT {name} "
+                    f"FOREIGN KEY ({column}) REFERENCES {referenced} (id) ON DELETE CASCADE NOT VALID"
+                ))
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+
+def delete_batch(db, inbox_id: int) -> int:
+    """Deletes up to PURGE_BATCH_SIZE of the inbox's emails; returns how many went."""
+    batch = select(Email.id).where(Email.inbox_id == inbox_id).limit(PURGE_BATCH_SIZE)
+    return db.execute(delete(Email).where(Email.id.in_(batch)).execution_options(synchronize_session=False)).rowcount
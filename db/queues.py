@@ -0,0 +1,49 @@
+"""
+Celery queue layout shared by the worker and the API. Analysis of freshly
+synced mail goes to the live queues; historical imports go to the backfill
+queues, which workers only read from when the live queues are empty.
+"""
+LIVE = "live"
+BACKFILL = "backfill"
+CLASSES = [LIVE, BACKFILL]
+
+# Stages of the staged analysis pipeline, each with its own pair of queues
+STAGE_NAMES = ["sentiment", "summary", "priority"]
+
+# The combined analysis pipeline and inbox syncs share Celery's default queue
+LIVE_QUEUE = "celery"
+BACKFILL_QUEUE = "backfill"
+# Historical import fetches (setup_inbox, backfill_chunk), kept apart so the
+# backfill queues' depth counts analysis batches only
+BACKFILL_FETCH_QUEUE = "backfill_fetch"
+
+# Redis has no native priorities; kombu emulates them with one list per step
+PRIORITY_STEPS = [0, 3, 6, 9]
+PRIORITY_SEP = ":"
+LIVE_PRIORITY = 0
+BACKFILL_PRIORITY = 9
+
+BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": PRIORITY_STEPS,
+    "sep": PRIORITY_SEP,
+    # Poll queues in the order the worker lists them (-Q), so live queues win
+    "queue_order_strategy": "priority",
+}
+
+def analysis_queue(stage: str = None, queue_class: str = LIVE) -> str:
+    """Queue for an analysis task; staged-pipeline tasks get one queue per stage."""
+    if stage is None:
+        return LIVE_QUEUE if queue_class == LIVE else BACKFILL_QUEUE
+    return stage if queue_class == LIVE else f"{stage}_{BACKFILL}"
+
+def analysis_queues(queue_class: str) -> list:
+    """Every analysis queue of a class, for both pipelines."""
+    return [analysis_queue(None, queue_class)] + [analysis_queue(stage, queue_class) for stage in STAGE_NAMES]
+
+def queue_depth(redis_client, queue: str) -> int:
+    """Messages waiting in a queue, across all of its priority lists."""
+    names = [queue] + [f"{queue}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS[1:]]
+    with redis_client.pipeline() as pipe:
+        for name in names:
+            pipe.llen(name)
+        return sum(pipe.execute())
@@ -0,0 +1,115 @@
+"""
+Per-inbox email counts behind GET /stats/emails and /stats/inboxes.
+inbox_stats holds one row per (inbox, status, category). Whoever changes
+emails adds the difference to it in the same transaction, so reading
+the counts costs a few rows however many emails there are. rebuild()
+recomputes it from the emails periodically, which undoes the drift a
+raced or missed delta leaves. Emails without an inbox are not counted.
+"""
+import os
+
+from sqlalchemy import and_, case, delete, func, insert, select, text
+
+from database import dialect_insert
+from models import Analysis, Email, EmailStatus, InboxStats
+
+# Completed emails with a priority score at or above this count as urgent
+URGENT_PRIORITY = float(os.getenv("URGENT_PRIORITY", "0.8"))
+
+def state(status: EmailStatus, category: str = None, priority_score: float = None) -> tuple:
+    """(status, category, urgent) as an email is counted; only completed emails carry the last two."""
+    if status != EmailStatus.COMPLETED:
+        return (status, "", False)
+    return (status, category or "", priority_score is not None and priority_score >= URGENT_PRIORITY)
+
+def email_state(email) -> tuple:
+    analysis = email.analysis
+    return state(email.status, analysis and analysis.category, analysis and analysis.priority_score)
+
+def move(deltas: dict, inbox_id: int, old: tuple, new: tuple, count: int = 1):
+    """
+    Records count emails of an inbox going from state old to new into
+    deltas, keyed (inbox_id, status, category) -> [emails, urgent].
+    None stands for an email being added or removed.
+    """
+    if inbox_id is None or old == new or not count:
+        return
+    for counted, sign in ((old, -count), (new, count)):
+        if counted is None:
+            continue
+        status, category, urgent = counted
+        delta = deltas.setdefault((inbox_id, status, category), [0, 0])
+        delta[0] += sign
+        delta[1] += sign if urgent else 0
+
+def delta_statement(db, deltas: dict):
+    """The upsert adding deltas to inbox_stats, or None if there is nothing to add."""
+    rows = [
+        {"inbox_id": inbox_id, "status": status, "category": category, "emails": emails, "urgent": urgent}
+        # Rows are locked in key order so concurrent writers cannot deadlock
+        for (inbox_id, status, category), (emails, urgent) in sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1].name, item[0][2]))
+        if emails or urgent
+    ]
+    if not rows:
+        return None
+    stmt = dialect_insert(db, InboxStats).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["inbox_id", "status", "category"],
+        set_={"emails": InboxStats.emails + stmt.excluded.emails, "urgent": InboxStats.urgent + stmt.excluded.urgent}
+    )
+
+def apply(db, deltas: dict):
+    statement = delta_statement(db, deltas)
+    if statement is not None:
+        db.execute(statement)
+
+def record(db, inbox_id: int, old: tuple, new: tuple, count: int = 1):
+    """Adds a single move straight to inbox_stats."""
+    deltas = {}
+    move(deltas, inbox_id, old, new, count)
+    apply(db, deltas)
+
+def counts_query():
+    """The grouped count over emails that inbox_stats holds the result of."""
+    completed = Email.status == EmailStatus.COMPLETED
+    category = case((completed, func.coalesce(Analysis.category, "")), else_="")
+    urgent = func.sum(case((and_(completed, Analysis.priority_score >= URGENT_PRIORITY), 1), else_=0))
+    return (
+        select(Email.inbox_id, Email.status, category.label("category"), func.count(Email.id), urgent)
+        .outerjoin(Analysis, Analysis.email_id == Email.id)
+        .where(Email.inbox_id.isnot(None))
+        .group_by(Email.inbox_id, Email.status, category)
+    )
+
+def rebuild(db, inbox_id: int = None):
+    """
+    Replaces inbox_stats, or one inbox's rows, with a fresh count. The
+    table lock makes concurrent deltas wait, and the count is taken after
+    it is granted, so every committed change is counted exactly once.
+    Readers are not blocked. The caller commits.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE inbox_stats IN EXCLUSIVE MODE"))
+    counts, stale = counts_query(), delete(InboxStats)
+    if inbox_id is not None:
+        counts, stale = counts.where(Email.inbox_id == inbox_id), stale.where(InboxStats.inbox_id == inbox_id)
+    db.execute(stale)
+    db.execute(insert(InboxStats).from_select(["inbox_id", "status", "category", "emails", "urgent"], counts))
+
+def build_if_empty(db):
+    """Counts the emails stored before inbox_stats existed, on the first start after an upgrade."""
+    if db.scalar(select(InboxStats.inbox_id).limit(1)) is None and \
+            db.scalar(select(Email.id).where(Email.inbox_id.isnot(None)).limit(1)) is not None:
+        rebuild(db)
+        db.commit()
+
+def summarize(rows) -> dict:
+    """Folds (status, category, emails, urgent) rows into the counts the stats endpoints return."""
+    summary = {"total": 0, "by_status": {status.value: 0 for status in EmailStatus}, "by_category": {}, "urgent": 0}
+    for status, category, emails, urgent in rows:
+        summary["total"] += emails
+        summary["by_status"][status.value] += emails
+        if category:
+            summary["by_category"][category] = summary["by_category"].get(category, 0) + emails
+        summary["urgent"] += urgent
+    return summary
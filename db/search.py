@@ -0,0 +1,273 @@
+"""
+Full-text and semantic email search (Postgres only).
+
+The search columns are not mapped on the models, so create_all stays
+portable. ensure_search_schema adds them at API startup:
+- a tsvector over subject, sender and the whole cleaned body on email_bodies
+  (the sender split into words, so a name, user or domain matches). It
+  sits beside the body rather than on emails to keep those rows narrow,
+  and a trigger fills it from the email's row when the text is written
+- a tsvector over the summary on analyses, filled by a trigger too
+- one GIN index on each
+Postgres keeps both vectors up to date on every insert and update.
+With SEMANTIC_SEARCH=1, it also creates the pgvector email_embeddings
+table, which the worker fills as emails are analyzed.
+"""
+import os
+
+from sqlalchemy import Float, Text, cast, column, func, literal, literal_column, null, select, table, text, union
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.types import UserDefinedType
+
+import migrations
+from embeddings import SEARCH_EMBEDDING_DIMENSIONS
+from models import Analysis, Email, EmailBody, MonitoredInbox
+
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "0") == "1"
+# Newest full-text matches ranked by relevance; older ones are left out of relevance ordering
+SEARCH_RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "5000"))
+# Candidates the HNSW index visits per semantic query; higher trades latency for recall
+SEARCH_HNSW_EF_SEARCH = int(os.getenv("SEARCH_HNSW_EF_SEARCH", "100"))
+# Text search configuration of the generated vectors
+TEXT_CONFIG = "english"
+# Sampled lexemes per vector column; a fuller sample keeps rare-term estimates low, so the planner
+# uses the GIN index for them rather than walking emails by date
+TEXT_STATISTICS = 1000
+
+# Rows whose search vector is filled in per transaction when a column is first added
+SEARCH_BACKFILL_BATCH_SIZE = int(os.getenv("SEARCH_BACKFILL_BATCH_SIZE", "5000"))
+
+# (table, column) -> DDL adding the column and the trigger that keeps it current; every statement can be rerun
+TEXT_COLUMNS = {
+    ("email_bodies", "search_vector"): f"""
+        ALTER TABLE email_bodies ADD COLUMN IF NOT EXISTS search_vector tsvector,
+            ALTER COLUMN search_vector SET STATISTICS {TEXT_STATISTICS};
+        CREATE OR REPLACE FUNCTION email_bodies_search_vector() RETURNS trigger AS $$
+        BEGIN
+            SELECT setweight(to_tsvector('{TEXT_CONFIG}', coalesce(subject, '')), 'A') ||
+                   setweight(to_tsvector('{TEXT_CONFIG}', translate(coalesce(sender, ''), '@.<>', '    ')), 'B') ||
+                   setweight(to_tsvector('{TEXT_CONFIG}', coalesce(NEW.full_text, '')), 'D')
+            INTO NEW.search_vector FROM emails WHERE id = NEW.email_id;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE TRIGGER email_bodies_search_vector BEFORE INSERT OR UPDATE OF full_text ON email_bodies
+            FOR EACH ROW EXECUTE FUNCTION email_bodies_search_vector()
+    """,
+    # Trigger-kept rather than generated, so adding it to a large table doesn't rewrite it under a lock
+    ("analyses", "search_vector"): f"""
+        ALTER TABLE analyses ADD COLUMN IF NOT EXISTS search_vector tsvector,
+            ALTER COLUMN search_vector SET STATISTICS {TEXT_STATISTICS};
+        CREATE OR REPLACE FUNCTION analyses_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := setweight(to_tsvector('{TEXT_CONFIG}', coalesce(NEW.summary, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE TRIGGER analyses_search_vector BEFORE INSERT OR UPDATE OF summary ON analyses
+            FOR EACH ROW EXECUTE FUNCTION analyses_search_vector()
+    """,
+}
+
+# Index name -> (table, key column, column whose trigger fills the vector) of the vectors it indexes.
+# The index is built once every vector is filled in, so a missing index means the backfill is unfinished
+TEXT_INDEXES = {
+    "ix_email_bodies_search_vector": ("email_bodies", "email_id", "full_text"),
+    "ix_analyses_search_vector": ("analyses", "id", "summary"),
+}
+
+# Table name -> DDL creating it
+SEMANTIC_TABLES = {
+    "email_embeddings": f"""
+        CREATE TABLE IF NOT EXISTS email_embeddings (
+            email_id integer PRIMARY KEY REFERENCES emails (id) ON DELETE CASCADE,
+            embedding vector({SEARCH_EMBEDDING_DIMENSIONS}) NOT NULL
+        )
+    """,
+}
+
+def index_ddl(name: str) -> str:
+    """CREATE INDEX statement of one of the search indexes, built CONCURRENTLY."""
+    if name == "ix_email_embeddings_hnsw":
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON email_embeddings USING hnsw (embedding vector_cosine_ops)"
+    table_name = TEXT_INDEXES[name][0]
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table_name} USING gin (search_vector)"
+
+class Vector(UserDefinedType):
+    """pgvector's vector type, for casts; values travel as '[x,y,...]' text."""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "vector"
+
+CONFIG = literal_column(f"'{TEXT_CONFIG}'::regconfig")
+BODY_VECTOR = literal_column("email_bodies.search_vector", TSVECTOR)
+ANALYSIS_VECTOR = literal_column("analyses.search_vector", TSVECTOR)
+EMBEDDINGS = table("email_embeddings", column("email_id"), column("embedding"))
+
+def ensure_search_schema(engine):
+    """
+    Adds the search columns, triggers, tables and indexes that are missing;
+    does nothing outside Postgres. The API calls it under
+    migrations.schema_lock, so replicas don't race. Existing columns and
+    tables are looked up first, so a restart takes no locks on them. The
+    vectors of rows stored before a column existed are filled in
+    batches, and the GIN indexes are then built CONCURRENTLY, so writes
+    go on throughout.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        existing = set(conn.execute(text("""
+            SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()
+            UNION ALL SELECT table_name, NULL FROM information_schema.tables WHERE table_schema = current_schema()
+        """)).all())
+        for key, ddl in TEXT_COLUMNS.items():
+            if key not in existing:
+                conn.execute(text(ddl))
+        if SEMANTIC_SEARCH:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            for name, ddl in SEMANTIC_TABLES.items():
+                if (name, None) not in existing:
+                    conn.execute(text(ddl))
+
+    valid = migrations.index_validity(engine)
+    for name, (table_name, key, source) in TEXT_INDEXES.items():
+        if not valid.get(name):
+            backfill_vectors(engine, table_name, key, source)
+    names = list(TEXT_INDEXES) + (["ix_email_embeddings_hnsw"] if SEMANTIC_SEARCH else [])
+    migrations.create_indexes(engine, {name: index_ddl(name) for name in names}, valid)
+
+def backfill_vectors(engine, table_name: str, key: str, source: str):
+    """
+    Fills in the unset search vectors of a table, SEARCH_BACKFILL_BATCH_SIZE
+    rows per transaction in key order, by rewriting their source column
+    so the trigger runs. Rows that already have one are skipped, so an
+    interrupted backfill resumes.
+    """
+    after, filled = 0, 0
+    while True:
+        with engine.begin() as conn:
+            keys = conn.execute(text(f"""
+                UPDATE {table_name} SET {source} = {source} WHERE {key} IN (
+                    SELECT {key} FROM {table_name} WHERE {key} > :after AND search_vector IS NULL
+                    ORDER BY {key} LIMIT :limit
+                ) RETURNING {key}
+            """), {"after": after, "limit": SEARCH_BACKFILL_BATCH_SIZE}).scalars().all()
+        filled += len(keys)
+        if len(keys) < SEARCH_BACKFILL_BATCH_SIZE:
+            break
+        after = max(keys)
+    if filled:
+        print(f"--- Filled in {filled} search vectors of {table_name} ---")
+
+def settings(mode: str) -> list:
+    """
+    SET LOCAL statements to run in the search transaction before the query.
+    Parallel workers are turned off for text search: an ordered parallel
+    index walk keeps scanning far past the few rows a capped branch needs.
+    """
+    if mode == "semantic":
+        return [text(f"SET LOCAL hnsw.ef_search = {SEARCH_HNSW_EF_SEARCH}")]
+    return [text("SET LOCAL max_parallel_workers_per_gather = 0")]
+
+def vector_text(vector: list) -> str:
+    return "[" + ",".join(f"{value:.6f}" for value in vector) + "]"
+
+def store_embeddings(db, vectors: dict):
+    """Upserts email id -> embedding rows."""
+    if not vectors:
+        return
+    db.execute(text(
+        "INSERT INTO email_embeddings (email_id, embedding) VALUES (:email_id, CAST(:embedding AS vector)) "
+        "ON CONFLICT (email_id) DO UPDATE SET embedding = EXCLUDED.embedding"
+    ), [{"email_id": email_id, "embedding": vector_text(vector)} for email_id, vector in vectors.items()])
+
+def text_search(q: str, conditions: list, order: str = "relevance", limit: int = 20):
+    """
+    Returns (email_id, score, headline) rows for a websearch-style query
+    (quoted phrases, OR, -exclusions). The body and summary matches are
+    each capped to the newest SEARCH_RANK_CANDIDATES (limit when ordered by
+    recency) and merged with a UNION. A branch can therefore use its GIN
+    index for a rare term, or walk the received_at index and stop early for
+    a common one. Relevance ranks only those candidates, and headlines are
+    built for the returned page only.
+    """
+    query = func.websearch_to_tsquery(CONFIG, q)
+    cap = limit if order == "recent" else SEARCH_RANK_CANDIDATES
+
+    def newest(statement):
+        return (
+            statement
+            .outerjoin(MonitoredInbox, MonitoredInbox.id == Email.inbox_id)
+            .where(*conditions)
+            .order_by(Email.received_at.desc(), Email.id.desc())
+            .limit(cap)
+        )
+
+    matches = union(
+        newest(
+            select(Email.id, Email.received_at)
+            .join(EmailBody, EmailBody.email_id == Email.id)
+            .where(BODY_VECTOR.op("@@")(query))
+        ),
+        newest(
+            select(Email.id, Email.received_at)
+            .join(Analysis, Analysis.email_id == Email.id)
+            .where(ANALYSIS_VECTOR.op("@@")(query))
+        ),
+    ).subquery()
+    candidates = (
+        select(matches.c.id, matches.c.received_at)
+        .order_by(matches.c.received_at.desc(), matches.c.id.desc())
+        .limit(cap)
+        .subquery()
+    )
+
+    empty = cast(literal(""), TSVECTOR)
+    score = func.ts_rank_cd(
+        func.coalesce(BODY_VECTOR, empty).op("||")(func.coalesce(ANALYSIS_VECTOR, empty)), query
+    ).label("score")
+    ranked = (
+        select(candidates.c.id.label("email_id"), score)
+        .outerjoin(EmailBody, EmailBody.email_id == candidates.c.id)
+        .outerjoin(Analysis, Analysis.email_id == candidates.c.id)
+        .order_by(
+            *((candidates.c.received_at.desc(), candidates.c.id.desc()) if order == "recent"
+              else (score.desc(), candidates.c.received_at.desc()))
+        )
+        .limit(limit)
+        .subquery()
+    )
+
+    headline = func.ts_headline(CONFIG, func.coalesce(EmailBody.full_text, ""), query, "MaxFragments=2, MinWords=5, MaxWords=20")
+    return (
+        select(ranked.c.email_id, ranked.c.score, headline.label("headline"))
+        .join(Email, Email.id == ranked.c.email_id)
+        .outerjoin(EmailBody, EmailBody.email_id == ranked.c.email_id)
+        .order_by(
+            *((Email.received_at.desc(), Email.id.desc()) if order == "recent"
+              else (ranked.c.score.desc(), Email.received_at.desc()))
+        )
+    )
+
+def semantic_search(vector: list, conditions: list, limit: int = 20):
+    """
+    Returns (email_id, score, headline) rows of the nearest emails by
+    cosine similarity, through the HNSW index. Filters are applied to the
+    index's candidates, so a narrow filter can return fewer than limit rows.
+    """
+    # Sent as text and cast server-side, so drivers need no vector codec
+    distance = EMBEDDINGS.c.embedding.op("<=>")(cast(cast(literal(vector_text(vector)), Text), Vector()))
+    return (
+        select(
+            EMBEDDINGS.c.email_id,
+            (literal_column("1") - distance).cast(Float).label("score"),
+            cast(null(), Text).label("headline")
+        )
+        .join(Email, Email.id == EMBEDDINGS.c.email_id)
+        .outerjoin(MonitoredInbox, MonitoredInbox.id == Email.inbox_id)
+        .where(*conditions)
+        .order_by(distance)
+        .limit(limit)
+    )
@@ -2,10 +2,11 @@ import axios from 'axios';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
+// With the staged pipeline, fields fill in one at a time while the email is processing
 export interface Analysis {
-  category: string;
-  priority_score: number;
-  summary: string;
+  category: string | null;
+  priority_score: number | null;
+  summary: string | null;
   processed_at: string;
 }
 
@@ -14,7 +15,9 @@ export interface Email {
   inbox_id: number;
   sender: string;
   subject: string;
-  body: string;
+  snippet?: string;
+  // Only present on single-email responses; listings carry the snippet
+  body?: string;
   status: string;
   received_at: string;
   analysis?: Analysis;
@@ -27,6 +30,15 @@ export interface Inbox {
   imap_server: string;
   is_active: boolean;
   last_synced: string;
+  backfill_total: number;
+  backfill_done: number;
+  backfill_started_at?: string | null;
+  backfill_finished_at?: string | null;
+  purge_total: number;
+  purge_done: number;
+  purge_started_at?: string | null;
+  purge_finished_at?: string | null;
+  deleting: boolean;
 }
 
 export const fetchInboxes = async (): Promise<Inbox[]> => {
@@ -69,6 +81,30 @@ export const fetchEmails = async (): Promise<Email[]> => {
   return response.data;
 };
 
+export const fetchEmail = async (id: number): Promise<Email> => {
+  const response = await axios.get(`${API_BASE_URL}/emails/${id}`);
+  return response.data;
+};
+
 export const deleteEmail = async (id: number): Promise<void> => {
   await axios.delete(`${API_BASE_URL}/emails/${id}`);
-};
\ No newline at end of file
+};
+
+export type EmailEvent =
+  | { event: 'status'; email_ids: number[]; status: string }
+  | { event: 'analysis'; email_id: number; status: string; analysis: Partial<Analysis> }
+  | { event: 'created'; inbox_id: number; email_ids: number[] };
+
+// Pushes status changes and finished analyses from the workers.
+// onResync runs after a reconnect, since events sent meanwhile are lost.
+export const subscribeEvents = (onEvent: (e: EmailEvent) => void, onResync: () => void): EventSource => {
+  const source = new EventSource(`${API_BASE_URL}/events/`);
+  let dropped = false;
+  source.onmessage = (message) => onEvent(JSON.parse(message.data));
+  source.onerror = () => { dropped = true; };
+  source.onopen = () => {
+    if (dropped) onResync();
+    dropped = false;
+  };
+  return source;
+};
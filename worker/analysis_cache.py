@@ -0,0 +1,93 @@
+import datetime
+import hashlib
+import os
+import re
+
+from sqlalchemy import func, select, update
+
+import counters
+from database import dialect_insert
+from models import AnalysisCache
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") == "1"
+# Entries unused for this long are evicted
+ANALYSIS_CACHE_TTL_DAYS = int(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30"))
+# Beyond this many entries the least recently used ones are evicted
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "100000"))
+
+# Tracking parameters differ per recipient, so they are dropped from links
+URL_QUERY = re.compile(r"(https?://[^\s?#]+)[?#]\S*")
+
+def content_key(content: str, model_version: str) -> str:
+    """
+    Hashes the model input after normalizing case, whitespace and link
+    query strings, so copies of the same newsletter share one entry.
+    """
+    normalized = " ".join(URL_QUERY.sub(r"\1", content).casefold().split())
+    return hashlib.sha256(f"{model_version}\0{normalized}".encode()).hexdigest()
+
+def touch(db, keys):
+    """
+    Refreshes the LRU timestamp of hit entries in a transaction of its own,
+    committed at once, so the row locks are not held through the caller's
+    model run. Rows are locked in key order, so concurrent touches of the
+    same popular entries cannot deadlock.
+    """
+    locked = select(AnalysisCache.key).where(AnalysisCache.key.in_(keys)).order_by(AnalysisCache.key).with_for_update()
+    with db.get_bind().begin() as conn:
+        conn.execute(
+            update(AnalysisCache)
+            .where(AnalysisCache.key.in_(locked))
+            .values(last_used_at=func.now(), hit_count=AnalysisCache.hit_count + 1)
+        )
+
+def lookup(db, keys: list) -> dict:
+    """Returns cached results by key and refreshes the LRU timestamp of hits (see touch)."""
+    if not ANALYSIS_CACHE_ENABLED:
+        return {}
+
+    entries = db.query(AnalysisCache).filter(AnalysisCache.key.in_(set(keys))).all()
+    found = {
+        entry.key: {
+            "category": entry.category,
+            "summary": entry.summary,
+            "priority_score": entry.priority_score
+        }
+        for entry in entries
+    }
+    if found:
+        touch(db, sorted(found))
+
+    hits = sum(key in found for key in keys)
+    counters.incr("analysis_cache", "hits", hits)
+    counters.incr("analysis_cache", "misses", len(keys) - hits)
+    return found
+
+def store(db, results: dict, model_version: str):
+    """
+    Saves freshly computed results; keys another worker stored first are
+    skipped. Rows go in key order, like touch, so two workers inserting
+    the same keys wait on each other instead of deadlocking.
+    """
+    if not ANALYSIS_CACHE_ENABLED or not results:
+        return
+
+    stmt = dialect_insert(db, AnalysisCache).values([
+        {"key": key, "model_version": model_version, "hit_count": 0, **result}
+        for key, result in sorted(results.items())
+    ])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["key"]))
+
+def evict(db) -> int:
+    """Drops expired entries, then trims the table to ANALYSIS_CACHE_MAX_ENTRIES."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=ANALYSIS_CACHE_TTL_DAYS)
+    expired = db.query(AnalysisCache).filter(AnalysisCache.last_used_at < cutoff).delete(synchronize_session=False)
+
+    overflow = (
+        select(AnalysisCache.key)
+        .order_by(AnalysisCache.last_used_at.desc())
+        .offset(ANALYSIS_CACHE_MAX_ENTRIES)
+    )
+    trimmed = db.query(AnalysisCache).filter(AnalysisCache.key.in_(overflow)).delete(synchronize_session=False)
+    db.commit()
+    return expired + trimmed
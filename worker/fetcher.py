@@ -1,95 +1,227 @@
 from email.header import decode_header
 from email.utils import parsedate_to_datetime
+from html import unescape
+from html.parser import HTMLParser
 import imaplib
 import email
+import os
+import re
 
-from bs4 import BeautifulSoup
 from security import decrypt_password
+import text_rules
 
-def is_promotional(msg, body):
-    sender = msg.get("From", "").lower()
+# Set IMAP_SSL=0 to speak plain IMAP, e.g. to the fake server in benchmarks/
+IMAP_SSL = os.getenv("IMAP_SSL", "1") == "1"
 
-    important_keywords = ["security", "alert", "verification", "invoice", "receipt", "order"]
-    if "noreply" in sender and any(word in body.lower() for word in important_keywords):
-        return False
+# Number of messages requested per FETCH command
+FETCH_CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", "500"))
+# Bytes of message text downloaded per email (0 = no limit). Text parts come
+# first in practice, so attachments past this point are never transferred.
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", "65536"))
 
-    if msg.get("List-Unsubscribe"):
-        return True
+# Start of a new message in a FETCH response, e.g. b'12 (BODY[HEADER] {342}'
+FETCH_RESPONSE_START = re.compile(rb"^\d+ \(")
 
-    promo_keywords = ["view in browser", "special offer", "discount", "opt out"]
-    if any(word in body.lower()[:500] for word in promo_keywords):
-        return True
-            
-    return False
+# HTML is tokenized this many characters at a time, so parsing can stop early
+TEXT_FEED_CHARS = 8192
+WORD = re.compile(r"\S+")
 
-def get_clean_text(html_body):
+def is_promotional(msg, body):
+    """Newsletter and marketing filter; the keywords are configured in text_rules.json."""
+    return text_rules.rules.is_promotional(msg, body)
+
+class TextExtractor(HTMLParser):
+    """
+    Streams the visible text out of an HTML document, skipping the contents
+    of script, style and template tags. No tree is built, and the caller
+    can stop feeding once `length` reaches the text it needs.
+    """
+    SKIPPED = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.words = []
+        self.length = 0
+        self.skipping = 0
+        self.pending = []
+
+    def flush(self):
+        """Text between two pieces of markup can arrive in several chunks."""
+        if self.pending:
+            words = "".join(self.pending).split()
+            self.pending = []
+            self.words.extend(words)
+            self.length += sum(len(word) + 1 for word in words)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if tag in self.SKIPPED: self.skipping += 1
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if tag in self.SKIPPED and self.skipping: self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping: self.pending.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.startswith("CDATA[") and not self.skipping:
+            self.pending.append(data[len("CDATA["):])
+            self.flush()
+
+def get_clean_text(html_body, limit=None):
+    """
+    Visible text of a body with whitespace collapsed to single spaces.
+    With a limit, extraction stops once at least `limit` characters are
+    collected; the result then starts exactly like the full text would.
+    """
     if not html_body:
         return ""
-    soup = BeautifulSoup(html_body, "html.parser")
-    
-    for script_or_style in soup(["script", "style"]):
-        script_or_style.decompose()
 
-    return " ".join(soup.get_text(separator=" ").split())
-
-def fetch_unseen_emails(inbox_model, condition):
-    raw_password = decrypt_password(inbox_model.password)
-    mail = imaplib.IMAP4_SSL(inbox_model.imap_server)
-    
-    try:
-        mail.login(inbox_model.email_address, raw_password)
-        mail.select("inbox")
-
-        status, messages = mail.search(None, condition)
-        if status != 'OK' or not messages[0]:
-            return []
-
-        all_ids = messages[0].split()
-        recent_ids = all_ids
-        
-        email_list = []
-        for num in recent_ids:
-            status, data = mail.fetch(num, '(RFC822)')
-            if status != 'OK':
-                continue
-
-            raw_email = data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            # Duplicate checking
-            message_id = msg.get("Message-ID")
-
-            # Decode Subject
-            subject, encoding = decode_header(msg["Subject"])[0]
-            if isinstance(subject, bytes):
-                subject = subject.decode(encoding or "utf-8")
-
-            # Extract Body
-            body = ""
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            body = payload.decode(errors='replace')
-                        break
-            else:
-                payload = msg.get_payload(decode=True)
+    # Plain text: only entities to decode and whitespace to collapse
+    if "<" not in html_body:
+        text = unescape(html_body) if "&" in html_body else html_body
+        if limit is None:
+            return " ".join(text.split())
+        words, length = [], 0
+        for match in WORD.finditer(text):
+            words.append(match.group())
+            length += len(words[-1]) + 1
+            if length > limit: break
+        return " ".join(words)
+
+    parser = TextExtractor()
+    for start in range(0, len(html_body), TEXT_FEED_CHARS):
+        parser.feed(html_body[start:start + TEXT_FEED_CHARS])
+        if limit is not None and parser.length > limit:
+            break
+    else:
+        parser.close()
+    parser.flush()
+    return " ".join(parser.words)
+
+def parse_email(msg):
+    """Extracts the fields we store from a message, or None if it should be skipped."""
+    # Duplicate checking
+    message_id = msg.get("Message-ID")
+
+    # Decode Subject
+    subject, encoding = decode_header(msg["Subject"])[0]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding or "utf-8")
+
+    # Extract Body
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                payload = part.get_payload(decode=True)
                 if payload:
                     body = payload.decode(errors='replace')
+                break
+    else:
+        payload = msg.get_payload(decode=True)
+        if payload:
+            body = payload.decode(errors='replace')
+
+    # Only keep emails with actual text content
+    if not body or not body.strip() or is_promotional(msg, body):
+        return None
+
+    return {
+        "sender": msg.get("From"),
+        "received_at": parsedate_to_datetime(msg.get("Date")),
+        "subject": subject,
+        "body": body,
+        "message_id": message_id
+    }
+
+def imap_address(imap_server):
+    """Splits an optional ':port' suffix off the stored IMAP server name."""
+    host, _, port = imap_server.partition(":")
+    return host, int(port) if port else (993 if IMAP_SSL else 143)
+
+def connect(inbox_model):
+    """Opens an authenticated IMAP session for the inbox."""
+    raw_password = decrypt_password(inbox_model.password)
+    imap_class = imaplib.IMAP4_SSL if IMAP_SSL else imaplib.IMAP4
+    mail = imap_class(*imap_address(inbox_model.imap_server))
+    mail.login(inbox_model.email_address, raw_password)
+    return mail
+
+def select_inbox(mail):
+    """Selects the inbox and returns its (UIDVALIDITY, UIDNEXT)."""
+    mail.select("inbox")
+    uid_validity = mail.response("UIDVALIDITY")[1][0]
+    uid_next = mail.response("UIDNEXT")[1][0]
+    return (
+        int(uid_validity) if uid_validity else None,
+        int(uid_next) if uid_next else None
+    )
+
+def search_uids(mail, condition):
+    status, data = mail.uid("SEARCH", None, condition)
+    if status != 'OK' or not data[0]:
+        return []
+    return [int(uid) for uid in data[0].split()]
+
+def fetch_raw_messages(mail, uid_set, max_bytes=FETCH_MAX_BYTES):
+    """
+    Fetches a whole UID set in one round trip, asking only for the
+    headers and the first max_bytes of the text. Yields raw message bytes.
+    """
+    text_section = f"BODY.PEEK[TEXT]<0.{max_bytes}>" if max_bytes else "BODY.PEEK[TEXT]"
+    status, data = mail.uid("FETCH", uid_set, f"(BODY.PEEK[HEADER] {text_section})")
+    if status != 'OK':
+        return
+
+    header, text = None, b""
+    for item in data:
+        if not isinstance(item, tuple):
+            continue
+        prefix, literal = item
+        if FETCH_RESPONSE_START.match(prefix):
+            if header is not None:
+                yield header + text
+            header, text = b"", b""
+        if b"HEADER]" in prefix:
+            header = literal
+        elif b"TEXT]" in prefix:
+            text = literal
+
+    if header is not None:
+        yield header + text
+
+def iter_emails(mail, uids, chunk_size=FETCH_CHUNK_SIZE, max_bytes=FETCH_MAX_BYTES):
+    """
+    Yields parsed emails for the given UIDs. Messages are requested in
+    chunks of chunk_size, so a large mailbox takes a handful of round
+    trips and is never held in memory all at once.
+    """
+    for i in range(0, len(uids), chunk_size):
+        uid_set = ",".join(str(uid) for uid in uids[i:i + chunk_size])
+        for raw_email in fetch_raw_messages(mail, uid_set, max_bytes):
+            item = parse_email(email.message_from_bytes(raw_email))
+            if item:
+                yield item
+
+def fetch_unseen_emails(inbox_model, condition, chunk_size=FETCH_CHUNK_SIZE, max_bytes=FETCH_MAX_BYTES):
+    """Yields parsed emails matching an IMAP search condition."""
+    mail = connect(inbox_model)
 
-            # Only append if body has actual text content
-            if body and body.strip():
-                if not is_promotional(msg, body):
-                    email_list.append({
-                        "sender": msg.get("From"),
-                        "received_at": parsedate_to_datetime(msg.get("Date")),
-                        "subject": subject,
-                        "body": body,
-                        "message_id": message_id
-                    })
-
-        return email_list
+    try:
+        select_inbox(mail)
+        yield from iter_emails(mail, search_uids(mail, condition), chunk_size, max_bytes)
 
     finally:
-        mail.logout()
\ No newline at end of file
+        mail.logout()
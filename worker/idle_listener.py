@@ -0,0 +1,195 @@
+"""
+Long-running IMAP IDLE listener. Holds one IDLE connection per active
+inbox on a single event loop and dispatches tasks.sync_inbox only when
+the server announces new mail with an EXISTS response.
+
+    python idle_listener.py
+"""
+import asyncio
+import itertools
+import os
+import random
+import re
+import ssl
+
+from celery import Celery
+
+import counters
+from database import SessionLocal
+from fetcher import IMAP_SSL, imap_address
+from models import MonitoredInbox
+from security import decrypt_password
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+celery_app = Celery("tasks", broker=REDIS_URL)
+
+# Longest IDLE without server traffic; the cycle then ends with DONE, whose
+# reply proves the connection is alive (RFC 2177 asks for under 29 minutes)
+IDLE_HEARTBEAT_SECONDS = int(os.getenv("IDLE_HEARTBEAT_SECONDS", "30"))
+# How long the server gets to answer a command before the connection is dropped
+IDLE_RESPONSE_TIMEOUT_SECONDS = int(os.getenv("IDLE_RESPONSE_TIMEOUT_SECONDS", "15"))
+# How often the list of active inboxes is reloaded from the database
+IDLE_INBOX_REFRESH_SECONDS = int(os.getenv("IDLE_INBOX_REFRESH_SECONDS", "60"))
+IDLE_BACKOFF_MAX_SECONDS = int(os.getenv("IDLE_BACKOFF_MAX_SECONDS", "300"))
+
+EXISTS_RESPONSE = re.compile(rb"^\* \d+ EXISTS")
+
+def heartbeat_key(inbox_id: int) -> str:
+    return f"idle:inbox:{inbox_id}"
+
+def quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def dispatch_sync(inbox_id: int):
+    celery_app.send_task("tasks.sync_inbox", args=[inbox_id])
+
+class IdleClient:
+    """Keeps one inbox in IDLE, reconnecting with exponential backoff."""
+
+    def __init__(self, inbox_id, imap_server, email_address, password, dispatch=dispatch_sync, heartbeat=True):
+        self.inbox_id = inbox_id
+        self.host, self.port = imap_address(imap_server)
+        self.email_address = email_address
+        self.password = password
+        self.dispatch = dispatch
+        self.heartbeat = heartbeat
+        self.tags = itertools.count(1)
+        self.reader = self.writer = None
+
+    async def run(self):
+        backoff = 1
+        while True:
+            try:
+                await self.session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = backoff + random.uniform(0, backoff)
+                print(f"IDLE ERROR for Inbox {self.inbox_id}: {str(e) or type(e).__name__}; reconnecting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, IDLE_BACKOFF_MAX_SECONDS)
+            else:
+                backoff = 1
+            finally:
+                if self.writer:
+                    self.writer.close()
+                    self.writer = None
+
+    async def session(self):
+        ssl_context = ssl.create_default_context() if IMAP_SSL else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), IDLE_RESPONSE_TIMEOUT_SECONDS
+        )
+        await self.read_line()  # greeting
+
+        await self.command(f"LOGIN {quote(self.email_address)} {quote(self.password)}")
+        await self.command("SELECT INBOX")
+
+        # Catch up on anything that arrived while we were disconnected
+        await self.notify()
+
+        while True:
+            if await self.idle():
+                await self.notify()
+
+    async def idle(self) -> bool:
+        """
+        Runs one IDLE cycle; returns True if new mail was announced. The
+        cycle ends after IDLE_HEARTBEAT_SECONDS without server traffic, and
+        the reply to DONE must arrive in time, so a half-open connection
+        is dropped instead of idling unnoticed. The heartbeat is only
+        refreshed when the server has just answered.
+        """
+        tag = f"I{next(self.tags)}"
+        await self.send(f"{tag} IDLE")
+        line = await self.read_line()
+        if not line.startswith(b"+"):
+            raise ConnectionError(f"IDLE rejected: {line!r}")
+        await self.beat()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDLE_HEARTBEAT_SECONDS
+        new_mail = False
+        while not new_mail and loop.time() < deadline:
+            try:
+                line = await self.read_line(timeout=deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            await self.beat()
+            new_mail = bool(EXISTS_RESPONSE.match(line))
+
+        await self.send("DONE")
+        lines = await self.wait_for_tag(tag)
+        await self.beat()
+        return new_mail or any(EXISTS_RESPONSE.match(line) for line in lines)
+
+    async def notify(self):
+        await asyncio.to_thread(self.dispatch, self.inbox_id)
+
+    async def beat(self):
+        if self.heartbeat:
+            # Outlives the longest gap between replies: a full cycle plus the wait for DONE's
+            ttl = IDLE_HEARTBEAT_SECONDS * 2 + IDLE_RESPONSE_TIMEOUT_SECONDS
+            await asyncio.to_thread(counters.mark_live, heartbeat_key(self.inbox_id), ttl)
+
+    async def command(self, command: str) -> list:
+        tag = f"A{next(self.tags)}"
+        await self.send(f"{tag} {command}")
+        return await self.wait_for_tag(tag)
+
+    async def wait_for_tag(self, tag: str) -> list:
+        lines = []
+        while True:
+            line = await self.read_line()
+            if line.startswith(tag.encode() + b" "):
+                if line.split()[1].upper() != b"OK":
+                    raise ConnectionError(f"IMAP command failed: {line!r}")
+                return lines
+            lines.append(line)
+
+    async def send(self, line: str):
+        self.writer.write(line.encode() + b"\r\n")
+        await self.writer.drain()
+
+    async def read_line(self, timeout: float = IDLE_RESPONSE_TIMEOUT_SECONDS) -> bytes:
+        """Reads one response line; raises asyncio.TimeoutError if none arrives within timeout."""
+        line = await asyncio.wait_for(self.reader.readline(), max(timeout, 0))
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        return line.rstrip(b"\r\n")
+
+def load_active_inboxes() -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            inbox.id: (inbox.imap_server, inbox.email_address, decrypt_password(inbox.password))
+            for inbox in db.query(MonitoredInbox).filter(MonitoredInbox.is_active == True).all()
+        }
+    finally:
+        db.close()
+
+async def main():
+    """Starts, restarts and stops IDLE clients as inboxes are added, edited or deactivated."""
+    running = {}
+    while True:
+        try:
+            inboxes = await asyncio.to_thread(load_active_inboxes)
+        except Exception as e:
+            print(f"IDLE ERROR loading inboxes: {str(e)}")
+            inboxes = {inbox_id: config for inbox_id, (config, _) in running.items()}
+
+        for inbox_id in list(running):
+            config, task = running[inbox_id]
+            if inboxes.get(inbox_id) != config:
+                task.cancel()
+                del running[inbox_id]
+
+        for inbox_id, config in inboxes.items():
+            if inbox_id not in running:
+                running[inbox_id] = (config, asyncio.create_task(IdleClient(inbox_id, *config).run()))
+
+        print(f"--- IDLE listening on {len(running)} inboxes ---")
+        await asyncio.sleep(IDLE_INBOX_REFRESH_SECONDS)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import imaplib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import counters
+from fetcher import connect
+
+# Sessions unused for this long are logged out
+IMAP_POOL_IDLE_SECONDS = int(os.getenv("IMAP_POOL_IDLE_SECONDS", "300"))
+# Sessions unused for this long are checked with NOOP before being reused
+IMAP_POOL_HEALTHCHECK_SECONDS = int(os.getenv("IMAP_POOL_HEALTHCHECK_SECONDS", "30"))
+# Max sessions this process keeps open to one IMAP server
+IMAP_POOL_MAX_PER_SERVER = int(os.getenv("IMAP_POOL_MAX_PER_SERVER", "5"))
+
+class PooledSession:
+    def __init__(self, mail, inbox):
+        self.mail = mail
+        self.inbox_id = inbox.id
+        self.server = inbox.imap_server
+        self.identity = identity(inbox)
+        self.last_used = time.monotonic()
+
+def identity(inbox) -> tuple:
+    """A session is only reused while the inbox's connection settings are unchanged."""
+    return (inbox.imap_server, inbox.email_address, inbox.password)
+
+def close(session: PooledSession):
+    try:
+        session.mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+def close_evicted(sessions: list):
+    """Logs out sessions the pool dropped; called after the lock is released."""
+    if sessions:
+        counters.incr("imap_pool", "evictions", len(sessions))
+    for session in sessions:
+        close(session)
+
+class IMAPPool:
+    """
+    Per-process pool of authenticated IMAP sessions keyed by inbox id, so
+    each sync reuses a logged-in connection instead of paying for a TLS
+    handshake and LOGIN. A session is checked out exclusively for the
+    duration of a `with pool.session(inbox)` block, and no more than
+    IMAP_POOL_MAX_PER_SERVER sessions to one server are open at a time.
+    """
+
+    def __init__(self):
+        self.idle = {}  # inbox id -> PooledSession
+        self.in_use = {}  # server -> number of checked-out sessions
+        self.available = threading.Condition()
+
+    @contextmanager
+    def session(self, inbox):
+        session = self.checkout(inbox)
+        try:
+            yield session.mail
+        except (imaplib.IMAP4.abort, OSError):
+            # The connection is broken; never hand it out again
+            self.release(session, reuse=False)
+            raise
+        except BaseException:
+            self.release(session)
+            raise
+        else:
+            self.release(session)
+
+    def checkout(self, inbox) -> PooledSession:
+        with self.available:
+            evicted = self.evict_idle()
+            session = self.idle.pop(inbox.id, None)
+            if session is None:
+                evicted += self.wait_for_slot(inbox.imap_server)
+            self.in_use[inbox.imap_server] = self.in_use.get(inbox.imap_server, 0) + 1
+        # A LOGOUT waits on the server, so it never runs while other threads need the lock
+        close_evicted(evicted)
+
+        if session and session.identity != identity(inbox):
+            close(session)
+            session = None
+
+        if session and time.monotonic() - session.last_used > IMAP_POOL_HEALTHCHECK_SECONDS:
+            try:
+                session.mail.noop()
+            except (imaplib.IMAP4.error, OSError):
+                # Dropped by the server or the login expired; log in again
+                counters.incr("imap_pool", "relogins")
+                close(session)
+                session = None
+
+        if session:
+            counters.incr("imap_pool", "hits")
+            return session
+
+        counters.incr("imap_pool", "misses")
+        try:
+            mail = connect(inbox)
+        except BaseException:
+            with self.available:
+                self.in_use[inbox.imap_server] -= 1
+                self.available.notify_all()
+            raise
+        counters.incr("imap_pool", "handshakes")
+        return PooledSession(mail, inbox)
+
+    def release(self, session: PooledSession, reuse: bool = True):
+        with self.available:
+            self.in_use[session.server] -= 1
+            stale = self.idle.pop(session.inbox_id, None) if reuse else None
+            if reuse:
+                session.last_used = time.monotonic()
+                self.idle[session.inbox_id] = session
+            self.available.notify_all()
+        if stale:
+            close(stale)
+        if not reuse:
+            close(session)
+
+    def wait_for_slot(self, server: str) -> list:
+        """
+        Blocks until one more session to the server fits under the cap,
+        evicting the least recently used idle sessions to make room.
+        Must be called with the lock held; returns the evicted sessions
+        for the caller to close once it is released.
+        """
+        evicted = []
+        while True:
+            on_server = [s for s in self.idle.values() if s.server == server]
+            if len(on_server) + self.in_use.get(server, 0) < IMAP_POOL_MAX_PER_SERVER:
+                return evicted
+            if on_server:
+                session = min(on_server, key=lambda s: s.last_used)
+                del self.idle[session.inbox_id]
+                evicted.append(session)
+            else:
+                self.available.wait()
+
+    def evict_idle(self) -> list:
+        """Drops the sessions idle for too long; must be called with the lock held, and returns them."""
+        now = time.monotonic()
+        evicted = []
+        for inbox_id, session in list(self.idle.items()):
+            if now - session.last_used > IMAP_POOL_IDLE_SECONDS:
+                del self.idle[inbox_id]
+                evicted.append(session)
+        return evicted
+
+    def close_all(self):
+        with self.available:
+            sessions, self.idle = list(self.idle.values()), {}
+        for session in sessions:
+            close(session)
@@ -0,0 +1,89 @@
+import os
+import re
+
+import torch
+from transformers import (
+    AutoModel,
+    AutoModelForSeq2SeqLM,
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+    pipeline,
+)
+
+# torch: full-precision PyTorch weights (the original behaviour)
+# quantized: PyTorch with Linear layers dynamically quantized to int8
+# onnx: graphs exported once and run by onnxruntime (needs optimum[onnxruntime])
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Exported ONNX graphs are kept here so they are only exported once per model
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.expanduser("~/.cache/huggingface/onnx"))
+
+BACKENDS = ("torch", "quantized", "onnx")
+
+TORCH_MODELS = {
+    "sentiment-analysis": AutoModelForSequenceClassification,
+    "zero-shot-classification": AutoModelForSequenceClassification,
+    "summarization": AutoModelForSeq2SeqLM,
+    "feature-extraction": AutoModel,
+}
+
+ONNX_MODELS = {
+    "sentiment-analysis": "ORTModelForSequenceClassification",
+    "zero-shot-classification": "ORTModelForSequenceClassification",
+    "summarization": "ORTModelForSeq2SeqLM",
+    "feature-extraction": "ORTModelForFeatureExtraction",
+}
+
+def check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}'; expected one of {list(BACKENDS)}")
+
+def quantize(model):
+    """int8 dynamic quantization of the Linear layers, which hold most of the weights."""
+    return torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_onnx(task: str, model_name: str):
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("INFERENCE_BACKEND=onnx requires optimum[onnxruntime] to be installed.")
+
+    model_class = getattr(ort, ONNX_MODELS[task])
+    path = os.path.join(ONNX_CACHE_DIR, re.sub(r"[^\w.-]", "_", model_name))
+    if os.path.isdir(path):
+        return model_class.from_pretrained(path)
+
+    model = model_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    return model
+
+def load_model(task: str, model_name: str, backend: str = INFERENCE_BACKEND):
+    """Loads the bare model for a pipeline task on the given backend."""
+    check_backend(backend)
+    if backend == "onnx":
+        return load_onnx(task, model_name)
+    model = TORCH_MODELS[task].from_pretrained(model_name).eval()
+    return quantize(model) if backend == "quantized" else model
+
+def load_pipeline(task: str, model_name: str, backend: str = INFERENCE_BACKEND):
+    """A transformers pipeline for the task, running on the given backend."""
+    check_backend(backend)
+    if backend == "torch":
+        return pipeline(task, model=model_name)
+    return pipeline(task, model=load_model(task, model_name, backend), tokenizer=AutoTokenizer.from_pretrained(model_name))
+
+def process_memory_mb() -> dict:
+    """
+    RSS and PSS of the current process. PSS splits pages shared with other
+    processes (e.g. copy-on-write model weights) between them, so summing
+    it over the worker's children gives their real combined footprint.
+    """
+    memory = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    memory[name.lower() + "_mb"] = round(int(value.split()[0]) / 1024)
+    except OSError:
+        pass
+    return memory
@@ -0,0 +1,112 @@
+import os
+
+import torch
+from transformers import AutoTokenizer
+
+from inference import load_model, load_pipeline
+
+PRIORITY_ENGINE = os.getenv("PRIORITY_ENGINE", "nli")
+NLI_MODEL = os.getenv("PRIORITY_NLI_MODEL", "facebook/bart-large-mnli")
+EMBEDDING_MODEL = os.getenv("PRIORITY_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Softmax temperature turning cosine similarities into label probabilities
+EMBEDDING_TEMPERATURE = float(os.getenv("PRIORITY_EMBEDDING_TEMPERATURE", "0.05"))
+
+PRIORITY_LABELS = ["urgent action required", "neutral informational", "low priority social"]
+
+# Score buckets used by the dashboard to colour emails
+PRIORITY_BUCKETS = [0.8, 0.4]
+
+def weighted_priority(label: str, score: float) -> float:
+    """Scales the confidence of the top label by how urgent that label is."""
+    return round(score * (1.0 if "urgent" in label else 0.5 if "neutral" in label else 0.2), 2)
+
+class NLIPriorityEngine:
+    """
+    Zero-shot NLI scoring. Runs one premise/hypothesis pass per label,
+    so each email costs len(PRIORITY_LABELS) passes of BART-large.
+    """
+    name = "nli"
+
+    def __init__(self, model_name: str = NLI_MODEL):
+        self.pipe = load_pipeline("zero-shot-classification", model_name)
+
+    def score(self, contents: list) -> list:
+        results = self.pipe(contents, candidate_labels=PRIORITY_LABELS, batch_size=len(contents))
+        if isinstance(results, dict): results = [results]
+        return [weighted_priority(r['labels'][0], r['scores'][0]) for r in results]
+
+class EmbeddingPriorityEngine:
+    """
+    Embedding similarity scoring. The labels are encoded once when the
+    engine is created; each email then costs one encoder pass plus a
+    dot product against the cached label embeddings.
+    """
+    name = "embedding"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, temperature: float = EMBEDDING_TEMPERATURE):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = load_model("feature-extraction", model_name)
+        self.temperature = temperature
+        self.label_embeddings = self.encode(PRIORITY_LABELS)
+
+    def encode(self, texts: list) -> torch.Tensor:
+        """Returns L2-normalised, mean-pooled sentence embeddings."""
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return torch.nn.functional.normalize(pooled, dim=-1)
+
+    def score(self, contents: list) -> list:
+        similarities = self.encode(contents) @ self.label_embeddings.T
+        probabilities = torch.softmax(similarities / self.temperature, dim=-1)
+        top_scores, top_indices = probabilities.max(dim=-1)
+        return [
+            weighted_priority(PRIORITY_LABELS[index], score)
+            for index, score in zip(top_indices.tolist(), top_scores.tolist())
+        ]
+
+ENGINES = {
+    NLIPriorityEngine.name: NLIPriorityEngine,
+    EmbeddingPriorityEngine.name: EmbeddingPriorityEngine,
+}
+
+ENGINE_MODELS = {
+    NLIPriorityEngine.name: NLI_MODEL,
+    EmbeddingPriorityEngine.name: EMBEDDING_MODEL,
+}
+
+def engine_tag(name: str = PRIORITY_ENGINE) -> str:
+    """Identifies the engine and model behind a priority score."""
+    return f"{name}:{ENGINE_MODELS.get(name)}"
+
+def load_priority_engine(name: str = PRIORITY_ENGINE):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown PRIORITY_ENGINE '{name}'; expected one of {sorted(ENGINES)}")
+    return ENGINES[name]()
+
+def priority_bucket(score: float) -> int:
+    return sum(score > threshold for threshold in PRIORITY_BUCKETS)
+
+def compare_scores(reference: list, candidate: list) -> dict:
+    """
+    Agreement between two lists of priority scores for the same emails:
+    mean absolute error, Pearson correlation and the share of emails that
+    land in the same dashboard bucket.
+    """
+    n = len(reference)
+    if n == 0 or n != len(candidate):
+        raise ValueError("Score lists must be non-empty and of equal length.")
+
+    mean_ref, mean_cand = sum(reference) / n, sum(candidate) / n
+    cov = sum((r - mean_ref) * (c - mean_cand) for r, c in zip(reference, candidate))
+    var_ref = sum((r - mean_ref) ** 2 for r in reference)
+    var_cand = sum((c - mean_cand) ** 2 for c in candidate)
+
+    return {
+        "emails": n,
+        "mean_abs_error": round(sum(abs(r - c) for r, c in zip(reference, candidate)) / n, 4),
+        "pearson": round(cov / (var_ref * var_cand) ** 0.5, 4) if var_ref and var_cand else None,
+        "bucket_agreement": round(sum(priority_bucket(r) == priority_bucket(c) for r, c in zip(reference, candidate)) / n, 4),
+    }
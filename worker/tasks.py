@@ -1,50 +1,99 @@
 import datetime
+import gc
+import itertools
 import os
-import re
-from celery import Celery
-from celery.signals import worker_process_init
+import time
+import torch
+from celery import Celery, group
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from celery.schedules import crontab
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker
-from models import Analysis, Email, EmailStatus, MonitoredInbox
-from fetcher import fetch_unseen_emails, get_clean_text
-from transformers import pipeline
+from sqlalchemy import and_, case, create_engine, delete, func, insert, select, update
+from sqlalchemy.orm import selectinload, sessionmaker, undefer
+from models import Analysis, BackfillChunk, BackfillStatus, Email, EmailBody, EmailStatus, MonitoredInbox
+from database import dialect_insert
+from fetcher import get_clean_text, iter_emails, search_uids, select_inbox
+from imap_pool import IMAPPool
+from priority import engine_tag, load_priority_engine
+from inference import INFERENCE_BACKEND, load_pipeline, process_memory_mb
+from idle_listener import heartbeat_key
+import analysis_cache
+import bodies
+import counters
+import embeddings
+import events
+import metrics
+import purge
+import queues
+import rollups
+import search
+import text_rules
 from email.utils import parsedate_to_datetime
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Max number of emails run through the models in a single forward pass
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "16"))
+# Fetched emails inserted (and committed) per statement
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+# Days re-searched by an incremental sync when the mailbox UIDVALIDITY changes
+SYNC_FALLBACK_DAYS = int(os.getenv("SYNC_FALLBACK_DAYS", "30"))
+# Load the models in the worker's parent process so prefork children share them
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"
+# Torch threads per child; defaults to the CPU count split across the pool
+WORKER_TORCH_THREADS = int(os.getenv("WORKER_TORCH_THREADS", "0"))
+# combined: one task runs every model; staged: each model runs as its own task on its own queue
+ANALYSIS_PIPELINE = os.getenv("ANALYSIS_PIPELINE", "combined")
+# Historical emails are released for analysis at most this fast, shared fairly across inboxes
+BACKFILL_RATE_PER_MINUTE = int(os.getenv("BACKFILL_RATE_PER_MINUTE", "120"))
+BACKFILL_INTERVAL_SECONDS = int(os.getenv("BACKFILL_INTERVAL_SECONDS", "10"))
+# UIDs per historical import chunk; each chunk is its own task, so chunks run in parallel
+BACKFILL_CHUNK_UIDS = int(os.getenv("BACKFILL_CHUNK_UIDS", "2000"))
+# A running chunk without a checkpoint for this long is assumed dead and resumed, and a pending one lost and resent
+BACKFILL_STALE_SECONDS = int(os.getenv("BACKFILL_STALE_SECONDS", "600"))
+# Claims of a chunk before it is given up as FAILED, so one that always fails can't hold up its import
+BACKFILL_MAX_ATTEMPTS = int(os.getenv("BACKFILL_MAX_ATTEMPTS", "5"))
+# How often the inbox_stats rollup is recounted from the emails
+STATS_REBUILD_SECONDS = int(os.getenv("STATS_REBUILD_SECONDS", "3600"))
+# How often bodies stored without their cleaned text are looked for, and how many are cleaned per transaction
+BODY_CLEAN_SECONDS = int(os.getenv("BODY_CLEAN_SECONDS", "300"))
+BODY_CLEAN_BATCH_SIZE = int(os.getenv("BODY_CLEAN_BATCH_SIZE", "500"))
+# Stages whose models this worker preloads; the rest load on first use
+WORKER_STAGES = [stage for stage in os.getenv("WORKER_STAGES", "sentiment,summary,priority").split(",") if stage]
+
+# Characters of cleaned text fed to the models
+MODEL_INPUT_CHARS = 1024
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+SUMMARY_MODEL = "t5-small"
+# Tags cached analyses; bump ANALYSIS_MODEL_VERSION to invalidate them without a model change
+MODEL_VERSION = "|".join([SENTIMENT_MODEL, SUMMARY_MODEL, engine_tag(), INFERENCE_BACKEND, os.getenv("ANALYSIS_MODEL_VERSION", "1")])
 celery_app = Celery("tasks", broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.broker_transport_options = queues.BROKER_TRANSPORT_OPTIONS
+# Reserve one task at a time, so a queued backfill never sits ahead of live mail in a worker's buffer
+celery_app.conf.worker_prefetch_multiplier = 1
+celery_app.conf.task_routes = {
+    "tasks.setup_inbox": {"queue": queues.BACKFILL_FETCH_QUEUE},
+    "tasks.backfill_chunk": {"queue": queues.BACKFILL_FETCH_QUEUE},
+}
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-classifier = None
-summarizer = None
-zero_shot = None
+# Loaded models by stage, filled in by get_model on first use
+models = {}
+# Prefork pool size, recorded by preload_models in the parent
+pool_concurrency = 1
+
+# Authenticated IMAP sessions reused across sync tasks in this process
+imap_pool = IMAPPool()
 
 def truncate_thread(text: str) -> str:
     """
     Strips out historical thread content (replies) so the AI focuses 
     only on the most recent exchange (the top of the email).
+    The reply markers are configured in text_rules.json.
     """
-    markers = [
-        r"^From:", 
-        r"^--- Original Message ---", 
-        r"^________________________________", 
-        r"^On\s.*\swrote:",
-        r"^Sent from my "
-    ]
-    
-    lines = text.splitlines()
-    clean_lines = []
-    
-    for line in lines:
-        # Check if line matches any common thread markers
-        if any(re.match(marker, line.strip(), re.IGNORECASE) for marker in markers):
-            break
-        clean_lines.append(line)
-        
-    return "\n".join(clean_lines).strip()
+    return text_rules.rules.truncate_thread(text)
 
 # Define the periodic schedule
 celery_app.conf.beat_schedule = {
@@ -52,106 +101,747 @@ celery_app.conf.beat_schedule = {
         'task': 'tasks.sync_all_active_inboxes',
         'schedule': 60.0,
     },
+    'evict-analysis-cache-hourly': {
+        'task': 'tasks.evict_analysis_cache',
+        'schedule': 3600.0,
+    },
+    'release-backfill': {
+        'task': 'tasks.schedule_backfill',
+        'schedule': float(BACKFILL_INTERVAL_SECONDS),
+    },
+    'resume-stale-backfill-chunks': {
+        'task': 'tasks.resume_backfill',
+        'schedule': float(BACKFILL_STALE_SECONDS),
+    },
+    'rebuild-inbox-stats': {
+        'task': 'tasks.rebuild_inbox_stats',
+        'schedule': float(STATS_REBUILD_SECONDS),
+    },
+    'clean-stored-bodies': {
+        'task': 'tasks.clean_stored_bodies',
+        'schedule': float(BODY_CLEAN_SECONDS),
+    },
 }
 
+# Full-precision, int8 or ONNX Runtime, selected by INFERENCE_BACKEND.
+# The priority engine is selected by PRIORITY_ENGINE (nli | embedding).
+MODEL_LOADERS = {
+    "sentiment": lambda: load_pipeline("sentiment-analysis", SENTIMENT_MODEL),
+    "summary": lambda: load_pipeline("summarization", SUMMARY_MODEL),
+    "priority": load_priority_engine,
+    # Only used with SEMANTIC_SEARCH; not an analysis stage
+    "embedding": embeddings.get_encoder,
+}
+
+def get_model(stage: str):
+    """Returns the stage's model, loading it on first use in this process."""
+    if stage not in models:
+        print(f"--- Loading {stage} model ---")
+        start = time.perf_counter()
+        models[stage] = MODEL_LOADERS[stage]()
+        metrics.observe("intellinbox_model_load_seconds", [time.perf_counter() - start], stage=stage)
+    return models[stage]
+
+def load_models(stages: list = WORKER_STAGES):
+    for stage in stages:
+        get_model(stage)
+
+@worker_init.connect
+def preload_models(sender=None, **kwargs):
+    """
+    Loads the models once in the worker's parent process, before the pool
+    forks. The children then share the weight pages copy-on-write instead
+    of each holding its own copy.
+    """
+    global pool_concurrency
+    pool_concurrency = getattr(sender, "concurrency", None) or 1
+    # onnxruntime sessions own thread pools that do not survive a fork
+    if not MODEL_PRELOAD or INFERENCE_BACKEND == "onnx":
+        return
+
+    start = time.perf_counter()
+    # A single thread keeps torch from starting an OpenMP pool that the children would inherit broken
+    torch.set_num_threads(1)
+    load_models()
+    # Keeps the garbage collector from writing to (and so copying) the shared objects
+    gc.freeze()
+    print(f"--- Models preloaded in {time.perf_counter() - start:.1f}s ({process_memory_mb()}) ---")
+
 @worker_process_init.connect
 def init_worker(**kwargs):
-    """Loads all three models once per worker process."""
-    global classifier, summarizer, zero_shot
-    print("--- Loading AI Models ---")
-    classifier = pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest")
-    summarizer = pipeline("summarization", model="t5-small")
-    zero_shot = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+    """Models that were not preloaded by the parent load lazily, on first use."""
+    start = time.perf_counter()
+    torch.set_num_threads(WORKER_TORCH_THREADS or max(1, (os.cpu_count() or 1) // pool_concurrency))
+    print(f"--- Worker {os.getpid()} ready in {time.perf_counter() - start:.1f}s ({process_memory_mb()}) ---")
+
+def clean_content(body: str) -> str:
+    """Cleans and truncates a raw email body into the text fed to the models."""
+    # 1. Strip HTML tags, stopping once the model window is filled
+    clean_content = get_clean_text(body, limit=MODEL_INPUT_CHARS)
+
+    # 2. Truncate thread to prevent AI confusion from old replies
+    current_message = truncate_thread(clean_content)
+
+    # 3. Limit context for model performance and architectural constraints
+    return current_message[:MODEL_INPUT_CHARS]
+
+def clean_body(body: str) -> tuple:
+    """
+    Cleans a raw email body into (full text, model input): the text of the
+    whole body, which search indexes, and clean_content's window of it.
+    """
+    return get_clean_text(body), clean_content(body)
+
+def prepare_content(email) -> str:
+    """
+    The model input of an email, as stored at ingest. Emails created
+    without it (through the API) are cleaned from their raw body here,
+    and the result is saved with the task's next commit, so retries and
+    re-analysis never clean an email twice.
+    """
+    stored = email.stored_body
+    if stored is None or stored.content is None:
+        body = email.body
+        if not body or not body.strip():
+            raise ValueError("Email body is empty; cannot analyze.")
+        if stored is None:
+            stored = email.stored_body = EmailBody(data=bodies.compress(body))
+        stored.full_text, stored.content = clean_body(body)
+        email.snippet = bodies.snippet(stored.content)
+    return stored.content
+
+def run_sentiment(contents: list) -> list:
+    # RoBERTa Sentiment (512 token limit)
+    results = get_model("sentiment")([content[:512] for content in contents], batch_size=len(contents))
+    return [{"category": result['label'].lower()} for result in results]
+
+def run_summary(contents: list) -> list:
+    # T5 Summarization
+    results = get_model("summary")(contents, max_length=90, min_length=30, do_sample=False, batch_size=len(contents))
+
+    summaries = []
+    for result in results:
+        summary_text = result['summary_text'].strip().capitalize()
+        if not summary_text.endswith('.'): summary_text += '...'
+        summaries.append({"summary": summary_text})
+    return summaries
+
+def run_priority(contents: list) -> list:
+    # Priority (BART zero-shot or embedding similarity)
+    return [{"priority_score": score} for score in get_model("priority").score(contents)]
+
+# Each stage fills in its own Analysis fields (keyed by queues.STAGE_NAMES)
+STAGES = {
+    "sentiment": run_sentiment,
+    "summary": run_summary,
+    "priority": run_priority,
+}
+
+def run_models(contents: list, trace_ids=()) -> list:
+    """
+    Runs each of the three pipelines once over the whole list of contents.
+    The pipelines pad the inputs of a batch to a common length themselves.
+    """
+    results = [{} for _ in contents]
+    for stage, run_stage in STAGES.items():
+        with metrics.timed(stage, len(contents), trace_ids):
+            stage_results = run_stage(contents)
+        for result, fields in zip(results, stage_results):
+            result.update(fields)
+    return results
+
+def trace_info(emails: list) -> dict:
+    """Email id -> (created_at, trace_id), read before a commit expires the rows."""
+    return {email.id: (email.created_at, email.trace_id) for email in emails}
+
+def search_text(subject: str, content: str) -> str:
+    return f"{subject}\n{content}"
+
+def store_search_embeddings(db, texts: dict, trace_ids=()):
+    """
+    Embeds analyzed emails for semantic search (email id -> text). Runs
+    after the analysis is committed, so a failure here never fails it.
+    """
+    if not search.SEMANTIC_SEARCH or not texts:
+        return
+    try:
+        get_model("embedding")
+        with metrics.timed("embedding", len(texts), trace_ids):
+            vectors = embeddings.embed(list(texts.values()))
+        search.store_embeddings(db, dict(zip(texts, vectors)))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"EMBEDDING ERROR for Emails {list(texts)}: {str(e)}")
+
+def analyze_contents(db, contents: list, trace_ids=()) -> list:
+    """
+    Serves each content from the analysis cache when possible and runs the
+    models once over the distinct contents that missed.
+    """
+    keys = [analysis_cache.content_key(content, MODEL_VERSION) for content in contents]
+    results = analysis_cache.lookup(db, keys)
+
+    misses = {}
+    for key, content in zip(keys, contents):
+        if key not in results: misses.setdefault(key, content)
+
+    if misses:
+        computed = dict(zip(misses, run_models(list(misses.values()), trace_ids)))
+        analysis_cache.store(db, computed, MODEL_VERSION)
+        results.update(computed)
+
+    return [results[key] for key in keys]
+
+@worker_process_shutdown.connect
+def shutdown_worker(**kwargs):
+    imap_pool.close_all()
 
 @celery_app.task(name="tasks.analyze_email")
 def analyze_email(email_id: int):
-    global classifier, summarizer, zero_shot
+    if ANALYSIS_PIPELINE == "staged":
+        dispatch_analysis([email_id])
+        return "Dispatched to the analysis stages"
+
     db = SessionLocal()
     email = None
+    inbox_id = counted = None
 
     try:
-        email = db.query(Email).filter(Email.id == email_id).first()
+        email = db.query(Email).options(selectinload(Email.analysis), selectinload(Email.stored_body)).filter(Email.id == email_id).first()
         if not email: return "Email not found"
+        info = trace_info([email])
+        trace_ids = [email.trace_id]
+        subject, inbox_id = email.subject, email.inbox_id
+        # How the email is currently counted in inbox_stats
+        counted = rollups.email_state(email)
 
         email.status = EmailStatus.PROCESSING
+        rollups.record(db, inbox_id, counted, rollups.state(EmailStatus.PROCESSING))
         db.commit()
+        counted = rollups.state(EmailStatus.PROCESSING)
+        events.publish_status([email_id], EmailStatus.PROCESSING)
 
-        if not email.body or not email.body.strip():
-            raise ValueError("Email body is empty; cannot analyze.")
-        
-        # 1. Strip HTML tags
-        clean_content = get_clean_text(email.body)
-        
-        # 2. Truncate thread to prevent AI confusion from old replies
-        current_message = truncate_thread(clean_content)
-        
-        # 3. Limit context for model performance and architectural constraints
-        content = current_message[:1024]
-
-        # RoBERTa Sentiment (512 token limit)
-        sent_result = classifier(content[:512])[0]
-        category = sent_result['label'].lower()
-
-        # T5 Summarization
-        summary_results = summarizer(content, max_length=90, min_length=30, do_sample=False)
-        summary_text = summary_results[0]['summary_text'].strip().capitalize()
-        if not summary_text.endswith('.'): summary_text += '...'
+        content = prepare_content(email)
+        result = analyze_contents(db, [content], trace_ids)[0]
 
-        # BART Zero-Shot Priority
-        labels = ["urgent action required", "neutral informational", "low priority social"]
-        bart_result = zero_shot(content, candidate_labels=labels)
-        top_label = bart_result['labels'][0]
-        base_score = bart_result['scores'][0]
-        priority_score = base_score * (1.0 if "urgent" in top_label else 0.5 if "neutral" in top_label else 0.2)
-
-        new_analysis = Analysis(
-            email_id=email.id,
-            category=category,
-            summary=summary_text,
-            priority_score=round(priority_score, 2)
-        )
-        db.add(new_analysis)
+        upsert_analyses(db, [{"email_id": email.id, **result}])
 
         email.status = EmailStatus.COMPLETED
-        db.commit()
-        return f"Success: {category}"
+        rollups.record(db, inbox_id, counted, rollups.state(EmailStatus.COMPLETED, result["category"], result["priority_score"]))
+        with metrics.timed("db_write", 1, trace_ids):
+            db.commit()
+        metrics.record_completed(info)
+        events.publish_analysis(email_id, result)
+        store_search_embeddings(db, {email_id: search_text(subject, content)}, trace_ids)
+        return f"Success: {result['category']}"
 
     except Exception as e:
         print(f"TASK ERROR for Email {email_id}: {str(e)}")
         db.rollback()
         if email:
             db.query(Email).filter(Email.id == email_id).update({"status": EmailStatus.FAILED})
+            rollups.record(db, inbox_id, counted, rollups.state(EmailStatus.FAILED))
+            db.commit()
+            events.publish_status([email_id], EmailStatus.FAILED)
+        return f"Failed: {str(e)}"
+    finally:
+        db.close()
+
+def record_queue_wait(queue: str, emails: list):
+    """Adds the time these emails spent queued to the queue's wait counters."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    waits = [
+        (now - email.queued_at.replace(tzinfo=email.queued_at.tzinfo or datetime.timezone.utc)).total_seconds()
+        for email in emails if email.queued_at
+    ]
+    if waits:
+        counters.incr(f"queue:{queue}", "analyzed", len(waits))
+        counters.incr(f"queue:{queue}", "wait_ms", int(sum(waits) * 1000))
+        metrics.span([email.trace_id for email in emails], "queue_wait", sum(waits) / len(waits), queue=queue)
+
+@celery_app.task(name="tasks.analyze_emails_batch")
+def analyze_emails_batch(email_ids: list, queue_class: str = queues.LIVE):
+    """
+    Analyzes several emails with one forward pass per model and upserts
+    all of their Analysis rows in a single transaction. If the batch
+    fails, each email is retried on its own through analyze_email so
+    one bad email cannot fail its neighbours.
+    """
+    db = SessionLocal()
+
+    try:
+        emails = db.query(Email).options(selectinload(Email.analysis), selectinload(Email.stored_body)).filter(Email.id.in_(email_ids)).all()
+        if not emails: return "Emails not found"
+        record_queue_wait(queues.analysis_queue(None, queue_class), emails)
+        info = trace_info(emails)
+        trace_ids = {trace_id for _, trace_id in info.values()}
+
+        processing = [email.id for email in emails]
+        deltas = {}
+        for email in emails:
+            rollups.move(deltas, email.inbox_id, rollups.email_state(email), rollups.state(EmailStatus.PROCESSING))
+            email.status = EmailStatus.PROCESSING
+        rollups.apply(db, deltas)
+        db.commit()
+        events.publish_status(processing, EmailStatus.PROCESSING)
+
+        ready, contents, failed, completed, texts, deltas = [], [], [], [], {}, {}
+        for email in emails:
+            try:
+                contents.append(prepare_content(email))
+                texts[email.id] = search_text(email.subject, contents[-1])
+                ready.append(email)
+            except ValueError as e:
+                print(f"TASK ERROR for Email {email.id}: {str(e)}")
+                email.status = EmailStatus.FAILED
+                failed.append(email.id)
+                rollups.move(deltas, email.inbox_id, rollups.state(EmailStatus.PROCESSING), rollups.state(EmailStatus.FAILED))
+
+        if contents:
+            for email, result in zip(ready, analyze_contents(db, contents, trace_ids)):
+                email.status = EmailStatus.COMPLETED
+                completed.append((email.id, result))
+                rollups.move(deltas, email.inbox_id, rollups.state(EmailStatus.PROCESSING),
+                             rollups.state(EmailStatus.COMPLETED, result["category"], result["priority_score"]))
+            upsert_analyses(db, [{"email_id": email_id, **result} for email_id, result in completed])
+        rollups.apply(db, deltas)
+
+        with metrics.timed("db_write", len(emails), trace_ids):
             db.commit()
+        metrics.record_completed({email_id: info[email_id] for email_id, _ in completed})
+        events.publish_status(failed, EmailStatus.FAILED)
+        for email_id, result in completed:
+            events.publish_analysis(email_id, result)
+        store_search_embeddings(db, {email_id: texts[email_id] for email_id, _ in completed}, trace_ids)
+        return f"Success: analyzed {len(ready)} of {len(emails)} emails"
+
+    except Exception as e:
+        print(f"BATCH TASK ERROR for Emails {email_ids}: {str(e)}")
+        db.rollback()
+        for email_id in email_ids:
+            celery_app.send_task("tasks.analyze_email", args=[email_id])
+        return f"Failed: {str(e)}"
+    finally:
+        db.close()
+
+def dispatch_analysis(email_ids: list, queue_class: str = queues.LIVE):
+    """
+    Queues analysis for the given emails as a group of ANALYSIS_BATCH_SIZE
+    batches on the live or backfill queues. In the staged pipeline every
+    batch is sent to each stage's queue.
+    """
+    if not email_ids:
+        return
+    batches = [email_ids[i:i + ANALYSIS_BATCH_SIZE] for i in range(0, len(email_ids), ANALYSIS_BATCH_SIZE)]
+    options = {
+        "kwargs": {"queue_class": queue_class},
+        "priority": queues.LIVE_PRIORITY if queue_class == queues.LIVE else queues.BACKFILL_PRIORITY,
+    }
+    if ANALYSIS_PIPELINE == "staged":
+        signatures = [
+            celery_app.signature("tasks.analyze_stage", args=[stage, batch], queue=queues.analysis_queue(stage, queue_class), **options)
+            for batch in batches for stage in STAGES
+        ]
+    else:
+        signatures = [
+            celery_app.signature("tasks.analyze_emails_batch", args=[batch], queue=queues.analysis_queue(None, queue_class), **options)
+            for batch in batches
+        ]
+    group(signatures).apply_async()
+
+@celery_app.task(name="tasks.schedule_backfill")
+def schedule_backfill():
+    """
+    Releases historical emails to the backfill queues at no more than
+    BACKFILL_RATE_PER_MINUTE. Emails are taken round-robin across inboxes,
+    newest first within each, so one large import cannot hold back
+    another inbox's. Nothing is released while the previous release is
+    still queued.
+    """
+    budget = max(1, BACKFILL_RATE_PER_MINUTE * BACKFILL_INTERVAL_SECONDS // 60)
+    backfill_queues = (
+        [queues.analysis_queue(stage, queues.BACKFILL) for stage in STAGES]
+        if ANALYSIS_PIPELINE == "staged" else [queues.BACKFILL_QUEUE]
+    )
+    # Every stage queue holds one message per batch
+    queued_batches = max(queues.queue_depth(counters.redis_client, queue) for queue in backfill_queues)
+    if queued_batches * ANALYSIS_BATCH_SIZE >= budget:
+        return f"Backfill queue still holds {queued_batches} batches."
+
+    db = SessionLocal()
+    try:
+        turns = (
+            select(
+                Email.id,
+                func.row_number().over(
+                    partition_by=Email.inbox_id,
+                    order_by=(Email.received_at.desc(), Email.id.desc())
+                ).label("turn")
+            )
+            .where(Email.status == EmailStatus.PENDING, Email.queued_at.is_(None))
+            .subquery()
+        )
+        email_ids = list(db.execute(
+            select(turns.c.id).where(turns.c.turn <= budget).order_by(turns.c.turn, turns.c.id).limit(budget)
+        ).scalars())
+        if not email_ids:
+            return "No backfill pending."
+
+        db.query(Email).filter(Email.id.in_(email_ids)).update({"queued_at": func.now()}, synchronize_session=False)
+        db.commit()
+        dispatch_analysis(email_ids, queues.BACKFILL)
+        return f"Released {len(email_ids)} emails for backfill analysis."
+    finally:
+        db.close()
+
+def upsert_analyses(db, rows: list):
+    """Inserts or updates the given fields of each email's Analysis row."""
+    if not rows:
+        return
+    # Rows are locked in email id order so concurrent stages cannot deadlock
+    rows = sorted(rows, key=lambda row: row["email_id"])
+    stmt = dialect_insert(db, Analysis).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["email_id"],
+        set_={field: stmt.excluded[field] for field in rows[0] if field != "email_id"}
+    ))
+
+@celery_app.task(name="tasks.analyze_stage")
+def analyze_stage(stage: str, email_ids: list, queue_class: str = queues.LIVE):
+    """
+    Runs a single model over a batch and fills its fields into the emails'
+    Analysis rows, so each stage can run on its own queue and scale alone.
+    Whichever stage completes a row marks its email COMPLETED: its upsert
+    waits on the row lock of any stage writing concurrently, so it sees the
+    other stages' fields once they are committed.
+    """
+    db = SessionLocal()
+    counted = None
+
+    try:
+        emails = db.query(Email).options(selectinload(Email.analysis), selectinload(Email.stored_body)).filter(Email.id.in_(email_ids)).all()
+        if not emails: return "Emails not found"
+        record_queue_wait(queues.analysis_queue(stage, queue_class), emails)
+        # email id -> (inbox id, state counted in inbox_stats as of the last commit)
+        counted = {email.id: (email.inbox_id, rollups.email_state(email)) for email in emails}
+        info = trace_info(emails)
+        trace_ids = {trace_id for _, trace_id in info.values()}
+
+        ready, contents, failed, texts = [], [], [], {}
+        for email in emails:
+            try:
+                contents.append(prepare_content(email))
+                texts[email.id] = search_text(email.subject, contents[-1])
+                ready.append(email.id)
+            except ValueError as e:
+                print(f"TASK ERROR for Email {email.id}: {str(e)}")
+                failed.append(email.id)
+        if failed:
+            db.query(Email).filter(Email.id.in_(failed)).update({"status": EmailStatus.FAILED}, synchronize_session=False)
+
+        started = db.execute(
+            update(Email)
+            .where(Email.id.in_(ready), Email.status == EmailStatus.PENDING)
+            .values(status=EmailStatus.PROCESSING)
+            .returning(Email.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        deltas, moved = {}, {}
+        for email_id in failed:
+            moved[email_id] = rollups.state(EmailStatus.FAILED)
+        for email_id in started:
+            moved[email_id] = rollups.state(EmailStatus.PROCESSING)
+        for email_id, new in moved.items():
+            inbox_id, old = counted[email_id]
+            rollups.move(deltas, inbox_id, old, new)
+            counted[email_id] = (inbox_id, new)
+        rollups.apply(db, deltas)
+        # Don't hold row locks other stages need while the model runs
+        db.commit()
+
+        # A cached analysis already has every stage's fields
+        keys = dict(zip(ready, (analysis_cache.content_key(content, MODEL_VERSION) for content in contents)))
+        cached = analysis_cache.lookup(db, list(keys.values()))
+        misses = {}
+        for email_id, content in zip(ready, contents):
+            if keys[email_id] not in cached: misses.setdefault(keys[email_id], content)
+        computed = {}
+        if misses:
+            with metrics.timed(stage, len(misses), trace_ids):
+                computed = dict(zip(misses, STAGES[stage](list(misses.values()))))
+
+        write_started = time.perf_counter()
+        partial = {email_id: cached.get(key) or computed[key] for email_id, key in keys.items()}
+        upsert_analyses(db, [{"email_id": id, **fields} for id, fields in partial.items() if keys[id] in cached])
+        upsert_analyses(db, [{"email_id": id, **fields} for id, fields in partial.items() if keys[id] not in cached])
+
+        completed = set(db.execute(
+            update(Email)
+            .where(
+                Email.id.in_(ready),
+                Email.status == EmailStatus.PROCESSING,
+                Email.analysis.has(and_(
+                    Analysis.category.isnot(None), Analysis.summary.isnot(None), Analysis.priority_score.isnot(None)
+                ))
+            )
+            .values(status=EmailStatus.COMPLETED)
+            .returning(Email.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+
+        if completed:
+            full = db.query(Analysis).filter(Analysis.email_id.in_(completed)).all()
+            deltas = {}
+            for analysis in full:
+                inbox_id, _ = counted[analysis.email_id]
+                new = rollups.state(EmailStatus.COMPLETED, analysis.category, analysis.priority_score)
+                # The update above only completes emails that were PROCESSING
+                rollups.move(deltas, inbox_id, rollups.state(EmailStatus.PROCESSING), new)
+                counted[analysis.email_id] = (inbox_id, new)
+            rollups.apply(db, deltas)
+            analysis_cache.store(db, {
+                keys[analysis.email_id]: {
+                    "category": analysis.category,
+                    "summary": analysis.summary,
+                    "priority_score": analysis.priority_score
+                }
+                for analysis in full
+            }, MODEL_VERSION)
+
+        db.commit()
+        metrics.record_stage("db_write", time.perf_counter() - write_started, len(partial), trace_ids)
+        metrics.record_completed({email_id: info[email_id] for email_id in completed})
+        events.publish_status(failed, EmailStatus.FAILED)
+        for email_id, fields in partial.items():
+            status = EmailStatus.COMPLETED if email_id in completed else EmailStatus.PROCESSING
+            events.publish_analysis(email_id, fields, status)
+        # The stage that completes an email embeds it
+        store_search_embeddings(db, {email_id: texts[email_id] for email_id in completed}, trace_ids)
+        return f"Success: {stage} for {len(ready)} of {len(emails)} emails, {len(completed)} completed"
+
+    except Exception as e:
+        print(f"STAGE TASK ERROR ({stage}) for Emails {email_ids}: {str(e)}")
+        db.rollback()
+        db.query(Email).filter(Email.id.in_(email_ids)).update({"status": EmailStatus.FAILED}, synchronize_session=False)
+        deltas = {}
+        for inbox_id, old in (counted or {}).values():
+            rollups.move(deltas, inbox_id, old, rollups.state(EmailStatus.FAILED))
+        rollups.apply(db, deltas)
+        db.commit()
+        events.publish_status(email_ids, EmailStatus.FAILED)
         return f"Failed: {str(e)}"
     finally:
         db.close()
 
-def process_inbox_fetch(db, inbox, condition):
-    new_emails = fetch_unseen_emails(inbox, condition)
-    added_count = 0
-    
-    for item in new_emails:
-        exists = db.query(Email).filter(Email.message_id == item['message_id']).first()
-
-        if not exists:
-            db_email = Email(
-                sender=item['sender'],
-                received_at=item['received_at'],
-                subject=item['subject'],
-                body=item['body'],
-                message_id=item['message_id'],
-                inbox_id=inbox.id,
-                status=EmailStatus.PENDING
+@celery_app.task(name="tasks.evict_analysis_cache")
+def evict_analysis_cache():
+    db = SessionLocal()
+    try:
+        return f"Evicted {analysis_cache.evict(db)} cached analyses."
+    finally:
+        db.close()
+
+@celery_app.task(name="tasks.rebuild_inbox_stats")
+def rebuild_inbox_stats():
+    """Recounts the inbox_stats rollup from the emails, undoing any drift."""
+    db = SessionLocal()
+    try:
+        rollups.rebuild(db)
+        db.commit()
+        return "Rebuilt inbox stats."
+    finally:
+        db.close()
+
+@celery_app.task(name="tasks.clean_stored_bodies")
+def clean_stored_bodies():
+    """
+    Cleans the bodies stored without their model input, newest first, and
+    sets their emails' snippets: those migrations.py moved out of
+    emails.body, and those of API-created emails not analyzed yet.
+    """
+    db = SessionLocal()
+    cleaned = 0
+    try:
+        while True:
+            batch = db.scalars(
+                select(EmailBody)
+                .options(undefer(EmailBody.data))
+                .where(EmailBody.content.is_(None))
+                .order_by(EmailBody.email_id.desc())
+                .limit(BODY_CLEAN_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not batch:
+                break
+            for stored in batch:
+                stored.full_text, stored.content = clean_body(bodies.decompress(stored.data))
+            db.execute(update(Email), [{"id": stored.email_id, "snippet": bodies.snippet(stored.content)} for stored in batch])
+            db.commit()
+            cleaned += len(batch)
+        return f"Cleaned {cleaned} stored bodies."
+    finally:
+        db.close()
+
+@celery_app.task(name="tasks.purge_inbox")
+def purge_inbox(inbox_id: int, sync_days: int = 30):
+    """
+    Deletes an inbox's emails purge.PURGE_BATCH_SIZE at a time, committing
+    and counting progress after each batch, so no transaction holds its
+    locks for long. The inbox itself is then deleted if it is marked for
+    deletion; otherwise it was reset and its history is imported again.
+    """
+    db = SessionLocal()
+    try:
+        if not db.get(MonitoredInbox, inbox_id): return f"Inbox {inbox_id} not found."
+
+        purged = 0
+        while True:
+            deleted = purge.delete_batch(db, inbox_id)
+            db.query(MonitoredInbox).filter(MonitoredInbox.id == inbox_id).update(
+                {"purge_done": MonitoredInbox.purge_done + deleted}, synchronize_session=False
             )
-            db.add(db_email)
             db.commit()
-            db.refresh(db_email)
-            celery_app.send_task("tasks.analyze_email", args=[db_email.id])
-            added_count += 1
-            
+            purged += deleted
+            if deleted < purge.PURGE_BATCH_SIZE: break
+
+        inbox = db.get(MonitoredInbox, inbox_id)
+        if inbox.deleting:
+            # Backfill chunks and stats go with the inbox
+            db.execute(delete(MonitoredInbox).where(MonitoredInbox.id == inbox_id))
+            db.commit()
+            return f"Deleted inbox {inbox_id} and {purged} emails."
+
+        rollups.rebuild(db, inbox_id)
+        inbox.purge_finished_at = datetime.datetime.now(datetime.timezone.utc)
+        # The history is imported again; until it is planned, a sync plans it as setup_inbox would
+        inbox.sync_days = sync_days
+        inbox.backfill_started_at = inbox.backfill_finished_at = None
+        db.commit()
+        celery_app.send_task("tasks.setup_inbox", args=[inbox_id, sync_days])
+        return f"Reset inbox {inbox_id}: deleted {purged} emails."
+    finally:
+        db.close()
+
+def since_date(days: int) -> datetime.date:
+    return datetime.date.today() - datetime.timedelta(days=days)
+
+def since_condition(since: datetime.date) -> str:
+    return f'SINCE "{since.strftime("%d-%b-%Y")}"'
+
+def insert_emails(db, rows: list, texts: list) -> list:
+    """
+    Inserts email rows, and for each new one its email_bodies row from
+    the matching (full text, content, raw body) in texts. Rows whose message_id is
+    already stored are skipped by the database (ON CONFLICT DO NOTHING),
+    and so are their bodies. Returns the new ids in order.
+    """
+    keyed = [(row, text) for row, text in zip(rows, texts) if row["message_id"] is not None]
+    unkeyed = [(row, text) for row, text in zip(rows, texts) if row["message_id"] is None]
+    inserted = []
+    if keyed:
+        stmt = (
+            dialect_insert(db, Email)
+            .values([row for row, _ in keyed])
+            .on_conflict_do_nothing(index_elements=["message_id"])
+            .returning(Email.id, Email.message_id)
+        )
+        text_by_message_id = {row["message_id"]: text for row, text in keyed}
+        inserted += [(email_id, text_by_message_id[message_id]) for email_id, message_id in db.execute(stmt)]
+    if unkeyed:
+        # Without a message_id nothing can conflict, so the ids come back in parameter order
+        stmt = insert(Email).returning(Email.id, sort_by_parameter_order=True)
+        ids = db.execute(stmt, [row for row, _ in unkeyed]).scalars().all()
+        inserted += zip(ids, [text for _, text in unkeyed])
+    inserted.sort(key=lambda pair: pair[0])
+    if inserted:
+        db.execute(insert(EmailBody), [
+            {"email_id": email_id, "full_text": full_text, "content": content, "data": bodies.compress(body)}
+            for email_id, (full_text, content, body) in inserted
+        ])
+    return [email_id for email_id, _ in inserted]
+
+def ingest_emails(db, inbox, items: list, queued: bool = True, trace_id: str = None) -> list:
+    """
+    Stores a chunk of fetched emails with one INSERT ... ON CONFLICT DO
+    NOTHING and one commit. Emails whose message_id is already stored are
+    skipped by the database. Returns the ids of the rows actually inserted.
+    Each body is cleaned into its search text and model input here, once,
+    and stored with the compressed raw body in email_bodies. Unqueued
+    emails wait for schedule_backfill to release them.
+    """
+    queued_at = datetime.datetime.now(datetime.timezone.utc) if queued else None
+    rows, texts, seen = [], [], set()
+    with metrics.timed("clean_text", len(items), [trace_id]):
+        for item in items:
+            if item['message_id'] is not None:
+                if item['message_id'] in seen: continue
+                seen.add(item['message_id'])
+            full_text, content = clean_body(item['body'])
+            rows.append({
+                "sender": item['sender'],
+                "received_at": item['received_at'],
+                "subject": item['subject'],
+                "snippet": bodies.snippet(content),
+                "message_id": item['message_id'],
+                "inbox_id": inbox.id,
+                "status": EmailStatus.PENDING,
+                "queued_at": queued_at,
+                "trace_id": trace_id
+            })
+            texts.append((full_text, content, item['body']))
+    if not rows:
+        return []
+
+    with metrics.timed("db_ingest", len(rows), [trace_id]):
+        new_ids = insert_emails(db, rows, texts)
+        rollups.record(db, inbox.id, None, rollups.state(EmailStatus.PENDING), len(new_ids))
+        db.commit()
+    metrics.inc("intellinbox_emails_fetched_total", len(new_ids))
+    return new_ids
+
+def fetch_batch(fetched, trace_id: str) -> list:
+    """Takes up to INGEST_CHUNK_SIZE parsed emails off an IMAP fetch, timing the round trips and parsing."""
+    start = time.perf_counter()
+    batch = list(itertools.islice(fetched, INGEST_CHUNK_SIZE))
+    if batch:
+        metrics.record_stage("imap_fetch", time.perf_counter() - start, len(batch), [trace_id])
+    return batch
+
+def process_inbox_fetch(db, inbox):
+    """
+    Fetches and stores the emails above the inbox's high-water mark, and
+    analyzes them right away on the live queues. Returns the number added.
+    If the mailbox UIDVALIDITY has changed (or was never recorded), the
+    stored UIDs are meaningless: the last SYNC_FALLBACK_DAYS are imported
+    again as a chunked backfill instead, and None is returned.
+    """
+    added_ids = []
+    trace_id = metrics.new_trace_id()
+
+    with imap_pool.session(inbox) as mail:
+        uid_validity, uid_next = select_inbox(mail)
+        resync = uid_validity is None or inbox.uid_validity != uid_validity or inbox.last_uid is None
+        if not resync:
+            # "UID n:*" always matches the highest UID, even when it is below n
+            uids = [uid for uid in search_uids(mail, f"UID {inbox.last_uid + 1}:*") if uid > inbox.last_uid]
+
+            fetched = iter_emails(mail, uids)
+            while chunk := fetch_batch(fetched, trace_id):
+                new_ids = ingest_emails(db, inbox, chunk, trace_id=trace_id)
+                events.publish_created(inbox.id, new_ids)
+                dispatch_analysis(new_ids)
+                added_ids.extend(new_ids)
+
+            # Everything below UIDNEXT at SELECT time has now been considered
+            inbox.last_uid = max([inbox.last_uid, *uids, (uid_next or 1) - 1])
+
+    if resync:
+        start_backfill(db, inbox, since_date(SYNC_FALLBACK_DAYS))
+        return None
     inbox.last_synced = func.now()
     db.commit()
-    return added_count
+    return len(added_ids)
 
 @celery_app.task(name="tasks.sync_inbox")
 def sync_inbox_task(inbox_id: int):
@@ -159,22 +849,271 @@ def sync_inbox_task(inbox_id: int):
     try:
         inbox = db.query(MonitoredInbox).filter(MonitoredInbox.id == inbox_id).first()
         if not inbox or not inbox.is_active: return f"Inbox {inbox_id} inactive."
+        if inbox.backfill_started_at is None:
+            # Its setup never planned the import: the inbox was inactive then, or the planning failed
+            if not claim_setup(db, inbox): return f"Inbox {inbox_id} is already set up."
+            chunks = start_backfill(db, inbox, since_date(inbox.sync_days))
+            return f"Setup {inbox.email_address}. Planned {inbox.backfill_total} historical emails in {len(chunks)} chunks."
+        # The backfill chunks own the inbox until its import is done; they record where syncing takes over
+        if inbox.backfill_finished_at is None:
+            return f"Inbox {inbox_id} is still importing its history."
 
-        count = process_inbox_fetch(db, inbox, 'UNSEEN')
+        count = process_inbox_fetch(db, inbox)
+        if count is None:
+            return f"Resyncing {inbox.email_address}. Planned {inbox.backfill_total} historical emails."
         return f"Synced {inbox.email_address}. Added {count} emails."
     finally:
         db.close()
 
+def plan_backfill(db, inbox, since: datetime.date) -> list:
+    """
+    Splits an inbox's history since the given date into BackfillChunks of
+    at most BACKFILL_CHUNK_UIDS UIDs, replacing any earlier plan. Only UIDs
+    are searched here; the messages are fetched by backfill_chunk tasks.
+    Incremental syncs take over above the UIDNEXT seen now.
+    """
+    with imap_pool.session(inbox) as mail:
+        uid_validity, uid_next = select_inbox(mail)
+        uids = sorted(search_uids(mail, since_condition(since)))
+
+    last_uid = inbox.last_uid if inbox.uid_validity == uid_validity and inbox.last_uid else 0
+    db.execute(delete(BackfillChunk).where(BackfillChunk.inbox_id == inbox.id))
+    chunks = [
+        BackfillChunk(
+            inbox_id=inbox.id, uid_validity=uid_validity, since=since,
+            uid_start=part[0], uid_end=part[-1], next_uid=part[0], uid_count=len(part),
+            status=BackfillStatus.PENDING, fetched=0, uid_done=0
+        )
+        for part in (uids[i:i + BACKFILL_CHUNK_UIDS] for i in range(0, len(uids), BACKFILL_CHUNK_UIDS))
+    ]
+    db.add_all(chunks)
+
+    inbox.uid_validity = uid_validity
+    inbox.last_uid = max([last_uid, *uids, (uid_next or 1) - 1])
+    inbox.backfill_total = len(uids)
+    inbox.backfill_done = 0
+    inbox.backfill_started_at = func.now()
+    inbox.backfill_finished_at = None if chunks else func.now()
+    inbox.last_synced = func.now()
+    db.commit()
+    return chunks
+
+def start_backfill(db, inbox, since: datetime.date) -> list:
+    """Plans the inbox's history since the given date and queues its chunks."""
+    chunks = plan_backfill(db, inbox, since)
+    # Newest history first, so the dashboard fills from the top
+    for chunk in reversed(chunks):
+        celery_app.send_task("tasks.backfill_chunk", args=[chunk.id])
+    return chunks
+
+def advance_backfill(db, inbox_id: int, uids: int):
+    """
+    Adds processed UIDs to the inbox's progress. The increment and the
+    completion check are one UPDATE, so chunks finishing at the same time
+    can't both miss that they were the last.
+    """
+    done = MonitoredInbox.backfill_done + uids
+    db.execute(update(MonitoredInbox).where(MonitoredInbox.id == inbox_id).values(
+        backfill_done=done,
+        backfill_finished_at=case(
+            (done >= MonitoredInbox.backfill_total, func.now()),
+            else_=MonitoredInbox.backfill_finished_at
+        ),
+        # Progress is not a sync; keep last_synced from bumping on update
+        last_synced=MonitoredInbox.last_synced
+    ))
+
+def claim_chunk(db, chunk_id: int):
+    """
+    Marks a pending or stale chunk as running and counts the attempt, or
+    returns None if another task holds it or its attempts are used up.
+    The chunk is returned detached, as claimed, so later commits never
+    reload it; a new plan may delete it meanwhile.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stale = now - datetime.timedelta(seconds=BACKFILL_STALE_SECONDS)
+    chunk = db.scalars(
+        update(BackfillChunk)
+        .where(
+            BackfillChunk.id == chunk_id,
+            (BackfillChunk.status == BackfillStatus.PENDING)
+            | ((BackfillChunk.status == BackfillStatus.RUNNING) & (BackfillChunk.updated_at < stale)),
+            BackfillChunk.attempts < BACKFILL_MAX_ATTEMPTS
+        )
+        .values(status=BackfillStatus.RUNNING, updated_at=now, attempts=BackfillChunk.attempts + 1)
+        .returning(BackfillChunk)
+    ).first()
+    if chunk is not None:
+        db.expunge(chunk)
+    db.commit()
+    return chunk
+
+def fail_chunk(db, chunk_id: int):
+    """
+    Gives up on a running chunk that used up its attempts. Its remaining
+    UIDs still count towards the inbox's progress, so the import finishes
+    and incremental syncs take over without them.
+    """
+    remaining = db.execute(
+        select(BackfillChunk.inbox_id, BackfillChunk.uid_count - BackfillChunk.uid_done)
+        .where(BackfillChunk.id == chunk_id, BackfillChunk.status == BackfillStatus.RUNNING)
+        .with_for_update()
+    ).first()
+    if remaining is not None:
+        advance_backfill(db, *remaining)
+        db.execute(update(BackfillChunk).where(BackfillChunk.id == chunk_id).values(
+            status=BackfillStatus.FAILED, updated_at=func.now()
+        ))
+        print(f"Backfill chunk {chunk_id} failed {BACKFILL_MAX_ATTEMPTS} times; skipping its {remaining[1]} remaining UIDs")
+    db.commit()
+
+def fetch_chunk(db, inbox, chunk) -> int:
+    """
+    Fetches a chunk's remaining UIDs from its checkpoint on, storing and
+    checkpointing every INGEST_CHUNK_SIZE messages. Returns the number of
+    emails added. If the mailbox UIDVALIDITY has changed since planning,
+    the chunk's UIDs no longer identify the same messages, and the whole
+    import is planned again instead. A chunk that a new plan replaced, or
+    that was given up meanwhile, stops at its next checkpoint, so it
+    doesn't count towards the inbox's progress twice.
+    """
+    added = 0
+    trace_id = metrics.new_trace_id()
+    with imap_pool.session(inbox) as mail:
+        uid_validity, _ = select_inbox(mail)
+        replan = uid_validity != chunk.uid_validity
+        condition = f"UID {chunk.next_uid}:{chunk.uid_end} {since_condition(chunk.since)}"
+        uids = [] if replan else sorted(uid for uid in search_uids(mail, condition) if chunk.next_uid <= uid <= chunk.uid_end)
+        for i in range(0, len(uids), INGEST_CHUNK_SIZE):
+            part = uids[i:i + INGEST_CHUNK_SIZE]
+            new_ids = ingest_emails(db, inbox, fetch_batch(iter_emails(mail, part), trace_id), queued=False, trace_id=trace_id)
+            events.publish_created(inbox.id, new_ids)
+            added += len(new_ids)
+
+            # Checkpoint after the emails are committed; a rerun of this part is deduplicated on message_id
+            checkpoint = db.execute(update(BackfillChunk).where(
+                BackfillChunk.id == chunk.id, BackfillChunk.status == BackfillStatus.RUNNING
+            ).values(
+                next_uid=part[-1] + 1,
+                uid_done=BackfillChunk.uid_done + len(part),
+                fetched=BackfillChunk.fetched + len(new_ids),
+                updated_at=func.now()
+            ))
+            if not checkpoint.rowcount:
+                db.commit()
+                return added
+            advance_backfill(db, inbox.id, len(part))
+            db.commit()
+
+    if replan:
+        # Only the first chunk to notice plans again; the plan's UIDVALIDITY is recorded on the inbox
+        db.refresh(inbox, with_for_update=True)
+        if inbox.uid_validity == chunk.uid_validity:
+            print(f"Backfill of inbox {inbox.id} planned again: its UIDVALIDITY changed")
+            start_backfill(db, inbox, chunk.since)
+        db.commit()
+        return 0
+
+    # UIDs expunged since planning still count towards the chunk's share of the total
+    remaining = db.scalar(
+        select(BackfillChunk.uid_count - BackfillChunk.uid_done)
+        .where(BackfillChunk.id == chunk.id, BackfillChunk.status == BackfillStatus.RUNNING)
+        .with_for_update()
+    )
+    if remaining is not None:
+        advance_backfill(db, inbox.id, remaining)
+        db.execute(update(BackfillChunk).where(BackfillChunk.id == chunk.id).values(
+            uid_done=BackfillChunk.uid_count,
+            next_uid=chunk.uid_end + 1,
+            status=BackfillStatus.DONE,
+            updated_at=func.now()
+        ))
+    db.commit()
+    return added
+
+def claim_setup(db, inbox) -> bool:
+    """
+    Locks the inbox row if its import is still to be planned, or returns
+    False. A setup task and a sync that find it unplanned together wait
+    for each other here, so only one of them plans it.
+    """
+    db.refresh(inbox, with_for_update=True)
+    if inbox.is_active and inbox.backfill_started_at is None:
+        return True
+    db.rollback()
+    return False
+
 @celery_app.task(name="tasks.setup_inbox")
 def setup_inbox_task(inbox_id: int, days: int):
     db = SessionLocal()
     try:
         inbox = db.query(MonitoredInbox).filter(MonitoredInbox.id == inbox_id).first()
         if not inbox or not inbox.is_active: return f"Inbox {inbox_id} inactive."
+        if not claim_setup(db, inbox): return f"Inbox {inbox_id} is already set up."
+
+        chunks = start_backfill(db, inbox, since_date(days))
+        return f"Setup {inbox.email_address}. Planned {inbox.backfill_total} historical emails in {len(chunks)} chunks."
+    finally:
+        db.close()
+
+@celery_app.task(name="tasks.backfill_chunk")
+def backfill_chunk_task(chunk_id: int):
+    db = SessionLocal()
+    chunk = None
+    try:
+        chunk = claim_chunk(db, chunk_id)
+        if chunk is None: return f"Backfill chunk {chunk_id} already taken or finished."
+        inbox = db.get(MonitoredInbox, chunk.inbox_id)
+        if not inbox or not inbox.is_active: return f"Inbox {chunk.inbox_id} inactive."
+
+        count = fetch_chunk(db, inbox, chunk)
+        return f"Backfilled UIDs {chunk.uid_start}-{chunk.uid_end} of {inbox.email_address}. Added {count} emails."
+    except Exception as e:
+        # The chunk stays RUNNING with its last checkpoint, and resume_backfill retries it once stale,
+        # until its attempts are used up
+        db.rollback()
+        print(f"Backfill chunk {chunk_id} failed: {e}")
+        if chunk is not None and chunk.attempts >= BACKFILL_MAX_ATTEMPTS:
+            fail_chunk(db, chunk_id)
+        return f"Failed: {str(e)}"
+    finally:
+        db.close()
 
-        date = (datetime.date.today() - datetime.timedelta(days=days)).strftime("%d-%b-%Y")
-        count = process_inbox_fetch(db, inbox, f'SINCE "{date}"')
-        return f"Setup {inbox.email_address}. Added {count} historical emails."
+@celery_app.task(name="tasks.resume_backfill")
+def resume_backfill():
+    """
+    Redispatches chunks whose task died or failed, from their checkpoint,
+    and pending chunks whose task message was lost; a duplicate of a
+    message that is only queued finds the chunk taken. Pending chunks are
+    stamped when resent, so each is resent at most once per
+    BACKFILL_STALE_SECONDS. Stale chunks with no attempts left are given
+    up instead.
+    """
+    db = SessionLocal()
+    try:
+        stale = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=BACKFILL_STALE_SECONDS)
+        chunks = db.execute(
+            select(BackfillChunk.id, BackfillChunk.attempts)
+            .join(MonitoredInbox, MonitoredInbox.id == BackfillChunk.inbox_id)
+            .where(
+                MonitoredInbox.is_active == True,
+                BackfillChunk.status.in_([BackfillStatus.PENDING, BackfillStatus.RUNNING]),
+                BackfillChunk.updated_at < stale
+            )
+        ).all()
+        exhausted = [chunk_id for chunk_id, attempts in chunks if attempts >= BACKFILL_MAX_ATTEMPTS]
+        for chunk_id in exhausted:
+            fail_chunk(db, chunk_id)
+        resent = [chunk_id for chunk_id, attempts in chunks if attempts < BACKFILL_MAX_ATTEMPTS]
+        db.execute(
+            update(BackfillChunk)
+            .where(BackfillChunk.id.in_(resent), BackfillChunk.status == BackfillStatus.PENDING)
+            .values(updated_at=func.now())
+        )
+        db.commit()
+        for chunk_id in resent:
+            celery_app.send_task("tasks.backfill_chunk", args=[chunk_id])
+        return f"Resumed {len(resent)} stale backfill chunks; gave up {len(exhausted)}."
     finally:
         db.close()
 
@@ -182,17 +1121,21 @@ def setup_inbox_task(inbox_id: int, days: int):
 def sync_all_active_inboxes():
     """
     Discovery task that finds all active inboxes and 
-    dispatches individual sync tasks for them.
+    dispatches individual sync tasks for them. Inboxes with a live
+    IDLE connection (see idle_listener.py) are skipped; polling is
+    only the fallback for them.
     """
     db = SessionLocal()
     try:
         active_inboxes = db.query(MonitoredInbox).filter(
             MonitoredInbox.is_active == True
         ).all()
-        
-        for inbox in active_inboxes:
+        idling = counters.live([heartbeat_key(inbox.id) for inbox in active_inboxes])
+
+        polled = [inbox for inbox, is_idling in zip(active_inboxes, idling) if not is_idling]
+        for inbox in polled:
             celery_app.send_task("tasks.sync_inbox", args=[inbox.id])
             
-        return f"Dispatched sync for {len(active_inboxes)} inboxes."
+        return f"Dispatched sync for {len(polled)} of {len(active_inboxes)} inboxes."
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import json
+import os
+import re
+
+# JSON file with the thread markers and promo keywords; see text_rules.json
+TEXT_RULES_PATH = os.getenv("TEXT_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_rules.json"))
+
+class TextRules:
+    """
+    Thread markers compiled once into a single regex, so each line is
+    matched once instead of once per marker. Keywords are lowercased up
+    front and checked as substrings of a body lowercased at most once;
+    for a handful of literals that beats a regex alternation in CPython.
+    """
+
+    def __init__(self, config: dict):
+        markers = config["thread_markers"]
+        self.thread_marker = re.compile("|".join(f"(?:{marker})" for marker in markers) or r"(?!)", re.IGNORECASE)
+        self.noreply_senders = [word.lower() for word in config["noreply_senders"]]
+        self.important_keywords = [word.lower() for word in config["important_keywords"]]
+        self.promo_headers = config["promo_headers"]
+        self.promo_keywords = [word.lower() for word in config["promo_keywords"]]
+        self.promo_window = config["promo_window"]
+
+    @classmethod
+    def load(cls, path: str = TEXT_RULES_PATH) -> "TextRules":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def truncate_thread(self, text: str) -> str:
+        """Drops everything from the first line that starts a quoted reply."""
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            if self.thread_marker.match(line.strip()):
+                lines = lines[:index]
+                break
+        return "\n".join(lines).strip()
+
+    def is_promotional(self, msg, body: str) -> bool:
+        # Transactional mail from no-reply senders is kept even if it looks like a newsletter
+        sender = msg.get("From", "").lower()
+        if any(word in sender for word in self.noreply_senders):
+            lowered = body.lower()
+            if any(word in lowered for word in self.important_keywords):
+                return False
+
+        if any(msg.get(header) for header in self.promo_headers):
+            return True
+
+        # Only the start of the body is lowercased and scanned
+        window = body[:self.promo_window].lower()
+        return any(word in window for word in self.promo_keywords)
+
+rules = TextRules.load()